@@ -0,0 +1,324 @@
+"""
+Hardware-aware tuning of CPU generation settings for the Mini GPT Assistant.
+
+Probes the CPU (cores, NUMA nodes, AVX-512 and bfloat16 support), then runs
+a short generation benchmark of the configured model for each combination of
+intra-op threads, inter-op threads and dtype, and at several batch sizes.
+The fastest settings are written to a tuning profile that the assistant
+applies at startup on the same hardware.
+
+    python autotune.py                 # tune the configured model
+    python autotune.py --tiny          # no downloads, checks the tuner itself (profile in a temp dir)
+    python autotune.py --quick         # fewer combinations
+
+Every combination runs in a fresh process, because PyTorch only lets the
+thread pools be sized once per process.
+"""
+
+import os
+import sys
+import json
+import glob
+import time
+import logging
+import platform
+import argparse
+import subprocess
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from colorama import Fore, Style
+
+import config
+
+BATCH_SIZES = [1, 2, 4, 8, 16]
+
+# Throughput within this fraction of the best counts as a tie; the smaller batch wins
+BATCH_TOLERANCE = 0.05
+
+
+def _read_cpuinfo() -> List[Dict[str, str]]:
+    """Processor entries of /proc/cpuinfo (empty where it does not exist)."""
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            blocks = f.read().strip().split('\n\n')
+    except OSError:
+        return []
+
+    processors = []
+    for block in blocks:
+        entry = {}
+        for line in block.splitlines():
+            key, _, value = line.partition(':')
+            entry[key.strip()] = value.strip()
+        processors.append(entry)
+    return processors
+
+
+def probe_cpu() -> Dict:
+    """Describe the CPU: model, cores, NUMA nodes and the vector instructions PyTorch can use."""
+    import torch
+
+    processors = _read_cpuinfo()
+    flags = set(processors[0].get('flags', '').split()) if processors else set()
+    physical = {(p.get('physical id'), p.get('core id')) for p in processors if 'core id' in p}
+    usable = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+    return {
+        'model': (processors[0].get('model name') if processors else None) or platform.processor() or platform.machine(),
+        'logical_cores': os.cpu_count(),
+        'physical_cores': len(physical) or os.cpu_count(),
+        'usable_cores': usable,
+        'numa_nodes': len(glob.glob('/sys/devices/system/node/node[0-9]*')) or 1,
+        'cpu_capability': torch.backends.cpu.get_cpu_capability(),
+        'avx512': 'avx512f' in flags,
+        'avx512_bf16': 'avx512_bf16' in flags,
+        'amx': 'amx_bf16' in flags,
+        # Native bfloat16 math; elsewhere bfloat16 is emulated and slower than float32
+        'bf16': bool(flags & {'avx512_bf16', 'amx_bf16'}) or platform.machine() == 'arm64',
+    }
+
+
+def fingerprint(cpu: Dict, model_name: str) -> Dict:
+    """What a tuning profile is valid for: the same CPU, core count, PyTorch build and model."""
+    import torch
+
+    return {
+        'cpu': cpu['model'],
+        'usable_cores': cpu['usable_cores'],
+        'torch': torch.__version__,
+        'model': model_name,
+    }
+
+
+def candidate_settings(cpu: Dict, quick: bool = False) -> List[Dict]:
+    """Thread counts and dtypes worth trying on this CPU."""
+    cores = cpu['usable_cores']
+    threads = {1, cores, min(cpu['physical_cores'], cores)}
+    if not quick:
+        threads.update(n for n in (2, 4, 8, 16, 32) if n < cores)
+    interop_threads = [1, 2] if cores > 2 and not quick else [1]
+    dtypes = ['float32', 'bfloat16'] if cpu['bf16'] else ['float32']
+
+    return [
+        {'torch_threads': count, 'interop_threads': interop, 'dtype': dtype}
+        for count in sorted(threads) for interop in interop_threads for dtype in dtypes
+    ]
+
+
+def run_trial(settings: Dict, batch_sizes: List[int], new_tokens: int, model_name: str,
+              timeout: float = 600) -> Optional[Dict]:
+    """Benchmark one combination of settings in a fresh process."""
+    trial = dict(settings, batch_sizes=batch_sizes, new_tokens=new_tokens, model=model_name)
+    try:
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), '--trial', json.dumps(trial)],
+            capture_output=True, text=True, timeout=timeout, cwd=os.path.dirname(os.path.abspath(__file__))
+        )
+    except subprocess.TimeoutExpired:
+        return None
+    if result.returncode != 0:
+        return None
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def _trial_main(trial: Dict):
+    """Run one trial in this process and print its results as JSON."""
+    import torch
+
+    # Must happen before any parallel work in this process
+    torch.set_num_threads(trial['torch_threads'])
+    torch.set_num_interop_threads(trial['interop_threads'])
+    torch.manual_seed(0)
+
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    from bench import BENCH_PROMPTS
+
+    tokenizer = AutoTokenizer.from_pretrained(trial['model'])
+    model = AutoModelForCausalLM.from_pretrained(trial['model'], torch_dtype=getattr(torch, trial['dtype'])).eval()
+    prompt = tokenizer(BENCH_PROMPTS[-1], return_tensors='pt')['input_ids']
+    new_tokens = trial['new_tokens']
+
+    def generate(batch_size: int) -> float:
+        input_ids = prompt.repeat(batch_size, 1)
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=tokenizer.eos_token_id
+            )
+        return time.perf_counter() - start_time
+
+    generate(1)
+    batches = []
+    for batch_size in trial['batch_sizes']:
+        seconds = sorted(generate(batch_size) for _ in range(3))[1]
+        batches.append({
+            'batch_size': batch_size,
+            'seconds': seconds,
+            'tokens_per_second': batch_size * new_tokens / seconds,
+        })
+    print(json.dumps({'batches': batches}))
+
+
+def pick_batch_size(batches: List[Dict]) -> int:
+    """Smallest batch size whose throughput is within BATCH_TOLERANCE of the best."""
+    best = max(batch['tokens_per_second'] for batch in batches)
+    return min(batch['batch_size'] for batch in batches
+               if batch['tokens_per_second'] >= best * (1 - BATCH_TOLERANCE))
+
+
+def autotune(model_name: str, quick: bool = False, new_tokens: int = 32) -> Dict:
+    """
+    Probe the CPU and sweep the candidate settings.
+
+    Thread counts and dtype are chosen by single-request speed, which is what
+    the chat loop feels; the batch size by throughput with those settings.
+
+    Returns:
+        The tuning profile
+    """
+    cpu = probe_cpu()
+    print(f"{Fore.CYAN}CPU: {cpu['model']} - {cpu['usable_cores']} usable cores "
+          f"({cpu['physical_cores']} physical), {cpu['numa_nodes']} NUMA node(s), "
+          f"{cpu['cpu_capability']}, bfloat16 {'native' if cpu['bf16'] else 'emulated'}{Style.RESET_ALL}")
+    if cpu['numa_nodes'] > 1:
+        print(f"{Fore.YELLOW}Several NUMA nodes: for serving, run one worker per node "
+              f"(server.py --workers {cpu['numa_nodes']}){Style.RESET_ALL}")
+
+    batch_sizes = [size for size in BATCH_SIZES if size <= (4 if quick else BATCH_SIZES[-1])]
+    results = []
+    for settings in candidate_settings(cpu, quick):
+        label = f"threads {settings['torch_threads']}/{settings['interop_threads']}, {settings['dtype']}"
+        trial = run_trial(settings, batch_sizes, new_tokens, model_name)
+        if trial is None:
+            print(f"{Fore.RED}  {label:<32} failed{Style.RESET_ALL}")
+            continue
+        single = trial['batches'][0]
+        print(f"{Fore.WHITE}  {label:<32} {single['tokens_per_second']:8.1f} tokens/s alone, "
+              f"{max(b['tokens_per_second'] for b in trial['batches']):8.1f} tokens/s batched{Style.RESET_ALL}")
+        results.append(dict(settings, batches=trial['batches']))
+
+    if not results:
+        raise RuntimeError("every tuning trial failed")
+
+    best = max(results, key=lambda result: result['batches'][0]['tokens_per_second'])
+    return {
+        'created': datetime.now().isoformat(),
+        'fingerprint': fingerprint(cpu, model_name),
+        'cpu': cpu,
+        'settings': {
+            'torch_threads': best['torch_threads'],
+            'interop_threads': best['interop_threads'],
+            'dtype': best['dtype'],
+            'batch_size': pick_batch_size(best['batches']),
+        },
+        'results': results,
+    }
+
+
+def load_tuning_profile(path: Optional[str], model_name: str) -> Optional[Dict]:
+    """
+    Return the settings of the tuning profile if it was made for this hardware and model.
+
+    A profile from other hardware, a different PyTorch build or another
+    model is ignored with a warning.
+    """
+    if not path or not os.path.exists(path):
+        return None
+
+    logger = logging.getLogger('MiniGPTAssistant')
+    try:
+        with open(path, encoding='utf-8') as f:
+            profile = json.load(f)
+        expected = fingerprint(probe_cpu(), model_name)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read tuning profile {path}: {e}")
+        return None
+
+    if profile.get('fingerprint') != expected:
+        logger.warning(f"Ignoring tuning profile {path}: it was made for {profile.get('fingerprint')}, "
+                       f"this is {expected}; re-run autotune.py")
+        return None
+    return profile['settings']
+
+
+def apply_thread_settings(torch_threads: Optional[int], interop_threads: Optional[int]):
+    """Size PyTorch's thread pools; the inter-op pool can only be sized before it is first used."""
+    import torch
+
+    if torch_threads:
+        torch.set_num_threads(torch_threads)
+    if interop_threads:
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError:
+            logging.getLogger('MiniGPTAssistant').warning(
+                "Inter-op threads were already in use; keeping the current number")
+
+
+def main():
+    """Auto-tune entry point."""
+    parser = argparse.ArgumentParser(description="Tune CPU generation settings for this machine")
+    parser.add_argument('--tiny', action='store_true',
+                        help="Use a tiny randomly initialized GPT-2 (no downloads needed)")
+    parser.add_argument('--quick', action='store_true', help="Try fewer combinations")
+    parser.add_argument('--new-tokens', type=int, default=32, help="Tokens generated per benchmark run")
+    parser.add_argument('--output', help="Where to write the tuning profile "
+                                         "(default: TUNING_PROFILE_PATH, or a temporary file with --tiny)")
+    parser.add_argument('--trial', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.trial:
+        _trial_main(json.loads(args.trial))
+        return
+    # A tiny-model profile only checks the tuner; it must not replace the real one
+    if args.output is None:
+        if args.tiny:
+            args.output = os.path.join(tempfile.mkdtemp(prefix='autotune-tiny-'), 'tuning_profile.json')
+        else:
+            args.output = config.TUNING_PROFILE_PATH
+    if not args.output:
+        parser.error("no --output given and TUNING_PROFILE_PATH is not set")
+
+    with tempfile.TemporaryDirectory() as tiny_dir:
+        model_name = config.MODEL_NAME
+        if args.tiny:
+            from tiny_model import build_tiny_model
+            model_name = build_tiny_model(tiny_dir)
+        else:
+            from snapshot import find_snapshot
+            if find_snapshot(config.MODEL_SNAPSHOT_DIR, config.MODEL_NAME):
+                model_name = config.MODEL_SNAPSHOT_DIR
+
+        try:
+            profile = autotune(model_name, args.quick, args.new_tokens)
+        except RuntimeError as e:
+            print(f"{Fore.RED}Tuning failed: {e}{Style.RESET_ALL}")
+            sys.exit(1)
+
+    # The profile belongs to the configured model, wherever its weights were read from
+    profile['fingerprint']['model'] = 'tiny-random-gpt2' if args.tiny else config.MODEL_NAME
+    directory = os.path.dirname(args.output)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(profile, f, indent=2)
+
+    settings = profile['settings']
+    print(f"{Fore.GREEN}Best: {settings['torch_threads']} threads ({settings['interop_threads']} inter-op), "
+          f"{settings['dtype']}, batch size {settings['batch_size']}{Style.RESET_ALL}")
+    if args.tiny:
+        print(f"{Fore.GREEN}Tuning profile of the tiny model written to {args.output}{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.GREEN}Tuning profile written to {args.output}; it is applied at startup "
+              f"(the dtype only with TORCH_DTYPE = \"auto\" in config.py).{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
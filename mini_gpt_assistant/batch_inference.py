@@ -0,0 +1,207 @@
+"""
+Batch offline inference for the Mini GPT Assistant.
+
+Answers every prompt in a JSONL file and writes one JSON result per line:
+
+    python batch_inference.py prompts.jsonl results.jsonl
+    python batch_inference.py requests.jsonl results.jsonl --field body --id-field request_id
+    python batch_inference.py prompts.jsonl results.jsonl --raw    # plain continuations, no cleaning
+
+Prompts are read a window at a time, sorted by token length and generated in
+batches of similar length, so little compute is spent on padding. Results are
+written in the order batches finish and flushed after every batch. The
+output file is its own checkpoint: prompts whose id is already in it are
+skipped, so running the same command again continues an interrupted job.
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from itertools import islice
+from typing import Dict, Iterator, List, Set, Tuple
+
+from colorama import Fore, Style
+
+import config
+from metrics import RequestMetrics
+
+
+def read_done_ids(path: str) -> Set[str]:
+    """
+    Ids of the results already in an output file.
+
+    A last line cut off by an interruption is removed, so new results are
+    appended after the last complete one.
+    """
+    done: Set[str] = set()
+    if not os.path.exists(path):
+        return done
+
+    with open(path, 'rb+') as f:
+        position = 0
+        for line in iter(f.readline, b''):
+            if not line.endswith(b'\n'):
+                f.truncate(position)
+                break
+            position += len(line)
+            try:
+                done.add(str(json.loads(line)['id']))
+            except (ValueError, KeyError, TypeError):
+                continue
+    return done
+
+
+def iter_prompts(path: str, field: str, id_field: str, done: Set[str]) -> Iterator[Tuple[object, str]]:
+    """
+    The (id, prompt) pairs of a JSONL file that have no result yet.
+
+    Records without an id_field are identified by their line number.
+    """
+    with open(path, encoding='utf-8') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = record.get(field)
+            record_id = record.get(id_field, number)
+            if isinstance(prompt, str) and prompt.strip() and str(record_id) not in done:
+                yield record_id, prompt
+
+
+def length_batches(items: List[Tuple[object, str, List[int]]],
+                   batch_size: int) -> List[List[Tuple[object, str, List[int]]]]:
+    """Group prompts of similar token length, longest first."""
+    items = sorted(items, key=lambda item: len(item[2]), reverse=True)
+    return [items[start:start + batch_size] for start in range(0, len(items), batch_size)]
+
+
+def run_batch(assistant, input_path: str, output_path: str, batch_size: int, window: int,
+              field: str = 'prompt', id_field: str = 'id', raw: bool = False) -> Dict:
+    """
+    Answer all prompts of a JSONL file that have no result in the output file yet.
+
+    Args:
+        assistant: Assistant holding the loaded model and tokenizer
+        input_path: JSONL file of prompts
+        output_path: JSONL file the results are appended to
+        batch_size: Prompts generated together
+        window: Prompts read and sorted by length at a time
+        field: Record field holding the prompt
+        id_field: Record field identifying the prompt in the results
+        raw: Continue the prompts as they are instead of answering them as chat messages
+
+    Returns:
+        Prompt and token counts, padding share and timings
+    """
+    done = read_done_ids(output_path)
+    if done:
+        print(f"{Fore.YELLOW}Resuming: {len(done)} prompts already answered in {output_path}{Style.RESET_ALL}")
+
+    kind = "completion" if raw else "chat"
+    builder = assistant.context_builder
+    stats = {'prompts': 0, 'cached': 0, 'prompt_tokens': 0, 'generated_tokens': 0, 'padded_tokens': 0}
+    start_time = time.perf_counter()
+    prompts = iter_prompts(input_path, field, id_field, done)
+
+    with open(output_path, 'a', encoding='utf-8') as output:
+        def write(results: List[Dict]):
+            for result in results:
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+            output.flush()
+            os.fsync(output.fileno())
+
+        while True:
+            chunk = list(islice(prompts, window))
+            if not chunk:
+                break
+
+            pending = []
+            cached = []
+            for record_id, prompt in chunk:
+                input_ids = builder.encode(prompt)[-builder.budget:] if raw else builder.build([], prompt)
+                key = assistant.response_key(input_ids, kind=kind, batched=True)
+                response = assistant.cached_response(key, RequestMetrics())
+                if response is not None:
+                    cached.append({'id': record_id, 'prompt': prompt, 'response': response})
+                else:
+                    pending.append((record_id, prompt, input_ids))
+            write(cached)
+            stats['cached'] += len(cached)
+
+            for batch in length_batches(pending, batch_size):
+                prompt_ids = [input_ids for _, _, input_ids in batch]
+                outputs = assistant.generate_batch(prompt_ids, [not raw] * len(batch))
+
+                results = []
+                for (record_id, prompt, input_ids), text in zip(batch, outputs):
+                    response = text if raw else assistant.clean_response(text.strip())
+                    assistant.cache_response(assistant.response_key(input_ids, kind=kind, batched=True), response)
+                    results.append({'id': record_id, 'prompt': prompt, 'response': response})
+                    stats['generated_tokens'] += len(builder.encode(text))
+                write(results)
+
+                width = max(len(input_ids) for input_ids in prompt_ids)
+                stats['prompt_tokens'] += sum(len(input_ids) for input_ids in prompt_ids)
+                stats['padded_tokens'] += width * len(batch)
+
+            stats['prompts'] += len(chunk)
+            elapsed = time.perf_counter() - start_time
+            print(f"{Fore.WHITE}  {stats['prompts']:,} prompts answered "
+                  f"({stats['prompts'] / elapsed:.1f}/s, "
+                  f"{stats['generated_tokens'] / elapsed:,.0f} tokens/s){Style.RESET_ALL}")
+
+    stats['seconds'] = time.perf_counter() - start_time
+    stats['padding'] = 1 - stats['prompt_tokens'] / stats['padded_tokens'] if stats['padded_tokens'] else 0.0
+    return stats
+
+
+def main():
+    """Batch inference entry point."""
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of prompts with the assistant's model")
+    parser.add_argument('input', help="JSONL file with one prompt per line")
+    parser.add_argument('output', help="JSONL file for the results; an existing one is continued")
+    parser.add_argument('--field', default='prompt', help="Record field holding the prompt")
+    parser.add_argument('--id-field', default='id', help="Record field identifying the prompt (default: line number)")
+    parser.add_argument('--raw', action='store_true',
+                        help="Continue the prompts as they are, without chat format or cleaning")
+    parser.add_argument('--batch-size', type=int, help="Prompts generated together (default: tuned or BATCH_MAX_SIZE)")
+    parser.add_argument('--window', type=int, help="Prompts sorted by length at a time (default: 16 batches)")
+    parser.add_argument('--tiny', action='store_true',
+                        help="Use a tiny randomly initialized GPT-2 (no downloads needed)")
+    args = parser.parse_args()
+
+    # Prompts are answered by the model alone and are not conversations to keep
+    config.ALLOW_INTERNET = False
+    config.CONVERSATION_STORE_PATH = None
+
+    from main import MiniGPTAssistant
+    from autotune import load_tuning_profile
+
+    tuning = load_tuning_profile(config.TUNING_PROFILE_PATH, config.MODEL_NAME) or {}
+    batch_size = args.batch_size or tuning.get('batch_size', config.BATCH_MAX_SIZE)
+    window = args.window or batch_size * 16
+
+    with tempfile.TemporaryDirectory() as tiny_dir:
+        if args.tiny:
+            from tiny_model import build_tiny_model
+            config.MODEL_NAME = build_tiny_model(tiny_dir)
+
+        assistant = MiniGPTAssistant()
+        try:
+            stats = run_batch(assistant, args.input, args.output, batch_size, window,
+                              args.field, args.id_field, args.raw)
+        except KeyboardInterrupt:
+            print(f"\n{Fore.YELLOW}Stopped; run the same command again to continue.{Style.RESET_ALL}")
+            sys.exit(130)
+
+    print(f"{Fore.GREEN}Answered {stats['prompts']:,} prompts in {stats['seconds']:.1f}s "
+          f"({stats['cached']} from the response cache), "
+          f"{stats['generated_tokens'] / max(stats['seconds'], 1e-9):,.0f} tokens/s, "
+          f"{stats['padding']:.1%} padding; results in {args.output}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
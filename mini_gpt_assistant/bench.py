@@ -0,0 +1,324 @@
+"""
+Offline benchmark suite for the Mini GPT Assistant.
+
+Measures the assistant end to end (generate_response and the streaming path)
+and the raw model on a fixed prompt corpus: time to first token, tokens per
+second, latency percentiles, peak memory and how latency scales with prompt
+length. Results can be written as JSON and compared against an earlier run.
+
+    python bench.py --tiny                  # no downloads, works in CI
+    python bench.py --output run.json
+    python bench.py --baseline run.json     # compare with an earlier run
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import tempfile
+from datetime import datetime
+from typing import List, Dict, Optional
+
+from colorama import Fore, Style
+
+import config
+
+# Fixed prompt corpus; keep it stable so runs stay comparable
+BENCH_PROMPTS = [
+    "Hello, how are you?",
+    "What can you do?",
+    "Tell me about yourself",
+    "What model are you using?",
+    "Can you explain what a neural network is in simple terms?",
+    "Write a short poem about the ocean.",
+    "What are some good habits for staying productive when working from home?",
+    "Summarize the plot of a story about a robot who learns to paint, in two sentences.",
+]
+
+SCALING_LENGTHS = [16, 64, 128, 256, 512]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Summary statistics with nearest-rank percentiles."""
+    if not values:
+        return {}
+    ordered = sorted(values)
+
+    def rank(p: float) -> float:
+        index = max(math.ceil(p / 100 * len(ordered)) - 1, 0)
+        return ordered[min(index, len(ordered) - 1)]
+
+    return {
+        'mean': sum(ordered) / len(ordered),
+        'min': ordered[0],
+        'p50': rank(50),
+        'p95': rank(95),
+        'p99': rank(99),
+        'max': ordered[-1],
+    }
+
+
+def peak_rss_mb() -> float:
+    """Peak resident memory of this process in megabytes."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes, macOS bytes
+        return peak / 1024 ** 2 if sys.platform == 'darwin' else peak / 1024
+    except ImportError:
+        import psutil
+        memory = psutil.Process().memory_info()
+        return getattr(memory, 'peak_wset', memory.rss) / 1024 ** 2
+
+
+class TimingStreamer:
+    """Streamer that records when the first generated token arrives."""
+
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.first_token_time: Optional[float] = None
+        self._prompt_seen = False
+
+    def put(self, value):
+        # The first call carries the prompt
+        if not self._prompt_seen:
+            self._prompt_seen = True
+        elif self.first_token_time is None:
+            self.first_token_time = time.perf_counter()
+
+    def end(self):
+        pass
+
+
+def bench_assistant(assistant, prompts: List[str], runs: int) -> Dict:
+    """Benchmark generate_response and the streaming path end to end."""
+    latencies, stream_ttft, stream_latencies = [], [], []
+
+    for _ in range(runs):
+        for prompt in prompts:
+            start_time = time.perf_counter()
+            assistant.generate_response(prompt)
+            latencies.append(time.perf_counter() - start_time)
+
+            start_time = time.perf_counter()
+            first_chunk = None
+            for _chunk in assistant.generate_response_stream(prompt):
+                if first_chunk is None:
+                    first_chunk = time.perf_counter() - start_time
+            stream_latencies.append(time.perf_counter() - start_time)
+            stream_ttft.append(first_chunk if first_chunk is not None else stream_latencies[-1])
+
+    return {
+        'requests': len(latencies),
+        'generate_response_seconds': percentiles(latencies),
+        'stream_time_to_first_chunk_seconds': percentiles(stream_ttft),
+        'stream_total_seconds': percentiles(stream_latencies),
+    }
+
+
+def _generate_timed(model, input_ids, new_tokens: int, pad_token_id: int) -> Dict[str, float]:
+    """Greedily generate exactly new_tokens tokens and time the first token and the rest."""
+    import torch
+
+    streamer = TimingStreamer()
+    with torch.no_grad():
+        output = model.generate(
+            input_ids=input_ids,
+            attention_mask=torch.ones_like(input_ids),
+            max_new_tokens=new_tokens,
+            min_new_tokens=new_tokens,
+            do_sample=False,
+            pad_token_id=pad_token_id,
+            streamer=streamer
+        )
+    total = time.perf_counter() - streamer.start_time
+    generated = output.shape[1] - input_ids.shape[1]
+    ttft = (streamer.first_token_time or time.perf_counter()) - streamer.start_time
+    decode_time = total - ttft
+
+    return {
+        'ttft': ttft,
+        'total': total,
+        'tokens': generated,
+        'tokens_per_second': generated / total if total > 0 else 0.0,
+        'decode_tokens_per_second': (generated - 1) / decode_time if decode_time > 0 and generated > 1 else 0.0,
+    }
+
+
+def bench_model(assistant, prompts: List[str], runs: int, new_tokens: int) -> Dict:
+    """Benchmark raw model generation on the prompts as the assistant would build them."""
+    import torch
+
+    results = []
+    for _ in range(runs):
+        for prompt in prompts:
+            input_ids = torch.tensor([assistant.build_context(prompt)], device=assistant.model.device)
+            results.append(_generate_timed(assistant.model, input_ids, new_tokens, assistant.tokenizer.eos_token_id))
+
+    return {
+        'requests': len(results),
+        'new_tokens': new_tokens,
+        'time_to_first_token_seconds': percentiles([r['ttft'] for r in results]),
+        'latency_seconds': percentiles([r['total'] for r in results]),
+        'tokens_per_second': percentiles([r['tokens_per_second'] for r in results]),
+        'decode_tokens_per_second': percentiles([r['decode_tokens_per_second'] for r in results]),
+    }
+
+
+def bench_scaling(assistant, lengths: List[int], new_tokens: int, runs: int) -> List[Dict]:
+    """Measure how time to first token and latency grow with prompt length."""
+    import torch
+
+    max_length = assistant.context_builder.budget
+    vocab_size = len(assistant.tokenizer)
+    generator = torch.Generator().manual_seed(0)
+
+    results = []
+    for length in lengths:
+        if length > max_length:
+            continue
+        input_ids = torch.randint(0, vocab_size, (1, length), generator=generator).to(assistant.model.device)
+        timings = [_generate_timed(assistant.model, input_ids, new_tokens, assistant.tokenizer.eos_token_id)
+                   for _ in range(runs)]
+        results.append({
+            'prompt_tokens': length,
+            'time_to_first_token_p50': percentiles([t['ttft'] for t in timings])['p50'],
+            'latency_p50': percentiles([t['total'] for t in timings])['p50'],
+            'tokens_per_second_p50': percentiles([t['tokens_per_second'] for t in timings])['p50'],
+        })
+    return results
+
+
+def run_benchmarks(assistant, runs: int, new_tokens: int, warmup: int = 1) -> Dict:
+    """Run every benchmark and collect the results with the settings that produced them."""
+    import torch
+    import transformers
+
+    # Warm up lazy initialization so it does not land in the first measurement
+    for prompt in BENCH_PROMPTS[:warmup]:
+        assistant.generate_response(prompt)
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'model': config.MODEL_NAME,
+        'device': assistant.device,
+        'settings': {
+            'max_length': config.MAX_LENGTH,
+            'do_sample': config.DO_SAMPLE,
+            'prefix_cache': config.PREFIX_CACHE,
+            'compile_model': config.COMPILE_MODEL,
+            'cpu_quantization': config.CPU_QUANTIZATION,
+            'dtype': str(assistant.model.dtype),
+            'draft_model': config.DRAFT_MODEL_NAME,
+            'torch_threads': torch.get_num_threads(),
+        },
+        'environment': {
+            'python': platform.python_version(),
+            'torch': torch.__version__,
+            'transformers': transformers.__version__,
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'startup_seconds': assistant.startup_timings,
+        'assistant': bench_assistant(assistant, BENCH_PROMPTS, runs),
+        'model_generation': bench_model(assistant, BENCH_PROMPTS, runs, new_tokens),
+        'prompt_length_scaling': bench_scaling(assistant, SCALING_LENGTHS, new_tokens, runs),
+        'peak_rss_mb': peak_rss_mb(),
+        'stage_metrics': assistant.metrics.snapshot(),
+    }
+
+
+# Metrics compared against a baseline run, and whether higher is better
+KEY_METRICS = [
+    (('assistant', 'generate_response_seconds', 'p50'), False),
+    (('assistant', 'stream_time_to_first_chunk_seconds', 'p50'), False),
+    (('model_generation', 'time_to_first_token_seconds', 'p50'), False),
+    (('model_generation', 'latency_seconds', 'p95'), False),
+    (('model_generation', 'tokens_per_second', 'p50'), True),
+    (('peak_rss_mb',), False),
+]
+
+
+def _lookup(results: Dict, path) -> Optional[float]:
+    for key in path:
+        if not isinstance(results, dict) or key not in results:
+            return None
+        results = results[key]
+    return results
+
+
+def print_report(results: Dict, baseline: Optional[Dict] = None):
+    """Print the key metrics, with the change against a baseline run if given."""
+    print(f"{Fore.CYAN}Benchmark: {results['model']} on {results['device']}{Style.RESET_ALL}")
+    for path, higher_is_better in KEY_METRICS:
+        value = _lookup(results, path)
+        if value is None:
+            continue
+        line = f"  {'.'.join(path):<55} {value:10.4f}"
+        old = _lookup(baseline, path) if baseline else None
+        if old:
+            change = value / old - 1
+            better = change > 0 if higher_is_better else change < 0
+            color = Fore.GREEN if better else Fore.RED
+            line += f"  {color}{change:+.1%}{Style.RESET_ALL}"
+        print(line)
+
+    print(f"{Fore.CYAN}Prompt length scaling (p50):{Style.RESET_ALL}")
+    for row in results['prompt_length_scaling']:
+        print(f"  {row['prompt_tokens']:>5} tokens: first token {row['time_to_first_token_p50'] * 1000:8.1f}ms, "
+              f"total {row['latency_p50'] * 1000:8.1f}ms, {row['tokens_per_second_p50']:7.1f} tokens/s")
+
+
+def main():
+    """Benchmark entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the Mini GPT Assistant")
+    parser.add_argument('--tiny', action='store_true',
+                        help="Use a tiny randomly initialized GPT-2 (no downloads needed)")
+    parser.add_argument('--runs', type=int, default=3, help="Repetitions of the prompt corpus")
+    parser.add_argument('--new-tokens', type=int, default=32, help="Tokens generated in raw model runs")
+    parser.add_argument('--output', help="Write the results to this JSON file")
+    parser.add_argument('--baseline', help="Compare against the results in this JSON file")
+    args = parser.parse_args()
+
+    import torch
+    torch.manual_seed(0)
+
+    # Benchmarks never search the web, so results do not depend on the network
+    config.ALLOW_INTERNET = False
+    # Every run has to generate; cached replies would hide the generation time
+    config.RESPONSE_CACHE = False
+    # Benchmark prompts are not conversations to save, and start without earlier history
+    config.CONVERSATION_STORE_PATH = None
+    config.RESUME_LAST_SESSION = False
+
+    from main import MiniGPTAssistant
+
+    with tempfile.TemporaryDirectory() as tiny_dir:
+        if args.tiny:
+            from tiny_model import build_tiny_model
+            config.MODEL_NAME = build_tiny_model(tiny_dir)
+
+        assistant = MiniGPTAssistant()
+        results = run_benchmarks(assistant, args.runs, args.new_tokens)
+        if args.tiny:
+            results['model'] = 'tiny-random-gpt2'
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+
+    print()
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"{Fore.GREEN}Results written to {args.output}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -56,6 +56,19 @@ def check_nvidia_gpu():
         print("❌ nvidia-smi command not found")
         print("Install NVIDIA drivers from https://www.nvidia.com/drivers/")
 
+def check_cpu():
+    """Report the CPU features that matter for generation on CPU."""
+    from autotune import probe_cpu
+    
+    cpu = probe_cpu()
+    print("\n🖥️  CPU:")
+    print(f"{cpu['model']}: {cpu['usable_cores']} usable cores ({cpu['physical_cores']} physical), "
+          f"{cpu['numa_nodes']} NUMA node(s)")
+    print(f"Vector instructions used by PyTorch: {cpu['cpu_capability']}")
+    print(f"bfloat16: {'native' if cpu['bf16'] else 'emulated (use float32)'}")
+    print(f"PyTorch threads: {torch.get_num_threads()} (run autotune.py to find the best settings)")
+
 if __name__ == "__main__":
     check_cuda()
-    check_nvidia_gpu()
\ No newline at end of file
+    check_nvidia_gpu()
+    check_cpu()
\ No newline at end of file
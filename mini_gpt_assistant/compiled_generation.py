@@ -0,0 +1,164 @@
+"""
+Compiled generation for the Mini GPT Assistant.
+
+In eager mode every generated token runs the model op by op from Python, and
+the key/value cache grows by one position per token. With COMPILE_MODEL the
+decoding step is compiled with torch.compile and runs on a StaticCache of
+fixed size. Cache sizes are rounded up to a few buckets (COMPILE_BUCKETS),
+so only one graph per bucket is ever compiled, and every bucket is compiled
+and run once while the model loads, so the first request hits hot code.
+
+Whether this pays off depends on the model and the hardware: a static cache
+attends over its whole length on every step, and small models are often
+faster eager. Run this file to see compile time and speedup for the
+configured model before enabling it.
+"""
+
+import time
+from typing import Dict, List, Optional
+
+import torch
+
+# Tokens generated per warmup run and per speed measurement
+WARMUP_TOKENS = 4
+MEASURE_TOKENS = 32
+
+
+class CompiledGenerator:
+    """Static-cache, compiled single-sequence generation for a loaded model."""
+
+    def __init__(self, model, max_length: int, buckets: List[int]):
+        """
+        Initialize the generator; nothing is compiled until warmup() or the first generation.
+
+        Args:
+            model: The loaded causal language model
+            max_length: The model's context size, always the largest bucket
+            buckets: Static cache sizes (prompt plus reply tokens) to compile
+        """
+        from transformers import CompileConfig
+
+        self.model = model
+        self.buckets = sorted({size for size in buckets if 0 < size < max_length} | {max_length})
+        self.caches: Dict[int, "StaticCache"] = {}
+        self.compile_config = CompileConfig(fullgraph=False, dynamic=False, mode="default")
+        # transformers only compiles generation on CUDA unless told otherwise
+        self.compile_config._compile_all_devices = True
+
+    def bucket(self, length: int) -> int:
+        """The smallest cache size that holds length tokens."""
+        return next((size for size in self.buckets if size >= length), self.buckets[-1])
+
+    def cache(self, size: int) -> "StaticCache":
+        """The emptied static cache of one bucket, allocated on first use."""
+        from transformers import StaticCache
+
+        cache = self.caches.get(size)
+        if cache is None:
+            cache = self.caches[size] = StaticCache(
+                config=self.model.config,
+                max_batch_size=1,
+                max_cache_len=size,
+                device=self.model.device,
+                dtype=self.model.dtype
+            )
+        else:
+            cache.reset()
+        return cache
+
+    def generate_kwargs(self, prompt_length: int, max_new_tokens: int) -> Dict:
+        """Extra model.generate arguments for a prompt: the static cache of the bucket that fits."""
+        return {
+            'past_key_values': self.cache(self.bucket(prompt_length + max_new_tokens)),
+            'compile_config': self.compile_config,
+        }
+
+    def _seconds(self, input_ids: torch.Tensor, new_tokens: int, pad_token_id: int,
+                 size: Optional[int] = None) -> float:
+        """Time a greedy generation of exactly new_tokens tokens, compiled for a cache size or eager."""
+        kwargs = {'past_key_values': self.cache(size), 'compile_config': self.compile_config} if size else {}
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            self.model.generate(
+                input_ids=input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                max_new_tokens=new_tokens,
+                min_new_tokens=new_tokens,
+                do_sample=False,
+                pad_token_id=pad_token_id,
+                **kwargs
+            )
+        return time.perf_counter() - start_time
+
+    def warmup(self, tokenizer, prompt: str) -> Dict[str, float]:
+        """
+        Compile every bucket, then compare steady-state speed with eager generation.
+
+        Args:
+            tokenizer: Tokenizer of the model
+            prompt: A typical prompt for the speed comparison (cut to fit the smallest bucket)
+
+        Returns:
+            Number of buckets, compile seconds, eager and compiled milliseconds per token, and the speedup
+        """
+        room = max(self.buckets[0] - MEASURE_TOKENS, 1)
+        input_ids = tokenizer(prompt, return_tensors='pt')['input_ids'][:, -room:].to(self.model.device)
+        pad_token_id = tokenizer.eos_token_id
+
+        start_time = time.perf_counter()
+        for size in self.buckets:
+            self._seconds(input_ids[:, -max(size - WARMUP_TOKENS, 1):], WARMUP_TOKENS, pad_token_id, size)
+        compile_seconds = time.perf_counter() - start_time
+
+        size = self.bucket(input_ids.shape[1] + MEASURE_TOKENS)
+        eager = sorted(self._seconds(input_ids, MEASURE_TOKENS, pad_token_id) for _ in range(3))[1]
+        compiled = sorted(self._seconds(input_ids, MEASURE_TOKENS, pad_token_id, size) for _ in range(3))[1]
+        return {
+            'buckets': len(self.buckets),
+            'compile_seconds': compile_seconds,
+            'eager_ms_per_token': eager / MEASURE_TOKENS * 1000,
+            'compiled_ms_per_token': compiled / MEASURE_TOKENS * 1000,
+            'speedup': eager / compiled,
+        }
+
+
+def main():
+    """Measure compile time and speedup of compiled generation for the configured model."""
+    import argparse
+    import json
+    from colorama import Fore, Style
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    import config
+    from context_builder import model_token_budget
+    from snapshot import find_snapshot
+
+    parser = argparse.ArgumentParser(description="Compare compiled static-cache generation with eager generation")
+    parser.add_argument('--model', default=config.MODEL_NAME)
+    parser.add_argument('--buckets', type=int, nargs='+', default=config.COMPILE_BUCKETS,
+                        help="Static cache sizes to compile")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    source = config.MODEL_SNAPSHOT_DIR if find_snapshot(config.MODEL_SNAPSHOT_DIR, args.model) else args.model
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForCausalLM.from_pretrained(source, torch_dtype=torch.float32).eval()
+
+    generator = CompiledGenerator(model, model_token_budget(model, tokenizer, 0), args.buckets)
+    results = generator.warmup(tokenizer, config.SYSTEM_PROMPT)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{Fore.CYAN}Compiled generation for {args.model}{Style.RESET_ALL}")
+    print(f"  Compile:    {results['compile_seconds']:.1f}s for cache sizes {generator.buckets}")
+    print(f"  Latency:    {results['eager_ms_per_token']:.1f}ms eager -> "
+          f"{results['compiled_ms_per_token']:.1f}ms compiled per token")
+    worth = results['speedup'] > 1
+    color = Fore.GREEN if worth else Fore.YELLOW
+    advice = "worth enabling (COMPILE_MODEL = True)" if worth else "eager is faster; keep COMPILE_MODEL = False"
+    print(f"{color}{results['speedup']:.2f}x eager speed: {advice}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,10 @@ MODEL_NAME = "distilgpt2"  # Default: fast, lightweight, good for beginners
 # MODEL_NAME = "microsoft/DialoGPT-medium" # Better for conversations
 # MODEL_NAME = "facebook/opt-350m"         # Alternative option
 # If you have your own model, run setup.bat and place the files in the models/ directory then rename the MODEL_NAME here.
+
+# Offline snapshot (created with: python snapshot.py)
+MODEL_SNAPSHOT_DIR = "models/snapshot"  # Used instead of downloading when it holds MODEL_NAME
+SNAPSHOT_DTYPE = "float32"              # Weight type stored in the snapshot (float32 for CPU)
 # =============================================================================
 # PERFORMANCE SETTINGS
 # =============================================================================
@@ -25,6 +29,13 @@ MODEL_NAME = "distilgpt2"  # Default: fast, lightweight, good for beginners
 USE_GPU = True           # Set to False if you have GPU problems
 GPU_MEMORY_LIMIT = None  # None = use all available GPU memory (in GB)
 
+# CPU Settings
+CPU_QUANTIZATION = None  # "int8" = smaller and faster on CPU (check quality with: python quantization.py)
+TUNING_PROFILE_PATH = "data/tuning_profile.json"  # Best CPU settings found by: python autotune.py (None = off)
+
+# Assisted Decoding (a small draft model proposes tokens that MODEL_NAME checks)
+DRAFT_MODEL_NAME = None  # e.g. "distilgpt2" with MODEL_NAME = "gpt2" (None = off)
+
 # Response Settings
 MAX_RESPONSE_LENGTH = 150    # How long responses can be
 RESPONSE_CREATIVITY = 0.3    # 0.1 = boring, 1.0 = very creative
@@ -38,7 +49,7 @@ CONVERSATION_MEMORY = 10      # How many exchanges to remember
 ENABLE_WEB_SEARCH = True  # Set to False to disable internet features
 
 # Logging (saves your conversations)
-ENABLE_LOGGING = True     # Set to False to disable conversation logs
+ENABLE_LOGGING = True     # Set to False to keep conversation text out of the logs and the conversation store
 LOG_FILE = "logs/assistant.log"
 
 # =============================================================================
@@ -53,19 +64,70 @@ DO_SAMPLE = True
 PAD_TOKEN_ID = 50256
 REPETITION_PENALTY = 1.1
 LENGTH_PENALTY = 1.0
+GENERATION_SEED = None  # Fixed sampling seed: the same prompt then always gets the same reply (None = random)
+
+# Prefix Cache Settings
+PREFIX_CACHE = True  # Reuse computed attention states for the repeated part of the prompt
+
+# Response Cache Settings
+RESPONSE_CACHE = True  # Answer repeated prompts without generating (only when DO_SAMPLE is False or GENERATION_SEED is set)
+RESPONSE_CACHE_SIZE = 512  # Replies kept
+RESPONSE_CACHE_MB = 16     # Memory for cached replies
+RESPONSE_CACHE_TTL = 3600  # Seconds a reply stays valid (None = until evicted)
 
 # GPU Technical Settings
 GPU_DEVICE = 0 # Which GPU to use (0 = first GPU)
 
-TORCH_DTYPE = "float16"
+TORCH_DTYPE = "float16"  # "float16"/"bfloat16" = half the memory on GPU; only "bfloat16" also applies on CPU (where natively supported); "auto" = tuned dtype on CPU, float16 on GPU
+
+# Precision Technical Settings
+PRECISION_DRIFT_CHECK = True  # Compare half-precision CPU outputs with float32 before using them
+PRECISION_MAX_KL = 0.01       # Largest acceptable drift (KL divergence per token) before falling back to float32
+
+# Compiled Generation Technical Settings
+COMPILE_MODEL = False  # Compile generation with a static KV cache (slower startup; compiled_generation.py shows if it pays off)
+COMPILE_BUCKETS = [256, 512]  # Static cache sizes compiled and warmed up at startup (the model's context size is always added)
+
+# CPU Technical Settings
+TORCH_THREADS = None          # Threads per generation step (None = from the tuning profile or PyTorch's default)
+TORCH_INTEROP_THREADS = None  # Threads running independent operations side by side (None = same)
+
+# Assisted Decoding Technical Settings
+DRAFT_NUM_TOKENS = 5  # Tokens the draft model proposes per step to start with (adjusted automatically)
+
+# Quantization Technical Settings
+QUANTIZATION_MAX_PERPLEXITY_INCREASE = 0.05  # Largest acceptable quality loss for int8 (5%)
 
 # Logging Technical Settings
 LOG_LEVEL = "INFO"
-LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"  # Used when LOG_JSON is False
+LOG_JSON = True              # Write one JSON record per line (session, token counts, stage timings)
+LOG_MAX_BYTES = 10 * 1024 * 1024  # Rotate the log file at this size (0 = never)
+LOG_ROTATE_SECONDS = 24 * 60 * 60  # Rotate the log file at this age (None = never)
+LOG_BACKUP_COUNT = 5         # Rotated log files kept
+LOG_COMPRESS = True          # Gzip rotated log files
+LOG_QUEUE_SIZE = 10000       # Records buffered for the background writer
+LOG_SAMPLE_RATE = 10         # When the buffer is nearly full, keep 1 in N info records
+
+# Metrics Technical Settings
+METRICS_WINDOW = 1000  # Recent requests the 'stats' percentiles are computed over
+PROFILE_DIR = None     # Directory for a per-request profiler trace (None = profiling off)
 
 # Conversation Technical Settings
+CONTEXT_TOKEN_BUDGET = None  # Max prompt tokens (None = model context size minus MAX_LENGTH)
+CONTEXT_EXCHANGES = 3  # Past exchanges that may be included in the prompt
+RETRIEVAL_MEMORY = True  # Include the most relevant past exchanges instead of only the latest ones
+RETRIEVAL_MEMORY_SIZE = 200  # Past exchanges per session that can be retrieved
+RETRIEVAL_RECENT = 1  # Latest exchanges always included so follow-up questions keep their context
+SYSTEM_PROMPT = "You are a helpful AI assistant. Please provide clear, concise, and helpful responses to the user's questions."
 MAX_LENGTH = MAX_RESPONSE_LENGTH  # Don't change this
 MAX_CONVERSATION_HISTORY = CONVERSATION_MEMORY  # Don't change this
+SESSION_MEMORY_LIMIT_MB = 256  # Memory for all sessions' history and caches before idle ones are evicted
+MAX_SESSIONS = 1000  # Sessions kept before the least recently used are evicted
+CONVERSATION_STORE_PATH = "data/conversations.db"  # Saves conversations so they survive restarts (None = memory only; needs ENABLE_LOGGING)
+RESUME_LAST_SESSION = True  # Continue the most recent saved conversation at startup
+STORE_BATCH_SIZE = 16  # Exchanges saved in one database write
+STORE_FLUSH_SECONDS = 2.0  # Longest an exchange waits before it is saved
 CONVERSATION_SEPARATOR = "\n\nHuman: "
 ASSISTANT_PREFIX = "\n\nAssistant: "
 ALLOW_INTERNET = ENABLE_WEB_SEARCH  # Don't change this
@@ -73,7 +135,24 @@ ALLOW_INTERNET = ENABLE_WEB_SEARCH  # Don't change this
 # Web Search Technical Settings
 SEARCH_API_URL = "https://api.duckduckgo.com/"
 MAX_SEARCH_RESULTS = 3
-SEARCH_TIMEOUT = 10
+SEARCH_TIMEOUT = 10          # Total seconds a search may take (all providers run in parallel)
+SEARCH_SCRAPE_URL = "https://duckduckgo.com/html/"
+SEARCH_RETRIES = 1           # Quick retries for failed connections or server errors, within SEARCH_TIMEOUT
+SEARCH_POOL_SIZE = 4         # Kept-alive connections per search host
+SEARCH_CACHE = True          # Reuse results of recent identical searches
+SEARCH_CACHE_PATH = "data/search_cache.db"  # None = keep cached results in memory only
+SEARCH_CACHE_SIZE = 256      # Results kept in memory
+SEARCH_CACHE_DISK_SIZE = 5000  # Results kept on disk
+SEARCH_CACHE_TTL = 3600      # Seconds a result stays valid
+SEARCH_CACHE_FRESH_TTL = 300  # Seconds for time-sensitive queries (news, weather, prices)
+
+# Server Technical Settings (python server.py)
+SERVER_HOST = "127.0.0.1"  # Only reachable from this machine
+SERVER_PORT = 8000
+BATCH_MAX_SIZE = 8         # Most requests generated together in one batch
+BATCH_MAX_WAIT_MS = 20     # How long to wait for more requests before generating
+SERVER_WORKERS = 1         # Worker processes sharing the model weights (Linux/macOS; 1 = serve in-process)
+WORKER_THREADS = None      # Cores and generation threads per worker (None = split the cores evenly)
 
 # Training Technical Settings (for advanced users only)
 TRAINING_DATA_PATH = "data/training_data.json"
@@ -88,3 +167,6 @@ MAX_GRAD_NORM = 1.0
 WARMUP_STEPS = 500
 WEIGHT_DECAY = 0.01
 DATALOADER_NUM_WORKERS = 0
+TRAINING_BLOCK_SIZE = 512  # Tokens per packed training sequence (at most the model's context size)
+TOKENIZE_WORKERS = None    # Processes tokenizing the training data (None = one per core)
+DATASET_CACHE_DIR = "data/token_cache"  # Tokenized training data, reused until the data or tokenizer changes
@@ -0,0 +1,103 @@
+"""
+Token-budgeted prompt assembly for the Mini GPT Assistant.
+
+Prompts are built directly from token IDs. Each exchange is tokenized once
+when it is added to the history, and the prompt never exceeds a fixed token
+budget: the oldest exchanges, or with a retrieval memory the least relevant
+ones, are dropped first when space runs out.
+"""
+
+from array import array
+from itertools import islice
+from typing import List, Optional, Sequence
+
+import config
+from sessions import Exchange
+
+
+class ContextBuilder:
+    """Builds prompt token IDs from the system prompt, history and new input."""
+
+    def __init__(self, tokenizer, budget: int, max_exchanges: int = 3):
+        """
+        Initialize the context builder.
+
+        Args:
+            tokenizer: Tokenizer of the loaded model
+            budget: Maximum number of prompt tokens
+            max_exchanges: Maximum number of past exchanges to include
+        """
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self.max_exchanges = max_exchanges
+        self.system_ids = self.encode(config.SYSTEM_PROMPT + "\n\n")
+
+    def encode(self, text: str) -> List[int]:
+        """Tokenize text without special tokens."""
+        return self.tokenizer(text, add_special_tokens=False)['input_ids']
+
+    def encode_exchange(self, user_input: str, assistant_response: str) -> List[int]:
+        """Tokenize a past exchange the way it appears in the prompt."""
+        return self.encode(f"Human: {user_input}\nAssistant: {assistant_response}\n")
+
+    def build(self, history: Sequence[Exchange], user_input: str, search_results: Optional[str] = None,
+              relevant: Optional[Sequence[Exchange]] = None) -> List[int]:
+        """
+        Assemble the prompt token IDs.
+
+        The system prompt and the new input are always included, search
+        results are truncated to the remaining space, and past exchanges are
+        added newest first, or in the order given by relevant, until the
+        budget is used up. Included exchanges appear in the order they happened.
+
+        Args:
+            history: Conversation history, oldest first
+            user_input: The new user message
+            search_results: Optional web search results to include
+            relevant: Past exchanges to include instead of the latest ones, most important first
+
+        Returns:
+            Token IDs of the prompt
+        """
+        available = max(self.budget - len(self.system_ids), 1)
+
+        # Keep the end of an overlong input so the prompt still ends with the turn marker
+        turn_ids = self.encode(f"Human: {user_input}\nAssistant:")[-available:]
+        available -= len(turn_ids)
+
+        search_ids: List[int] = []
+        if search_results:
+            search_ids = self.encode(f"Web search results: {search_results}\n\n")[:available]
+            available -= len(search_ids)
+
+        if relevant is None:
+            relevant = list(islice(reversed(history), self.max_exchanges or 0))
+
+        selected = []
+        for exchange in relevant[:self.max_exchanges or 0]:
+            exchange_ids = exchange.token_ids
+            if not exchange_ids:
+                # Loaded from a store written with another tokenizer
+                exchange_ids = exchange.token_ids = array('I', self.encode_exchange(exchange.user, exchange.assistant))
+            if len(exchange_ids) > available:
+                break
+            selected.append(exchange)
+            available -= len(exchange_ids)
+
+        input_ids = list(self.system_ids)
+        for exchange in sorted(selected, key=lambda exchange: exchange.timestamp):
+            input_ids.extend(exchange.token_ids)
+        # Search results go before the new turn so the prompt ends with the turn marker
+        input_ids.extend(search_ids)
+        input_ids.extend(turn_ids)
+        return input_ids
+
+
+def model_token_budget(model, tokenizer, max_new_tokens: int) -> int:
+    """Largest prompt that leaves room for max_new_tokens in the model's context window."""
+    max_positions = (
+        getattr(model.config, 'n_positions', None)
+        or getattr(model.config, 'max_position_embeddings', None)
+        or tokenizer.model_max_length
+    )
+    return max(max_positions - max_new_tokens, 1)
@@ -0,0 +1,193 @@
+"""
+Durable conversation store for the Mini GPT Assistant.
+
+Exchanges are appended to a SQLite database by a background writer thread in
+batches, so saving never waits for the disk on the chat path. Sessions are
+read back lazily: only the most recent window of a session is loaded when it
+is resumed, never the full transcript. Reads see exchanges that are still
+waiting to be written without waiting for the writer.
+"""
+
+import os
+import time
+import atexit
+import queue
+import logging
+import sqlite3
+import threading
+from array import array
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from sessions import Exchange
+
+
+class ConversationStore:
+    """Append-only SQLite store of exchanges, written in batches."""
+
+    def __init__(self, path: str, model_name: str, batch_size: int = 16, flush_interval: float = 2.0):
+        """
+        Open the store and start its writer thread.
+
+        Args:
+            path: SQLite database file
+            model_name: Model whose tokenizer produced the stored token IDs
+            batch_size: Exchanges written in one transaction
+            flush_interval: Seconds pending exchanges may wait before being written
+        """
+        self.logger = logging.getLogger('ConversationStore')
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self.pending: "queue.Queue" = queue.Queue()
+        # Queued exchanges not yet committed, oldest first; the writer removes them under self.lock
+        self.unsaved: Deque[Tuple[str, Exchange]] = deque()
+        self.unsaved_lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS exchanges ("
+            "id INTEGER PRIMARY KEY, session_id TEXT NOT NULL, timestamp REAL NOT NULL, "
+            "user TEXT NOT NULL, assistant TEXT NOT NULL, model TEXT NOT NULL, token_ids BLOB)"
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS exchanges_session ON exchanges (session_id, id)")
+        self.db.commit()
+
+        self.closed = False
+        self.thread = threading.Thread(target=self._run, name="ConversationStore", daemon=True)
+        self.thread.start()
+        atexit.register(self.close)
+
+    def append(self, session_id: str, exchange: Exchange):
+        """Queue an exchange to be written with the next batch."""
+        with self.unsaved_lock:
+            self.unsaved.append((session_id, exchange))
+            self.pending.put((session_id, exchange))
+
+    def _unsaved(self, session_id: Optional[str] = None) -> List[Exchange]:
+        """Queued exchanges of a session (or all sessions) not written yet; self.lock must be held."""
+        with self.unsaved_lock:
+            return [exchange for owner, exchange in self.unsaved if session_id is None or owner == session_id]
+
+    def flush(self):
+        """Block until every queued exchange has been written."""
+        done = threading.Event()
+        self.pending.put(done)
+        done.wait()
+
+    def _run(self):
+        """Writer loop: collect exchanges and write them once the batch is full or old enough."""
+        batch: List[Tuple[str, Exchange]] = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.pending.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if isinstance(item, tuple):
+                batch.append(item)
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+                if len(batch) < self.batch_size:
+                    continue
+
+            self._write(batch)
+            batch, deadline = [], None
+            if isinstance(item, threading.Event):
+                item.set()
+
+    def _write(self, batch: List[Tuple[str, Exchange]]):
+        """Write a batch of exchanges in one transaction."""
+        if not batch:
+            return
+        rows = [
+            (session_id, exchange.timestamp, exchange.user, exchange.assistant, self.model_name,
+             exchange.token_ids.tobytes())
+            for session_id, exchange in batch
+        ]
+        with self.lock:
+            try:
+                self.db.executemany(
+                    "INSERT INTO exchanges (session_id, timestamp, user, assistant, model, token_ids) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", rows
+                )
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to save {len(rows)} exchanges: {e}")
+            # Readers hold self.lock, so they see each exchange either saved or unsaved, never both
+            with self.unsaved_lock:
+                for _ in batch:
+                    self.unsaved.popleft()
+
+    def load_recent(self, session_id: str, limit: Optional[int]) -> List[Exchange]:
+        """
+        Load the most recent exchanges of a session, oldest first.
+
+        Token IDs saved for a different model are left out; they are
+        re-tokenized when the exchange is next used in a prompt. Exchanges
+        still waiting to be written are included.
+        """
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT timestamp, user, assistant, model, token_ids FROM exchanges "
+                "WHERE session_id = ? ORDER BY id DESC LIMIT ?",
+                (session_id, -1 if limit is None else limit)
+            ).fetchall()
+            unsaved = self._unsaved(session_id)
+
+        exchanges = []
+        for timestamp, user, assistant, model, blob in reversed(rows):
+            token_ids = array('I')
+            if blob and model == self.model_name:
+                token_ids.frombytes(blob)
+            exchanges.append(Exchange(user, assistant, token_ids, timestamp))
+        exchanges.extend(unsaved)
+        return exchanges if limit is None else exchanges[max(len(exchanges) - limit, 0):]
+
+    def count(self, session_id: str) -> int:
+        """Number of stored exchanges of a session, including those not written yet."""
+        with self.lock:
+            saved = self.db.execute("SELECT COUNT(*) FROM exchanges WHERE session_id = ?", (session_id,)).fetchone()[0]
+            return saved + len(self._unsaved(session_id))
+
+    def last_session_id(self) -> Optional[str]:
+        """The session with the most recent exchange, if any."""
+        with self.unsaved_lock:
+            if self.unsaved:
+                return self.unsaved[-1][0]
+        with self.lock:
+            row = self.db.execute("SELECT session_id FROM exchanges ORDER BY id DESC LIMIT 1").fetchone()
+        return row[0] if row else None
+
+    def recent_sessions(self, limit: int = 10) -> List[Tuple[str, float, int]]:
+        """(session_id, last exchange time, exchange count) of the most recently used sessions."""
+        self.flush()
+        with self.lock:
+            return self.db.execute(
+                "SELECT session_id, MAX(timestamp), COUNT(*) FROM exchanges "
+                "GROUP BY session_id ORDER BY MAX(id) DESC LIMIT ?", (limit,)
+            ).fetchall()
+
+    def delete_session(self, session_id: str):
+        """Delete every stored exchange of a session."""
+        self.flush()
+        with self.lock:
+            try:
+                self.db.execute("DELETE FROM exchanges WHERE session_id = ?", (session_id,))
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.logger.error(f"Failed to delete session {session_id}: {e}")
+
+    def close(self):
+        """Write pending exchanges and close the database."""
+        if self.closed:
+            return
+        self.flush()
+        with self.lock:
+            self.closed = True
+            self.db.close()
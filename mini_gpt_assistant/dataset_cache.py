@@ -0,0 +1,287 @@
+"""
+Pre-tokenized training data for the Mini GPT Assistant.
+
+Conversation JSON/JSONL is tokenized once into a flat token file with an
+offset index, both memory-mapped when training. Each conversation is stored
+in the format the assistant uses in its prompt, followed by EOS, so the token
+file is already the packed training stream: blocks are slices of it, read
+from disk as they are needed instead of being held in memory.
+
+A prepared dataset is kept in DATASET_CACHE_DIR under a key made of the
+tokenizer's fingerprint and the data file's path, size and modification
+time. It is reused across runs and rebuilt when the data or tokenizer
+changes:
+
+    python dataset_cache.py --data data/training_data.json
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+from array import array
+from itertools import chain
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+
+import config
+
+# Bump when the stored format or the conversation format changes
+FORMAT_VERSION = 1
+
+# Conversations tokenized per call, and per task sent to a worker process
+TOKENIZE_CHUNK = 1000
+
+_worker_tokenizer = None
+
+
+def iter_conversations(path: str) -> Iterator[Dict[str, str]]:
+    """
+    Input/output pairs from a JSON or JSONL file.
+
+    JSONL is read line by line; a JSON file has to be parsed as a whole.
+    """
+    with open(path, encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            conversations = (json.loads(line) for line in f if line.strip())
+        else:
+            data = json.load(f)
+            conversations = iter(data['conversations'] if isinstance(data, dict) else data)
+        for conversation in conversations:
+            if conversation.get('input') and conversation.get('output'):
+                yield conversation
+
+
+def format_conversation(conversation: Dict[str, str]) -> str:
+    """An exchange in the format the assistant puts past exchanges in its prompt."""
+    return f"Human: {conversation['input']}\nAssistant: {conversation['output']}\n"
+
+
+def tokenizer_fingerprint(tokenizer) -> str:
+    """Hash of everything that decides how a tokenizer splits text."""
+    digest = hashlib.sha256(type(tokenizer).__name__.encode('utf-8'))
+    if getattr(tokenizer, 'is_fast', False):
+        digest.update(tokenizer.backend_tokenizer.to_str().encode('utf-8'))
+    else:
+        digest.update(json.dumps(tokenizer.get_vocab(), sort_keys=True).encode('utf-8'))
+    digest.update(str(tokenizer.eos_token_id).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def cache_key(data_path: str, fingerprint: str) -> str:
+    """Key of a prepared dataset: the data file's identity and the tokenizer fingerprint."""
+    stat = os.stat(data_path)
+    source = f"{os.path.abspath(data_path)}:{stat.st_size}:{stat.st_mtime_ns}:{FORMAT_VERSION}"
+    return hashlib.sha256(f"{source}:{fingerprint}".encode('utf-8')).hexdigest()[:24]
+
+
+def _init_tokenize_worker(tokenizer_source: str):
+    """Load the tokenizer once per worker process."""
+    global _worker_tokenizer
+    from transformers import AutoTokenizer
+
+    # Each worker is one process; parallelism inside it would only oversubscribe the cores
+    os.environ['TOKENIZERS_PARALLELISM'] = 'false'
+    _worker_tokenizer = AutoTokenizer.from_pretrained(tokenizer_source)
+
+
+def _tokenize_chunk(texts: List[str], tokenizer=None) -> List[List[int]]:
+    tokenizer = tokenizer or _worker_tokenizer
+    return tokenizer(texts, add_special_tokens=False)['input_ids']
+
+
+class TokenDataset:
+    """A prepared dataset: memory-mapped token IDs and per-conversation offsets."""
+
+    def __init__(self, directory: str):
+        """Open a prepared dataset; nothing is read until it is used."""
+        self.directory = directory
+        with open(os.path.join(directory, 'meta.json'), encoding='utf-8') as f:
+            self.meta = json.load(f)
+        self.tokens = np.memmap(os.path.join(directory, 'tokens.bin'), dtype=self.meta['dtype'], mode='r')
+        self.offsets = np.memmap(os.path.join(directory, 'offsets.bin'), dtype=np.int64, mode='r')
+
+    def __len__(self) -> int:
+        """Number of conversations."""
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        """Token IDs of one conversation, including its closing EOS."""
+        return self.tokens[self.offsets[index]:self.offsets[index + 1]]
+
+    @property
+    def num_tokens(self) -> int:
+        return len(self.tokens)
+
+
+class PackedBlocks:
+    """
+    Fixed-length training blocks cut from a token dataset.
+
+    A torch Dataset (it only needs __len__ and __getitem__); each block is
+    read from the memory-mapped tokens when it is requested. Tokens after the
+    last full block are dropped, and data shorter than one block is a single
+    shorter block.
+    """
+
+    def __init__(self, dataset: TokenDataset, block_size: int):
+        self.tokens = dataset.tokens
+        self.block_size = min(block_size, dataset.num_tokens)
+
+    def __len__(self) -> int:
+        return len(self.tokens) // self.block_size
+
+    def __getitem__(self, index: int):
+        import torch
+
+        start = index * self.block_size
+        return torch.from_numpy(self.tokens[start:start + self.block_size].astype(np.int64))
+
+
+def build_dataset(data_path: str, tokenizer, tokenizer_source: str, directory: str,
+                  workers: Optional[int] = None) -> TokenDataset:
+    """
+    Tokenize a conversation file into a prepared dataset directory.
+
+    Conversations are tokenized in chunks, spread over worker processes, and
+    written out as they are done, so the corpus is never held in memory as tokens.
+
+    Args:
+        data_path: Conversation JSON or JSONL file
+        tokenizer: Tokenizer used in this process when there are no worker processes
+        tokenizer_source: Where worker processes load the same tokenizer from
+        directory: Directory to write; it only appears once it is complete
+        workers: Worker processes (None = one per core)
+    """
+    workers = workers or os.cpu_count() or 1
+    dtype = np.uint16 if len(tokenizer) <= np.iinfo(np.uint16).max else np.uint32
+    staging = f"{directory}.tmp{os.getpid()}"
+    os.makedirs(staging, exist_ok=True)
+
+    pool = None
+    if workers > 1:
+        # The tokenizers' thread pool cannot be forked
+        os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        pool = ProcessPoolExecutor(workers, initializer=_init_tokenize_worker, initargs=(tokenizer_source,))
+
+    def write(chunks: List[List[str]]):
+        nonlocal position
+        if pool is not None:
+            results = pool.map(_tokenize_chunk, chunks)
+        else:
+            results = (_tokenize_chunk(chunk, tokenizer) for chunk in chunks)
+        for sequences in results:
+            lengths = np.fromiter((len(ids) + 1 for ids in sequences), dtype=np.int64, count=len(sequences))
+            tokens = chain.from_iterable(ids + [tokenizer.eos_token_id] for ids in sequences)
+            np.fromiter(tokens, dtype=dtype, count=int(lengths.sum())).tofile(tokens_file)
+            (position + np.cumsum(lengths)).tofile(offsets_file)
+            position += int(lengths.sum())
+
+    start_time = time.perf_counter()
+    conversations = 0
+    position = 0
+    try:
+        with open(os.path.join(staging, 'tokens.bin'), 'wb') as tokens_file, \
+                open(os.path.join(staging, 'offsets.bin'), 'wb') as offsets_file:
+            array('q', [0]).tofile(offsets_file)
+            chunks: List[List[str]] = [[]]
+            for conversation in iter_conversations(data_path):
+                chunks[-1].append(format_conversation(conversation))
+                conversations += 1
+                if len(chunks[-1]) == TOKENIZE_CHUNK:
+                    # One chunk per worker in flight bounds the memory used
+                    if len(chunks) == workers:
+                        write(chunks)
+                        chunks = []
+                    chunks.append([])
+            write([chunk for chunk in chunks if chunk])
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if not position:
+        shutil.rmtree(staging)
+        raise ValueError(f"no conversations with both 'input' and 'output' in {data_path}")
+
+    with open(os.path.join(staging, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump({
+            'source': os.path.abspath(data_path),
+            'fingerprint': tokenizer_fingerprint(tokenizer),
+            'format_version': FORMAT_VERSION,
+            'dtype': np.dtype(dtype).name,
+            'conversations': conversations,
+            'tokens': position,
+            'seconds': time.perf_counter() - start_time,
+        }, f, indent=2)
+    os.replace(staging, directory)
+    return TokenDataset(directory)
+
+
+def prepare_dataset(data_path: str, tokenizer, tokenizer_source: str, cache_dir: Optional[str] = None,
+                    workers: Optional[int] = None) -> TokenDataset:
+    """
+    Open the prepared dataset for a data file and tokenizer, building it if needed.
+
+    Prepared copies of the same data file made with another tokenizer, or
+    from an older version of it, are removed.
+
+    Args:
+        data_path: Conversation JSON or JSONL file
+        tokenizer: Tokenizer of the model to train
+        tokenizer_source: Where worker processes load the same tokenizer from
+        cache_dir: Where prepared datasets are kept (None = DATASET_CACHE_DIR)
+        workers: Tokenization worker processes (None = one per core)
+    """
+    cache_dir = cache_dir or config.DATASET_CACHE_DIR
+    directory = os.path.join(cache_dir, cache_key(data_path, tokenizer_fingerprint(tokenizer)))
+    if os.path.exists(os.path.join(directory, 'meta.json')):
+        return TokenDataset(directory)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    dataset = build_dataset(data_path, tokenizer, tokenizer_source, directory, workers)
+
+    source = os.path.abspath(data_path)
+    for name in os.listdir(cache_dir):
+        stale = os.path.join(cache_dir, name)
+        if stale == directory or not os.path.exists(os.path.join(stale, 'meta.json')):
+            continue
+        try:
+            with open(os.path.join(stale, 'meta.json'), encoding='utf-8') as f:
+                if json.load(f).get('source') == source:
+                    shutil.rmtree(stale)
+        except (OSError, ValueError):
+            continue
+    return dataset
+
+
+def main():
+    """Prepare the training data for the configured model's tokenizer."""
+    import argparse
+    from colorama import Fore, Style
+    from transformers import AutoTokenizer
+
+    from snapshot import find_snapshot
+
+    parser = argparse.ArgumentParser(description="Tokenize training data into the dataset cache")
+    parser.add_argument('--data', default=config.TRAINING_DATA_PATH, help="Conversation JSON or JSONL file")
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Model whose tokenizer is used")
+    parser.add_argument('--cache-dir', default=config.DATASET_CACHE_DIR)
+    args = parser.parse_args()
+
+    source = config.MODEL_SNAPSHOT_DIR if find_snapshot(config.MODEL_SNAPSHOT_DIR, args.model) else args.model
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    start_time = time.perf_counter()
+    dataset = prepare_dataset(args.data, tokenizer, source, args.cache_dir, config.TOKENIZE_WORKERS)
+
+    meta = dataset.meta
+    print(f"{Fore.GREEN}{meta['conversations']:,} conversations, {meta['tokens']:,} tokens "
+          f"({meta['dtype']}) in {dataset.directory}{Style.RESET_ALL}")
+    print(f"{Fore.WHITE}Tokenizing took {meta['seconds']:.2f}s; ready in "
+          f"{time.perf_counter() - start_time:.3f}s this time{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
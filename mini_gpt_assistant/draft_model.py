@@ -0,0 +1,75 @@
+"""
+Draft model for assisted (speculative) decoding.
+
+A small draft model sharing the main model's tokenizer, such as distilgpt2
+for gpt2, proposes a few tokens at a time and the main model checks all of
+them in a single forward pass. Every accepted proposal is a token the main
+model did not have to generate on its own, so replies come out with the main
+model's quality at closer to the draft model's speed.
+"""
+
+from typing import Dict
+
+
+class ForwardCounter:
+    """Counts the forward passes of a model through a forward hook."""
+
+    def __init__(self, model):
+        self.count = 0
+        self.handle = model.register_forward_hook(self._hook)
+
+    def _hook(self, module, inputs, outputs):
+        self.count += 1
+
+    def remove(self):
+        self.handle.remove()
+
+
+def load_draft_model(model_name: str, torch_dtype, device: str, num_assistant_tokens: int,
+                     local_files_only: bool = False):
+    """
+    Load a draft model and its tokenizer for assisted decoding.
+
+    Args:
+        model_name: Hugging Face model name or local path of the draft model
+        torch_dtype: dtype to load the weights in, normally the main model's
+        device: Device the main model runs on
+        num_assistant_tokens: Tokens proposed per verification step to start with
+
+    Returns:
+        (model, tokenizer)
+    """
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    tokenizer = AutoTokenizer.from_pretrained(model_name, local_files_only=local_files_only)
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        torch_dtype=torch_dtype,
+        low_cpu_mem_usage=True,
+        local_files_only=local_files_only
+    ).to(device).eval()
+
+    # transformers adapts this number up or down as proposals are accepted or rejected
+    model.generation_config.num_assistant_tokens = num_assistant_tokens
+    return model, tokenizer
+
+
+def tokenizers_match(tokenizer, draft_tokenizer) -> bool:
+    """Whether the draft model's token IDs mean the same as the main model's."""
+    return len(tokenizer) == len(draft_tokenizer) and tokenizer.get_vocab() == draft_tokenizer.get_vocab()
+
+
+def acceptance_stats(generated: int, target_forwards: int, draft_forwards: int) -> Dict[str, float]:
+    """
+    Estimate how many draft tokens were accepted in one assisted generation.
+
+    Every verification pass of the main model keeps the accepted proposals
+    plus one token of its own, and every draft forward pass proposes one token.
+    """
+    accepted = max(generated - target_forwards, 0)
+    return {
+        'proposed': draft_forwards,
+        'accepted': accepted,
+        'acceptance_rate': accepted / draft_forwards if draft_forwards else 0.0,
+        'tokens_per_target_forward': generated / target_forwards if target_forwards else 0.0,
+    }
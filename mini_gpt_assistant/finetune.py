@@ -0,0 +1,213 @@
+"""
+Fine-tuning for the Mini GPT Assistant.
+
+Trains the configured model on conversations from TRAINING_DATA_PATH using
+the Training Technical Settings in config.py:
+
+    python finetune.py                                   # fine-tune the configured model
+    python finetune.py --data data/sample_conversations.json
+    python finetune.py --tiny --max-steps 20             # no downloads, checks the pipeline itself (saved to a temp dir)
+
+Conversations are JSON ({"conversations": [{"input": ..., "output": ...}]},
+as written by demo.py) or JSONL with one {"input", "output"} object per line.
+They are tokenized once in parallel worker processes into the dataset cache
+(see dataset_cache.py) and packed end to end into fixed-length blocks, so no
+compute is spent on padding. The fine-tuned model is saved to OUTPUT_DIR;
+set MODEL_NAME to that directory to chat with it.
+"""
+
+import os
+import sys
+import math
+import time
+import argparse
+import tempfile
+from typing import Dict, Optional
+
+from colorama import Fore, Style
+
+import config
+from dataset_cache import PackedBlocks, prepare_dataset
+
+
+def _optimizer(model, learning_rate: float, weight_decay: float):
+    """AdamW without weight decay on biases and layer norms."""
+    import torch
+
+    decay, no_decay = [], []
+    for name, parameter in model.named_parameters():
+        if parameter.requires_grad:
+            (no_decay if parameter.ndim < 2 else decay).append(parameter)
+    return torch.optim.AdamW(
+        [{'params': decay, 'weight_decay': weight_decay}, {'params': no_decay, 'weight_decay': 0.0}],
+        lr=learning_rate
+    )
+
+
+def train(model, tokenizer, blocks: PackedBlocks, output_dir: str, epochs: int = 1,
+          max_steps: Optional[int] = None) -> Dict:
+    """
+    Train a causal language model on packed blocks.
+
+    Each optimizer step accumulates gradients over GRADIENT_ACCUMULATION_STEPS
+    batches of PER_DEVICE_TRAIN_BATCH_SIZE blocks.
+
+    Returns:
+        Optimizer steps, trained tokens, seconds, tokens per second and the last loss
+    """
+    import torch
+    from torch.utils.data import DataLoader
+    from transformers import get_linear_schedule_with_warmup
+
+    accumulation = max(config.GRADIENT_ACCUMULATION_STEPS, 1)
+    loader = DataLoader(
+        blocks,
+        batch_size=config.PER_DEVICE_TRAIN_BATCH_SIZE,
+        shuffle=True,
+        num_workers=config.DATALOADER_NUM_WORKERS
+    )
+    steps_per_epoch = math.ceil(len(loader) / accumulation)
+    total_steps = min(max_steps or steps_per_epoch * epochs, steps_per_epoch * epochs)
+    if max_steps:
+        epochs = math.ceil(total_steps / steps_per_epoch)
+
+    optimizer = _optimizer(model, config.LEARNING_RATE, config.WEIGHT_DECAY)
+    # Short runs would otherwise never get past the warmup
+    warmup_steps = min(config.WARMUP_STEPS, total_steps // 10)
+    scheduler = get_linear_schedule_with_warmup(optimizer, warmup_steps, total_steps)
+
+    device = model.device
+    print(f"{Fore.CYAN}Training on {len(blocks)} blocks of {blocks.block_size} tokens: {total_steps} steps "
+          f"of {config.PER_DEVICE_TRAIN_BATCH_SIZE} x {accumulation} blocks on {device}{Style.RESET_ALL}")
+
+    model.train()
+    step = 0
+    tokens = 0
+    interval_tokens = 0
+    interval_loss = 0.0
+    interval_batches = 0
+    loss_value = float('nan')
+    start_time = interval_start = time.perf_counter()
+
+    for epoch in range(epochs):
+        for index, batch in enumerate(loader):
+            batch = batch.to(device)
+            loss = model(input_ids=batch, labels=batch).loss
+            (loss / accumulation).backward()
+            interval_loss += loss.item()
+            interval_batches += 1
+            interval_tokens += batch.numel()
+
+            # The last batches of an epoch make a shorter accumulation
+            if (index + 1) % accumulation and index + 1 != len(loader):
+                continue
+            torch.nn.utils.clip_grad_norm_(model.parameters(), config.MAX_GRAD_NORM)
+            optimizer.step()
+            scheduler.step()
+            optimizer.zero_grad(set_to_none=True)
+            step += 1
+
+            if step % config.LOGGING_STEPS == 0 or step == total_steps:
+                now = time.perf_counter()
+                loss_value = interval_loss / interval_batches
+                print(f"{Fore.WHITE}  step {step:>6}/{total_steps}  epoch {epoch + 1}  loss {loss_value:.4f}  "
+                      f"lr {scheduler.get_last_lr()[0]:.2e}  "
+                      f"{interval_tokens / (now - interval_start):,.0f} tokens/s{Style.RESET_ALL}")
+                tokens += interval_tokens
+                interval_tokens, interval_loss, interval_batches, interval_start = 0, 0.0, 0, now
+
+            if config.SAVE_STEPS and step % config.SAVE_STEPS == 0 and step != total_steps:
+                checkpoint_dir = os.path.join(output_dir, f"checkpoint-{step}")
+                model.save_pretrained(checkpoint_dir)
+                tokenizer.save_pretrained(checkpoint_dir)
+            if step == total_steps:
+                break
+        if step == total_steps:
+            break
+
+    elapsed = time.perf_counter() - start_time
+    tokens += interval_tokens
+    return {
+        'steps': step,
+        'tokens': tokens,
+        'seconds': elapsed,
+        'tokens_per_second': tokens / elapsed if elapsed > 0 else 0.0,
+        'loss': loss_value,
+    }
+
+
+def main():
+    """Fine-tuning entry point."""
+    parser = argparse.ArgumentParser(description="Fine-tune the assistant's model on conversation data")
+    parser.add_argument('--data', default=config.TRAINING_DATA_PATH, help="Conversation JSON or JSONL file")
+    parser.add_argument('--output', help="Where to save the fine-tuned model "
+                                         "(default: OUTPUT_DIR, or a temporary directory with --tiny)")
+    parser.add_argument('--epochs', type=int, default=config.NUM_TRAIN_EPOCHS)
+    parser.add_argument('--max-steps', type=int, help="Stop after this many optimizer steps")
+    parser.add_argument('--block-size', type=int, default=config.TRAINING_BLOCK_SIZE,
+                        help="Tokens per packed training sequence")
+    parser.add_argument('--tiny', action='store_true',
+                        help="Use a tiny randomly initialized GPT-2 (no downloads needed)")
+    args = parser.parse_args()
+
+    # The tiny model only checks the pipeline; it must not replace a real fine-tuned model
+    if args.output is None:
+        args.output = tempfile.mkdtemp(prefix='finetune-tiny-') if args.tiny else config.OUTPUT_DIR
+
+    if not os.path.exists(args.data):
+        print(f"{Fore.RED}No training data at {args.data}. Run demo.py to create "
+              f"data/sample_conversations.json, or pass --data.{Style.RESET_ALL}")
+        sys.exit(1)
+
+    import torch
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+    from autotune import apply_thread_settings
+    from context_builder import model_token_budget
+
+    apply_thread_settings(config.TORCH_THREADS, config.TORCH_INTEROP_THREADS)
+    torch.manual_seed(0)
+
+    with tempfile.TemporaryDirectory() as tiny_dir:
+        source = config.MODEL_NAME
+        if args.tiny:
+            from tiny_model import build_tiny_model
+            source = build_tiny_model(tiny_dir)
+        else:
+            from snapshot import find_snapshot
+            if find_snapshot(config.MODEL_SNAPSHOT_DIR, config.MODEL_NAME):
+                source = config.MODEL_SNAPSHOT_DIR
+
+        tokenizer = AutoTokenizer.from_pretrained(source)
+        model = AutoModelForCausalLM.from_pretrained(source, torch_dtype=torch.float32)
+        if config.USE_GPU and torch.cuda.is_available():
+            model.to(f"cuda:{config.GPU_DEVICE}")
+
+        start_time = time.perf_counter()
+        # The tiny tokenizer's copy of the data would replace the real model's in the dataset cache
+        cache_dir = os.path.join(tiny_dir, 'token_cache') if args.tiny else None
+        try:
+            dataset = prepare_dataset(args.data, tokenizer, source, cache_dir, workers=config.TOKENIZE_WORKERS)
+        except ValueError as e:
+            print(f"{Fore.RED}{str(e).capitalize()}{Style.RESET_ALL}")
+            sys.exit(1)
+        blocks = PackedBlocks(dataset, min(args.block_size, model_token_budget(model, tokenizer, 0)))
+        print(f"{Fore.CYAN}{len(dataset):,} conversations ({dataset.num_tokens:,} tokens) ready in "
+              f"{time.perf_counter() - start_time:.2f}s; {len(blocks) * blocks.block_size:,} tokens packed "
+              f"into {len(blocks)} blocks{Style.RESET_ALL}")
+
+        results = train(model, tokenizer, blocks, args.output, args.epochs, args.max_steps)
+
+    model.save_pretrained(args.output)
+    tokenizer.save_pretrained(args.output)
+    print(f"{Fore.GREEN}Trained {results['steps']} steps, {results['tokens']:,} tokens in "
+          f"{results['seconds']:.1f}s ({results['tokens_per_second']:,.0f} tokens/s), "
+          f"final loss {results['loss']:.4f}{Style.RESET_ALL}")
+    if args.tiny:
+        print(f"{Fore.GREEN}Tiny model saved to {args.output}{Style.RESET_ALL}")
+    else:
+        print(f"{Fore.GREEN}Model saved to {args.output}; set MODEL_NAME = \"{args.output}\" "
+              f"in config.py to use it.{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
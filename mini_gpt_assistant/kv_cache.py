@@ -0,0 +1,82 @@
+"""
+Prompt prefix KV cache for the Mini GPT Assistant.
+
+Consecutive prompts share most of their tokens (the system prompt and the
+earlier exchanges), so the attention key/value states computed for one
+generation are kept and reused for the longest common token prefix of the
+next prompt. Only the tokens after that prefix have to be prefilled.
+"""
+
+import threading
+from typing import List, Optional, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from transformers import DynamicCache
+
+
+class PrefixCache:
+    """Keeps the KV cache of the last generated sequence for prefix reuse."""
+
+    def __init__(self):
+        """Initialize an empty prefix cache."""
+        self.token_ids: List[int] = []
+        self.cache: Optional["DynamicCache"] = None
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+
+    def take(self, input_ids: List[int]) -> Tuple[Optional["DynamicCache"], int]:
+        """
+        Take the cached states matching the longest common prefix of a prompt.
+
+        The cache is removed from the store until it is put back with store(),
+        so two generations never extend the same cache object.
+
+        Args:
+            input_ids: Token IDs of the full prompt
+
+        Returns:
+            The cropped cache (or None) and the number of reused tokens
+        """
+        with self.lock:
+            cache, cached_ids = self.cache, self.token_ids
+            self.cache, self.token_ids = None, []
+
+        # At least one prompt token must be left for the model to prefill
+        limit = min(len(cached_ids), len(input_ids) - 1)
+        common = 0
+        while common < limit and cached_ids[common] == input_ids[common]:
+            common += 1
+
+        if cache is None or common == 0:
+            self.misses += 1
+            return None, 0
+
+        cache.crop(common)
+        self.hits += 1
+        self.reused_tokens += common
+        return cache, common
+
+    def store(self, token_ids: List[int], cache: "DynamicCache"):
+        """Store the cache covering token_ids for the next prompt."""
+        cache.crop(len(token_ids))
+        with self.lock:
+            self.cache, self.token_ids = cache, list(token_ids)
+
+    def clear(self):
+        """Drop all cached states."""
+        with self.lock:
+            self.cache, self.token_ids = None, []
+
+    def memory_bytes(self) -> int:
+        """Memory held by the cached key/value tensors."""
+        cache = self.cache
+        if cache is None:
+            return 0
+        return sum(tensor.nbytes for layer in range(len(cache)) for tensor in cache[layer])
+
+    @property
+    def cached_tokens(self) -> int:
+        """Number of tokens currently held in the cache."""
+        return len(self.token_ids)
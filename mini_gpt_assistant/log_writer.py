@@ -0,0 +1,209 @@
+"""
+Non-blocking structured logging for the Mini GPT Assistant.
+
+Loggers hand their records to a bounded in-memory queue; a background thread
+formats them as JSON lines and writes them to a log file that is rotated by
+size and age, optionally gzip-compressing old files. When the queue fills up,
+informational records are sampled and then dropped instead of making the
+chat loop wait for the disk.
+"""
+
+import os
+import gzip
+import json
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import List, Optional
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats a record as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        # Structured fields are passed as logger.info(..., extra={'fields': {...}})
+        entry.update(getattr(record, 'fields', None) or {})
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class RotatingLogHandler(RotatingFileHandler):
+    """File handler rotating by size and by age, with optional gzip compression."""
+
+    def __init__(self, path: str, max_bytes: int, rotate_seconds: Optional[float], backup_count: int,
+                 compress: bool = False):
+        super().__init__(path, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.rotate_seconds = rotate_seconds
+        self.rollover_at = time.time() + rotate_seconds if rotate_seconds else None
+        if compress:
+            self.namer = lambda name: name + ".gz"
+            self.rotator = self._compress
+
+    @staticmethod
+    def _compress(source: str, destination: str):
+        with open(source, 'rb') as f_in, gzip.open(destination, 'wb') as f_out:
+            shutil.copyfileobj(f_in, f_out)
+        os.remove(source)
+
+    def shouldRollover(self, record: logging.LogRecord) -> bool:
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            return True
+        return bool(super().shouldRollover(record))
+
+    def doRollover(self):
+        if self.backupCount > 0:
+            super().doRollover()
+        if self.rotate_seconds:
+            self.rollover_at = time.time() + self.rotate_seconds
+
+
+class BoundedQueueHandler(QueueHandler):
+    """
+    Queue handler that never blocks the logging thread.
+
+    Once the queue is filled past its high-water mark, only one in
+    sample_rate records below WARNING is kept; when it is full, records are
+    dropped. The number of lost records is logged once there is room again.
+    """
+
+    def __init__(self, max_size: int, sample_rate: int = 10, high_water: float = 0.8):
+        super().__init__(queue.Queue(maxsize=max_size))
+        self.sample_rate = max(sample_rate, 1)
+        self.high_water = int(max_size * high_water)
+        self.sampled = 0
+        self.dropped = 0
+        self.reported = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        if record.levelno < logging.WARNING and self.queue.qsize() >= self.high_water:
+            self.sampled += 1
+            if self.sampled % self.sample_rate:
+                self.dropped += 1
+                return
+
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return
+
+        if self.dropped > self.reported:
+            lost = self.dropped - self.reported
+            notice = logging.LogRecord(record.name, logging.WARNING, __file__, 0,
+                                       f"Dropped {lost} log records under load", None, None)
+            notice.fields = {'dropped': lost}
+            try:
+                self.queue.put_nowait(notice)
+                self.reported = self.dropped
+            except queue.Full:
+                pass
+
+
+class DrainingQueueListener(QueueListener):
+    """Queue listener whose stop waits for room in a full queue instead of failing."""
+
+    def enqueue_sentinel(self):
+        # The records ahead of the sentinel are still written; it only has to wait its turn
+        self.queue.put(self._sentinel)
+
+
+class LogWriter:
+    """Background writer shared by the application's loggers."""
+
+    def __init__(self, path: str, max_bytes: int, rotate_seconds: Optional[float], backup_count: int,
+                 compress: bool, max_queue: int, sample_rate: int, formatter: logging.Formatter):
+        """
+        Open the log file and start the writer thread.
+
+        Args:
+            path: Log file path
+            max_bytes: Rotate once the file reaches this size (0 = never)
+            rotate_seconds: Rotate once the file is this old (None = never)
+            backup_count: Rotated files kept
+            compress: Gzip rotated files
+            max_queue: Records buffered before sampling and dropping start
+            sample_rate: Keep one in this many informational records under pressure
+            formatter: Formatter applied on the writer thread
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.file_handler = RotatingLogHandler(path, max_bytes, rotate_seconds, backup_count, compress)
+        self.file_handler.setFormatter(formatter)
+        self.queue_handler = BoundedQueueHandler(max_queue, sample_rate)
+        self.listener = DrainingQueueListener(self.queue_handler.queue, self.file_handler, respect_handler_level=True)
+        self.listener.start()
+        self.loggers: List[logging.Logger] = []
+        self.closed = False
+        atexit.register(self.close)
+
+    def attach(self, logger: logging.Logger):
+        """Send a logger's records through the writer."""
+        if self.queue_handler not in logger.handlers:
+            logger.addHandler(self.queue_handler)
+            self.loggers.append(logger)
+
+    def redirect(self, handler: logging.Handler):
+        """
+        Send the attached loggers' records to another handler instead.
+
+        Used in forked worker processes, whose copy of the writer thread does
+        not run: their records are passed to the parent process to be written.
+        """
+        for logger in self.loggers:
+            logger.removeHandler(self.queue_handler)
+            logger.addHandler(handler)
+        self.closed = True
+
+    @property
+    def dropped(self) -> int:
+        return self.queue_handler.dropped
+
+    def close(self):
+        """Flush the queued records and close the file."""
+        if self.closed:
+            return
+        self.closed = True
+        # Detach first so nothing is queued behind the sentinel
+        for logger in self.loggers:
+            logger.removeHandler(self.queue_handler)
+        try:
+            self.listener.stop()
+        finally:
+            self.file_handler.close()
+
+
+_writer: Optional[LogWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_log_writer(**kwargs) -> LogWriter:
+    """Return the process-wide log writer, creating it with kwargs on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = LogWriter(**kwargs)
+        return _writer
+
+
+class RequestLogHook:
+    """Metrics hook that logs every finished request as a structured record."""
+
+    def __init__(self, logger: logging.Logger):
+        self.logger = logger
+
+    def finish(self, request):
+        self.logger.info("Request finished", extra={'fields': request.as_dict()})
@@ -7,61 +7,166 @@ It supports conversation history, logging, and optional internet search capabili
 
 import os
 import sys
+import time
 import logging
+import threading
+import uuid
+from concurrent.futures import Future
 from datetime import datetime
-from typing import List, Dict, Optional
+from functools import partial
+from itertools import islice
+from typing import List, Dict, Optional, Iterator, Deque
 import json
 
-import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+# torch and transformers are imported lazily in load_model so the interface starts instantly
 import colorama
 from colorama import Fore, Back, Style
 
 import config
 from tools.websearch import WebSearchTool
+from response_cleaner import ResponseCleaner, clean_text
+from kv_cache import PrefixCache
+from response_cache import ResponseCache
+from context_builder import ContextBuilder, model_token_budget
+from snapshot import find_snapshot, load_snapshot_model
+from metrics import Metrics, RequestMetrics, TorchProfilerHook
+from log_writer import JsonFormatter, RequestLogHook, get_log_writer
+from sessions import Exchange, SessionManager
+from conversation_store import ConversationStore
+from retrieval import HiddenStateEncoder, RetrievalMemory
+from autotune import apply_thread_settings, load_tuning_profile, probe_cpu
+from draft_model import ForwardCounter, load_draft_model, tokenizers_match, acceptance_stats
 # from config.py import MODEL_NAME, USE_GPU, GPU_DEVICE, TORCH_DTYPE, ALLOW_INTERNET
 
 
 class MiniGPTAssistant:
     """Main assistant class that handles conversation and model interactions."""
     
-    def __init__(self):
-        """Initialize the assistant with model and configuration."""
+    def __init__(self, background_load: bool = False):
+        """
+        Initialize the assistant with model and configuration.
+        
+        Args:
+            background_load: Load the model on a background thread instead of
+                blocking; generation waits for it with wait_until_ready()
+        """
         self.setup_logging()
         self.setup_colorama()
-        self.conversation_history: List[Dict[str, str]] = []
+        self.prefix_cache = PrefixCache() if config.PREFIX_CACHE else None
+        self.response_cache = ResponseCache(
+            config.RESPONSE_CACHE_SIZE, int(config.RESPONSE_CACHE_MB * 1024 ** 2), config.RESPONSE_CACHE_TTL
+        ) if config.RESPONSE_CACHE else None
+        self.setup_conversations()
+        self.device = None
+        self.draft_model = None
+        self.encoder = None
+        self.tuning: Dict = {}
+        self.precision_drift: Optional[Dict] = None
+        self.compiled = None
+        self.compile_report: Optional[Dict] = None
+        self.startup_timings: Dict[str, float] = {}
+        self.model_ready: Future = Future()
+        self.setup_metrics()
+        self.setup_web_search()
         
-        # Initialize web search tool if internet is enabled
-        self.web_search = None
-        if config.ALLOW_INTERNET:
+        # Load model and tokenizer
+        if background_load:
+            threading.Thread(target=self._load_in_background, name="ModelLoader", daemon=True).start()
+        else:
+            self.load_model()
+            self.model_ready.set_result(True)
+    
+    def setup_conversations(self):
+        """Open the conversation store and session manager, and pick the interactive session."""
+        # Conversations are saved so they survive restarts, unless conversation logging is off
+        self.store = None
+        if config.CONVERSATION_STORE_PATH and config.ENABLE_LOGGING:
             try:
-                self.web_search = WebSearchTool()
-                self.logger.info("Web search tool initialized")
+                self.store = ConversationStore(config.CONVERSATION_STORE_PATH, config.MODEL_NAME,
+                                               config.STORE_BATCH_SIZE, config.STORE_FLUSH_SECONDS)
             except Exception as e:
-                self.logger.warning(f"Failed to initialize web search: {e}")
-        
-        # Load model and tokenizer
-        self.load_model()
+                self.logger.warning(f"Conversation store unavailable, history will not be saved: {e}")
         
+        # The interactive conversation is one session; its prefix cache goes with it
+        self.sessions = SessionManager(
+            config.MAX_CONVERSATION_HISTORY,
+            memory_limit_bytes=int(config.SESSION_MEMORY_LIMIT_MB * 1024 ** 2) if config.SESSION_MEMORY_LIMIT_MB else None,
+            max_sessions=config.MAX_SESSIONS,
+            store=self.store,
+            memory_factory=partial(RetrievalMemory, config.RETRIEVAL_MEMORY_SIZE) if config.RETRIEVAL_MEMORY else None
+        )
+        resumed = self.store.last_session_id() if self.store is not None and config.RESUME_LAST_SESSION else None
+        self.session_id = resumed or uuid.uuid4().hex[:12]
+        self.session = self.sessions.get(self.session_id)
+        if self.prefix_cache is not None:
+            self.session.caches.append(self.prefix_cache)
+    
+    def setup_metrics(self):
+        """Create the metrics registry with its request hooks."""
+        # Per-request latency and throughput, shown by the 'stats' command
+        self.metrics = Metrics(config.METRICS_WINDOW)
+        self.metrics.add_hook(RequestLogHook(self.logger))
+        if config.PROFILE_DIR:
+            self.metrics.add_hook(TorchProfilerHook(config.PROFILE_DIR))
+            self.logger.info(f"Profiling every request into {config.PROFILE_DIR}")
+    
+    def _load_in_background(self):
+        """Load the model and resolve the readiness future."""
+        try:
+            self.load_model()
+            self.model_ready.set_result(True)
+        except BaseException as e:  # load_model exits on failure; hand that to the waiting thread
+            self.model_ready.set_exception(e)
+    
+    @property
+    def conversation_history(self) -> Deque[Exchange]:
+        """Exchanges of the interactive session, oldest first."""
+        return self.session.history
+    
+    def is_ready(self) -> bool:
+        """Whether the model has finished loading successfully."""
+        return self.model_ready.done() and self.model_ready.exception() is None
+    
+    def wait_until_ready(self):
+        """Block until the model is loaded, re-raising any loading failure."""
+        if not self.model_ready.done():
+            print(f"{Fore.YELLOW}(waiting for the model to finish loading){Style.RESET_ALL} ", end="", flush=True)
+        self.model_ready.result()
+    
     def setup_logging(self):
-        """Configure logging to file and console."""
-        os.makedirs(os.path.dirname(config.LOG_FILE), exist_ok=True)
-        
+        """Configure logging to the log file through the background log writer."""
         # Create logger
         self.logger = logging.getLogger('MiniGPTAssistant')
-        self.logger.setLevel(getattr(logging, config.LOG_LEVEL))
-        
-        # Create file handler
-        file_handler = logging.FileHandler(config.LOG_FILE, encoding='utf-8')
-        file_handler.setLevel(logging.INFO)
         
-        # Create formatter
-        formatter = logging.Formatter(config.LOG_FORMAT)
-        file_handler.setFormatter(formatter)
+        # Records are queued here and written, rotated and compressed on a background thread
+        self.log_writer = get_log_writer(
+            path=config.LOG_FILE,
+            max_bytes=config.LOG_MAX_BYTES,
+            rotate_seconds=config.LOG_ROTATE_SECONDS,
+            backup_count=config.LOG_BACKUP_COUNT,
+            compress=config.LOG_COMPRESS,
+            max_queue=config.LOG_QUEUE_SIZE,
+            sample_rate=config.LOG_SAMPLE_RATE,
+            formatter=JsonFormatter() if config.LOG_JSON else logging.Formatter(config.LOG_FORMAT)
+        )
+        self.log_writer.file_handler.setLevel(logging.INFO)
         
-        # Add handler to logger
-        if not self.logger.handlers:
-            self.logger.addHandler(file_handler)
+        # Add handler to the assistant's logger and those of its components, at the configured level
+        for name in ('MiniGPTAssistant', 'WebSearchTool', 'SearchCache', 'DynamicBatcher', 'MiniGPTServer',
+                     'ConversationStore', 'WorkerPool'):
+            component_logger = logging.getLogger(name)
+            component_logger.setLevel(getattr(logging, config.LOG_LEVEL))
+            self.log_writer.attach(component_logger)
+    
+    def setup_web_search(self):
+        """Initialize the web search tool if internet is enabled."""
+        self.web_search = None
+        if config.ALLOW_INTERNET:
+            try:
+                self.web_search = WebSearchTool()
+                self.logger.info("Web search tool initialized")
+            except Exception as e:
+                self.logger.warning(f"Failed to initialize web search: {e}")
     
     def setup_colorama(self):
         """Initialize colorama for colored console output."""
@@ -73,16 +178,49 @@ class MiniGPTAssistant:
             self.logger.info(f"Loading model: {config.MODEL_NAME}")
             print(f"{Fore.YELLOW}Loading AI model... This may take a moment.{Style.RESET_ALL}")
             
+            # A prepared local snapshot is loaded without touching the network
+            snapshot = find_snapshot(config.MODEL_SNAPSHOT_DIR, config.MODEL_NAME)
+            model_source = config.MODEL_SNAPSHOT_DIR if snapshot else config.MODEL_NAME
+            if snapshot:
+                os.environ['HF_HUB_OFFLINE'] = '1'
+                os.environ['TRANSFORMERS_OFFLINE'] = '1'
+                print(f"{Fore.BLUE}Using local snapshot in {config.MODEL_SNAPSHOT_DIR} (offline){Style.RESET_ALL}")
+                self.logger.info(f"Using local snapshot: {config.MODEL_SNAPSHOT_DIR} ({snapshot.get('dtype')})")
+            
+            stage_start = load_start = time.perf_counter()
+            import torch
+            from transformers import AutoTokenizer
+            from precision import AUTO_DTYPES, HALF_DTYPES, cpu_dtype, reduce_precision
+            stage_start = self._record_timing('imports', stage_start)
+            
+            # Settings found by autotune.py for this hardware; explicit config values take precedence
+            self.tuning = load_tuning_profile(config.TUNING_PROFILE_PATH, config.MODEL_NAME) or {}
+            if self.tuning:
+                self.logger.info(f"Applying tuning profile: {self.tuning}")
+            apply_thread_settings(config.TORCH_THREADS or self.tuning.get('torch_threads'),
+                                  config.TORCH_INTEROP_THREADS or self.tuning.get('interop_threads'))
+            
             # Determine device and dtype
             if config.USE_GPU and torch.cuda.is_available():
                 device = f"cuda:{config.GPU_DEVICE}"
-                torch_dtype = torch.float16 if config.TORCH_DTYPE == "float16" else torch.float32
+                gpu_dtype = 'float16' if config.TORCH_DTYPE in AUTO_DTYPES else config.TORCH_DTYPE
+                torch_dtype = getattr(torch, gpu_dtype) if gpu_dtype in HALF_DTYPES else torch.float32
                 device_map = {"": config.GPU_DEVICE}
                 print(f"{Fore.GREEN}GPU detected! Using device: {device}{Style.RESET_ALL}")
                 self.logger.info(f"Using GPU device: {device}")
             else:
                 device = "cpu"
-                torch_dtype = torch.float32  # Always use float32 for CPU
+                # Half precision only where the CPU computes it natively; int8 quantization needs float32
+                # The tuned dtype only applies when TORCH_DTYPE leaves the choice open
+                requested_dtype = config.TORCH_DTYPE
+                if requested_dtype in AUTO_DTYPES:
+                    requested_dtype = self.tuning.get('dtype', 'float32')
+                torch_dtype = torch.float32 if config.CPU_QUANTIZATION else cpu_dtype(requested_dtype, probe_cpu())
+                if torch_dtype == torch.float32 and requested_dtype in HALF_DTYPES and not config.CPU_QUANTIZATION:
+                    if requested_dtype == 'bfloat16':
+                        self.logger.info("CPU has no native bfloat16; using float32")
+                    else:
+                        self.logger.debug(f"{requested_dtype} is GPU only; using float32 on CPU")
                 device_map = None
                 if config.USE_GPU:
                     print(f"{Fore.YELLOW}GPU requested but not available, falling back to CPU{Style.RESET_ALL}")
@@ -92,34 +230,51 @@ class MiniGPTAssistant:
                     self.logger.info("Using CPU as configured")
             
             # Load tokenizer
-            self.tokenizer = AutoTokenizer.from_pretrained(config.MODEL_NAME)
+            self.tokenizer = AutoTokenizer.from_pretrained(model_source, local_files_only=bool(snapshot))
             
             # Set pad token if not exists
             if self.tokenizer.pad_token is None:
                 self.tokenizer.pad_token = self.tokenizer.eos_token
+            stage_start = self._record_timing('tokenizer', stage_start)
             
-            # Load model with optimized settings for GPU
-            self.model = AutoModelForCausalLM.from_pretrained(
-                config.MODEL_NAME,
-                torch_dtype=torch_dtype,
-                device_map=device_map,
-                low_cpu_mem_usage=True,  # Optimize memory usage
-                trust_remote_code=True   # For some models
-            )
+            # Half precision on CPU is checked against float32 before it is used; a snapshot
+            # already stored in that dtype has no float32 weights to check against
+            snapshot_dtype = getattr(torch, snapshot.get('dtype', 'float32')) if snapshot else None
+            check_drift = (device == "cpu" and torch_dtype != torch.float32 and config.PRECISION_DRIFT_CHECK
+                           and snapshot_dtype != torch_dtype)
+            load_dtype = torch.float32 if check_drift else torch_dtype
             
-            # Move model to device if not using device_map
-            if device_map is None:
-                self.model = self.model.to(device)
+            self.model = self.load_weights(model_source, bool(snapshot), load_dtype, device_map, device)
+            self.device = device
+            stage_start = self._record_timing('weights', stage_start)
             
-            # Create text generation pipeline
-            self.generator = pipeline(
-                "text-generation",
-                model=self.model,
-                tokenizer=self.tokenizer,
-                torch_dtype=torch_dtype,
-                device=device if device_map is None else None,
-                device_map=device_map
-            )
+            if check_drift:
+                # Cast in place; the weights are only reloaded if half precision is rejected
+                self.precision_drift = reduce_precision(self.model, torch_dtype, self.tokenizer,
+                                                        config.PRECISION_MAX_KL)
+                drift = self.precision_drift['kl_divergence']
+                if self.precision_drift['passed']:
+                    self.logger.info(f"Using {torch_dtype} on CPU (drift KL {drift:.2g} per token)")
+                else:
+                    torch_dtype = torch.float32
+                    print(f"{Fore.YELLOW}bfloat16 outputs drift too far from float32 "
+                          f"(KL {drift:.2g}); using float32{Style.RESET_ALL}")
+                    self.logger.warning(f"Half precision drift KL {drift:.2g} exceeds {config.PRECISION_MAX_KL}; "
+                                        f"using float32")
+                    self.model = None
+                    self.model = self.load_weights(model_source, bool(snapshot), torch_dtype, device_map, device)
+                stage_start = self._record_timing('precision', stage_start)
+            
+            if device == "cpu" and config.CPU_QUANTIZATION == "int8":
+                from quantization import quantize_dynamic_int8
+                self.model = quantize_dynamic_int8(self.model)
+                print(f"{Fore.BLUE}Using int8 dynamic quantization on CPU{Style.RESET_ALL}")
+                self.logger.info("Applied int8 dynamic quantization")
+                stage_start = self._record_timing('quantize', stage_start)
+            
+            if config.DRAFT_MODEL_NAME:
+                self.load_draft_model(torch_dtype, device)
+                stage_start = self._record_timing('draft', stage_start)
             
             # Display GPU memory info if using CUDA
             if torch.cuda.is_available() and device.startswith('cuda'):
@@ -128,130 +283,503 @@ class MiniGPTAssistant:
                 print(f"{Fore.GREEN}GPU Memory: {gpu_memory_used:.1f}GB / {gpu_memory:.1f}GB{Style.RESET_ALL}")
                 self.logger.info(f"GPU memory usage: {gpu_memory_used:.1f}GB / {gpu_memory:.1f}GB")
             
+            # Prompts are assembled as token IDs within the model's context window
+            budget = model_token_budget(self.model, self.tokenizer, config.MAX_LENGTH)
+            if config.CONTEXT_TOKEN_BUDGET:
+                budget = min(budget, config.CONTEXT_TOKEN_BUDGET)
+            self.context_builder = ContextBuilder(self.tokenizer, budget, config.CONTEXT_EXCHANGES)
+            self.logger.info(f"Prompt token budget: {budget}")
+            if config.RETRIEVAL_MEMORY:
+                self.encoder = HiddenStateEncoder(self.model)
+            
+            # Compile the decoding step for each cache size now rather than on the first request
+            if config.COMPILE_MODEL:
+                self.setup_compiled_generation()
+                stage_start = self._record_timing('compile', stage_start)
+            
+            # Compute the system prompt once so every turn can reuse it
+            self.warm_prefix_cache()
+            self._record_timing('prefix_cache', stage_start)
+            self.startup_timings['total'] = time.perf_counter() - load_start
+            self.logger.info("Startup timings: " + ", ".join(
+                f"{stage} {seconds:.2f}s" for stage, seconds in self.startup_timings.items()))
+            
             device_name = "GPU" if device.startswith('cuda') else "CPU"
             print(f"{Fore.GREEN}Model loaded successfully on {device_name}!{Style.RESET_ALL}")
             self.logger.info(f"Model loaded successfully on {device_name}")
-            
+        
         except Exception as e:
             error_msg = f"Failed to load model: {e}"
             self.logger.error(error_msg)
             print(f"{Fore.RED}Error: {error_msg}{Style.RESET_ALL}")
             sys.exit(1)
     
-    def generate_response(self, user_input: str) -> str:
-        """Generate a response to user input."""
+    def load_weights(self, model_source: str, snapshot: bool, dtype, device_map: Optional[Dict], device: str):
+        """Load the model weights in a dtype onto the device."""
+        from transformers import AutoModelForCausalLM
+        
+        if snapshot and device_map is None:
+            # Memory-map the snapshot weights instead of copying them
+            model = load_snapshot_model(config.MODEL_SNAPSHOT_DIR)
+            if model.dtype != dtype:
+                self.logger.warning(f"Snapshot is {model.dtype}, casting to {dtype}; "
+                                    f"re-run snapshot.py with the matching --dtype to avoid this copy")
+                model = model.to(dtype)
+        else:
+            # Load model with optimized settings for GPU
+            model = AutoModelForCausalLM.from_pretrained(
+                model_source,
+                torch_dtype=dtype,
+                device_map=device_map,
+                low_cpu_mem_usage=True,  # Optimize memory usage
+                trust_remote_code=True,  # For some models
+                local_files_only=snapshot
+            )
+        
+        # Move model to device if not using device_map
+        if device_map is None:
+            model = model.to(device)
+        return model
+    
+    def setup_compiled_generation(self):
+        """Compile and warm up static-cache generation, and report its compile time and speedup."""
+        from compiled_generation import CompiledGenerator
+        
+        if self.draft_model is not None:
+            self.logger.warning("Compiled generation does not support assisted decoding; generating eagerly")
+            return
+        
+        print(f"{Fore.YELLOW}Compiling generation... This may take a few minutes.{Style.RESET_ALL}")
+        generator = CompiledGenerator(self.model, model_token_budget(self.model, self.tokenizer, 0),
+                                      config.COMPILE_BUCKETS)
         try:
-            # Build conversation context with better formatting
-            context = self.build_context(user_input)
-            
-            # Check if user is asking for web search
-            if config.ALLOW_INTERNET and self.web_search and self.should_search_web(user_input):
-                search_results = self.web_search.search(user_input)
-                if search_results:
-                    context += f"\n\nWeb search results: {search_results}"
-            
-            # Generate response with better parameters
-            response = self.generator(
-                context,
-                max_new_tokens=config.MAX_LENGTH,
-                temperature=config.TEMPERATURE,
-                top_p=config.TOP_P,
-                do_sample=config.DO_SAMPLE,
-                pad_token_id=self.tokenizer.eos_token_id,
-                eos_token_id=self.tokenizer.eos_token_id,
-                num_return_sequences=1,
-                repetition_penalty=1.1,
-                length_penalty=1.0
+            self.compile_report = generator.warmup(self.tokenizer, config.SYSTEM_PROMPT)
+        except Exception as e:
+            print(f"{Fore.YELLOW}Compiled generation unavailable, generating eagerly: {e}{Style.RESET_ALL}")
+            self.logger.warning(f"Compiled generation unavailable: {e}")
+            return
+        self.compiled = generator
+        
+        # Prefix reuse needs a growing cache; a static one is filled from the start every time
+        if self.prefix_cache is not None:
+            self.session.caches.remove(self.prefix_cache)
+            self.prefix_cache = None
+            self.sessions.refresh(self.session)
+        
+        report = self.compile_report
+        self.logger.info(f"Compiled generation: {report['compile_seconds']:.1f}s for cache sizes {generator.buckets}, "
+                         f"{report['eager_ms_per_token']:.1f}ms -> {report['compiled_ms_per_token']:.1f}ms per token")
+        print(f"{Fore.BLUE}Compiled {report['buckets']} cache sizes in {report['compile_seconds']:.1f}s; "
+              f"{report['speedup']:.2f}x eager speed{Style.RESET_ALL}")
+        if report['speedup'] < 1:
+            print(f"{Fore.YELLOW}Compiled generation is slower than eager for this model; "
+                  f"consider COMPILE_MODEL = False{Style.RESET_ALL}")
+    
+    def load_draft_model(self, torch_dtype, device: str):
+        """Load the draft model for assisted decoding; generation works without it if this fails."""
+        try:
+            self.draft_model, self.draft_tokenizer = load_draft_model(
+                config.DRAFT_MODEL_NAME, torch_dtype, device, config.DRAFT_NUM_TOKENS,
+                local_files_only=os.environ.get('HF_HUB_OFFLINE') == '1'
             )
+            if device == "cpu" and config.CPU_QUANTIZATION == "int8":
+                from quantization import quantize_dynamic_int8
+                self.draft_model = quantize_dynamic_int8(self.draft_model)
             
-            # Extract the generated text
-            generated_text = response[0]['generated_text']
+            # Different vocabularies still work, but proposals have to be re-tokenized every step
+            self.draft_shares_tokenizer = tokenizers_match(self.tokenizer, self.draft_tokenizer)
+            if not self.draft_shares_tokenizer:
+                self.logger.warning(f"{config.DRAFT_MODEL_NAME} does not share the tokenizer of "
+                                    f"{config.MODEL_NAME}; assisted decoding will be slower")
             
-            # Remove the input context to get only the new response
-            response_text = generated_text[len(context):].strip()
+            self.target_forwards = ForwardCounter(self.model)
+            self.draft_forwards = ForwardCounter(self.draft_model)
+            print(f"{Fore.BLUE}Using {config.DRAFT_MODEL_NAME} as draft model for assisted decoding{Style.RESET_ALL}")
+            self.logger.info(f"Loaded draft model: {config.DRAFT_MODEL_NAME}")
+        except Exception as e:
+            self.draft_model = None
+            print(f"{Fore.YELLOW}Could not load draft model {config.DRAFT_MODEL_NAME}, "
+                  f"continuing without assisted decoding: {e}{Style.RESET_ALL}")
+            self.logger.warning(f"Failed to load draft model {config.DRAFT_MODEL_NAME}: {e}")
+    
+    def _record_timing(self, stage: str, stage_start: float) -> float:
+        """Record how long a startup stage took and return the start of the next one."""
+        now = time.perf_counter()
+        self.startup_timings[stage] = now - stage_start
+        return now
+    
+    def generation_kwargs(self) -> Dict:
+        """Generation parameters shared by all generation modes."""
+        return dict(
+            max_new_tokens=config.MAX_LENGTH,
+            temperature=config.TEMPERATURE,
+            top_p=config.TOP_P,
+            do_sample=config.DO_SAMPLE,
+            pad_token_id=self.tokenizer.eos_token_id,
+            eos_token_id=self.tokenizer.eos_token_id,
+            num_return_sequences=1,
+            repetition_penalty=config.REPETITION_PENALTY,
+            length_penalty=config.LENGTH_PENALTY
+        )
+    
+    def assisted_kwargs(self) -> Dict:
+        """Extra model.generate arguments for assisted decoding (empty without a draft model)."""
+        if self.draft_model is None:
+            return {}
+        kwargs = dict(assistant_model=self.draft_model)
+        if not self.draft_shares_tokenizer:
+            kwargs.update(tokenizer=self.tokenizer, assistant_tokenizer=self.draft_tokenizer)
+        return kwargs
+    
+    def record_assisted_generation(self, generated: int, target_start: int, draft_start: int):
+        """Record the draft acceptance metrics of one assisted generation."""
+        stats = acceptance_stats(generated, self.target_forwards.count - target_start,
+                                 self.draft_forwards.count - draft_start)
+        self.metrics.increment('draft_proposed_tokens_total', stats['proposed'])
+        self.metrics.increment('draft_accepted_tokens_total', stats['accepted'])
+        if stats['proposed']:
+            self.metrics.observe('draft_acceptance_rate', stats['acceptance_rate'])
+        self.metrics.observe('tokens_per_target_forward', stats['tokens_per_target_forward'])
+    
+    def prepare_prompt(self, user_input: str, request: Optional[RequestMetrics] = None) -> List[int]:
+        """Build the prompt token IDs for user input, including web search results if needed."""
+        request = request or RequestMetrics()
+        search_results = None
+        
+        # Check if user is asking for web search
+        if config.ALLOW_INTERNET and self.web_search and self.should_search_web(user_input):
+            with request.stage('search'):
+                search_results = self.web_search.search(user_input)
+        
+        with request.stage('retrieve'):
+            relevant = self.recall(self.session, user_input)
+        
+        with request.stage('context'):
+            input_ids = self.build_context(user_input, search_results, relevant)
+        request.prompt_tokens = len(input_ids)
+        return input_ids
+    
+    def response_key(self, input_ids: List[int], kind: str = "chat", batched: bool = False) -> Optional[str]:
+        """
+        Response cache key of a prompt, or None if its reply is not reproducible.
+        
+        Args:
+            input_ids: Token IDs of the final prompt
+            kind: "chat" for cleaned replies, "stream" for replies cleaned while
+                streaming, "completion" for raw continuations
+            batched: Whether the prompt is generated in a batch; sampled rows of a
+                batch share one random stream, so a seed does not make them repeatable
+        """
+        if self.response_cache is None:
+            return None
+        if config.DO_SAMPLE and (config.GENERATION_SEED is None or batched):
+            return None
+        settings = dict(
+            self.generation_kwargs(),
+            kind=kind,
+            model=config.MODEL_NAME,
+            dtype=str(self.model.dtype),
+            seed=config.GENERATION_SEED if config.DO_SAMPLE else None
+        )
+        return ResponseCache.make_key(input_ids, settings)
+    
+    def cached_response(self, key: Optional[str], request: RequestMetrics) -> Optional[str]:
+        """Look up a reply in the response cache, counting the hit or miss."""
+        if key is None:
+            return None
+        with request.stage('cache'):
+            response = self.response_cache.get(key)
+        self.metrics.increment('response_cache_hits_total' if response is not None else 'response_cache_misses_total')
+        return response
+    
+    def cache_response(self, key: Optional[str], response: str):
+        """Keep a generated reply for the next identical prompt."""
+        if key is not None:
+            self.response_cache.put(key, response)
+    
+    def warm_prefix_cache(self):
+        """Prefill the system prompt into the prefix cache."""
+        if self.prefix_cache is None:
+            return
+        
+        import torch
+        from transformers import DynamicCache
+        
+        input_ids = self.context_builder.system_ids
+        cache = DynamicCache()
+        with torch.no_grad():
+            self.model(
+                input_ids=torch.tensor([input_ids], device=self.model.device),
+                past_key_values=cache,
+                use_cache=True
+            )
+        self.prefix_cache.store(input_ids, cache)
+        self.sessions.refresh(self.session)
+        self.logger.info(f"Prefix cache warmed with {len(input_ids)} system prompt tokens")
+    
+    def generate_ids(self, input_ids: List[int], **kwargs) -> List[int]:
+        """
+        Generate new tokens for a tokenized prompt.
+        
+        The prompt prefix already held by the prefix cache is not prefilled
+        again, and the states of the generated sequence are kept for the next turn.
+        With compiled generation, a static cache of the matching size is used instead.
+        
+        Args:
+            input_ids: Token IDs of the full prompt
+            **kwargs: Extra arguments for model.generate (streamer, stopping criteria)
+        
+        Returns:
+            Token IDs of the newly generated text
+        """
+        import torch
+        from transformers import DynamicCache
+        
+        cache_kwargs = {}
+        if self.compiled is not None:
+            cache_kwargs = self.compiled.generate_kwargs(len(input_ids), config.MAX_LENGTH)
+        elif self.prefix_cache is not None:
+            past_key_values, reused = self.prefix_cache.take(input_ids)
+            cache_kwargs = dict(past_key_values=past_key_values)
+            self.logger.debug(f"Prefix cache reused {reused} of {len(input_ids)} prompt tokens")
+        
+        if self.draft_model is not None:
+            target_start, draft_start = self.target_forwards.count, self.draft_forwards.count
+        
+        if config.DO_SAMPLE and config.GENERATION_SEED is not None:
+            torch.manual_seed(config.GENERATION_SEED)
+        
+        input_tensor = torch.tensor([input_ids], device=self.model.device)
+        outputs = self.model.generate(
+            input_ids=input_tensor,
+            attention_mask=torch.ones_like(input_tensor),
+            return_dict_in_generate=True,
+            **cache_kwargs,
+            **self.generation_kwargs(),
+            **self.assisted_kwargs(),
+            **kwargs
+        )
+        sequence = outputs.sequences[0].tolist()
+        
+        if self.draft_model is not None:
+            self.record_assisted_generation(len(sequence) - len(input_ids), target_start, draft_start)
+        
+        cache = outputs.past_key_values
+        if self.prefix_cache is not None and isinstance(cache, DynamicCache):
+            self.prefix_cache.store(sequence[:cache.get_seq_length()], cache)
+        
+        return sequence[len(input_ids):]
+    
+    def generate_batch(self, prompts: List[List[int]], stop_when_cleaned: Optional[List[bool]] = None) -> List[str]:
+        """
+        Generate text for several prompts in one left-padded batch.
+        
+        Args:
+            prompts: Token IDs of each prompt
+            stop_when_cleaned: Per prompt, whether generation ends where clean_response
+                would cut the reply (chat) or runs to the limit (raw completion)
+        
+        Returns:
+            The generated text of each prompt, uncleaned
+        """
+        import torch
+        from transformers import StoppingCriteriaList
+        from stopping import StopWhenCleaned
+        
+        tokenizer = self.tokenizer
+        width = max(len(prompt) for prompt in prompts)
+        
+        input_ids = torch.full((len(prompts), width), tokenizer.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros_like(input_ids)
+        for row, prompt in enumerate(prompts):
+            input_ids[row, width - len(prompt):] = torch.tensor(prompt, dtype=torch.long)
+            attention_mask[row, width - len(prompt):] = 1
+        
+        # Chat replies stop where clean_response would cut them; raw completions run to the limit
+        stop = StopWhenCleaned(tokenizer, width, rows=stop_when_cleaned or [False] * len(prompts))
+        
+        # Assisted decoding only supports a single sequence
+        assisted = self.assisted_kwargs() if len(prompts) == 1 else {}
+        if assisted:
+            target_start = self.target_forwards.count
+            draft_start = self.draft_forwards.count
+        
+        device = self.model.device
+        start_time = time.perf_counter()
+        with torch.no_grad():
+            sequences = self.model.generate(
+                input_ids=input_ids.to(device),
+                attention_mask=attention_mask.to(device),
+                stopping_criteria=StoppingCriteriaList([stop]),
+                **self.generation_kwargs(),
+                **assisted
+            )
+        elapsed = time.perf_counter() - start_time
+        if assisted:
+            self.record_assisted_generation(sequences.shape[1] - width, target_start, draft_start)
+        self.metrics.increment('early_stops_total', stop.stopped)
+        self.metrics.observe('batch_size', len(prompts))
+        self.metrics.observe('batch_seconds', elapsed)
+        self.logger.info(f"Generated batch of {len(prompts)} (width {width}) in {elapsed:.2f}s")
+        
+        return [tokenizer.decode(sequence[width:], skip_special_tokens=True) for sequence in sequences]
+    
+    def generate_response(self, user_input: str) -> str:
+        """Generate a response to user input."""
+        try:
+            self.wait_until_ready()
+            from transformers import StoppingCriteriaList
+            from stopping import StopWhenCleaned
             
-            # Clean up the response
-            response_text = self.clean_response(response_text)
+            with self.metrics.request(session_id=self.session_id) as request:
+                input_ids = self.prepare_prompt(user_input, request)
+                cache_key = self.response_key(input_ids)
+                response_text = self.cached_response(cache_key, request)
+                if response_text is not None:
+                    return response_text
+                
+                # Generate only the new tokens, stopping where the cleaner would cut, and decode them
+                stop_when_cleaned = StopWhenCleaned(self.tokenizer, len(input_ids))
+                with request.stage('generate'):
+                    new_ids = self.generate_ids(input_ids, stopping_criteria=StoppingCriteriaList([stop_when_cleaned]))
+                request.generated_tokens = len(new_ids)
+                self.metrics.increment('early_stops_total', stop_when_cleaned.stopped)
+                
+                # Clean up the response
+                with request.stage('clean'):
+                    response_text = self.tokenizer.decode(new_ids, skip_special_tokens=True).strip()
+                    response_text = self.clean_response(response_text)
+                self.cache_response(cache_key, response_text)
             
             return response_text
-            
+        
         except Exception as e:
             error_msg = f"Error generating response: {e}"
             self.logger.error(error_msg)
             return f"I apologize, but I encountered an error while generating a response: {e}"
     
-    def build_context(self, user_input: str) -> str:
-        """Build conversation context from history."""
-        context_parts = []
-        
-        # Add a system prompt to guide the assistant's behavior
-        context_parts.append("You are a helpful AI assistant. Please provide clear, concise, and helpful responses to the user's questions.")
-        context_parts.append("")  # Empty line for separation
+    def generate_response_stream(self, user_input: str) -> Iterator[str]:
+        """
+        Generate a response to user input, yielding cleaned text as it is decoded.
         
-        # Add recent conversation history (limit to avoid repetition)
-        recent_history = self.conversation_history[-3:]  # Only last 3 exchanges
-        for exchange in recent_history:
-            context_parts.append(f"Human: {exchange['user']}")
-            context_parts.append(f"Assistant: {exchange['assistant']}")
+        Generation runs on a background thread and is stopped as soon as the
+        cleaner decides the rest of the output would be discarded.
+        """
+        cleaner = ResponseCleaner()
+        try:
+            self.wait_until_ready()
+            from transformers import StoppingCriteriaList, TextIteratorStreamer
+            from stopping import StopOnEvent, StopWhenCleaned
+            
+            with self.metrics.request(kind="stream", session_id=self.session_id) as request:
+                input_ids = self.prepare_prompt(user_input, request)
+                # Streamed replies are cut at a word rather than a sentence, so they are cached apart
+                cache_key = self.response_key(input_ids, kind="stream")
+                cached = self.cached_response(cache_key, request)
+                if cached is not None:
+                    request.mark_first_chunk()
+                    yield cached
+                    return
+                
+                streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+                stop_event = threading.Event()
+                stop_when_cleaned = StopWhenCleaned(self.tokenizer, len(input_ids))
+                errors: List[Exception] = []
+                streamed: List[str] = []
+                
+                thread = threading.Thread(
+                    target=self._generate_in_background,
+                    args=(errors, request, input_ids),
+                    kwargs=dict(
+                        streamer=streamer,
+                        stopping_criteria=StoppingCriteriaList([stop_when_cleaned, StopOnEvent(stop_event)])
+                    ),
+                    daemon=True
+                )
+                thread.start()
+                
+                try:
+                    for chunk in streamer:
+                        with request.stage('clean'):
+                            piece = cleaner.feed(chunk)
+                        if piece:
+                            request.mark_first_chunk()
+                            streamed.append(piece)
+                            yield piece
+                        if cleaner.done:
+                            break
+                finally:
+                    stop_event.set()
+                    thread.join()
+                self.metrics.increment('early_stops_total', stop_when_cleaned.stopped)
+                
+                if errors:
+                    raise errors[0]
+                
+                with request.stage('clean'):
+                    piece = cleaner.finish()
+                if piece:
+                    request.mark_first_chunk()
+                    streamed.append(piece)
+                    yield piece
+                self.cache_response(cache_key, "".join(streamed))
         
-        # Add current user input
-        context_parts.append(f"Human: {user_input}")
-        context_parts.append("Assistant:")
+        except Exception as e:
+            error_msg = f"Error generating response: {e}"
+            self.logger.error(error_msg)
+            yield f"I apologize, but I encountered an error while generating a response: {e}"
+    
+    def _generate_in_background(self, errors: List[Exception], request: RequestMetrics, input_ids: List[int],
+                                **kwargs):
+        """Run model generation, making sure the streamer is closed on failure."""
+        try:
+            with request.stage('generate'):
+                new_ids = self.generate_ids(input_ids, **kwargs)
+            request.generated_tokens = len(new_ids)
+        except Exception as e:
+            errors.append(e)
+            kwargs['streamer'].end()
+    
+    def build_context(self, user_input: str, search_results: Optional[str] = None,
+                      relevant: Optional[List[Exchange]] = None) -> List[int]:
+        """Build the prompt token IDs from history within the token budget."""
+        return self.context_builder.build(self.conversation_history, user_input, search_results, relevant)
+    
+    def remember(self, session, exchanges: List[Exchange]):
+        """Embed exchanges into a session's retrieval memory."""
+        if session.memory is None or self.encoder is None or not exchanges:
+            return
         
-        return "\n".join(context_parts)
+        sequences = [
+            exchange.token_ids or self.context_builder.encode_exchange(exchange.user, exchange.assistant)
+            for exchange in exchanges
+        ]
+        session.memory.add(exchanges, self.encoder.encode(sequences))
+        self.sessions.refresh(session)
     
-    def clean_response(self, response: str) -> str:
-        """Clean up the generated response."""
-        if not response:
-            return "I'm not sure how to respond to that."
-        
-        # Remove any remaining conversation markers
-        response = response.replace("Human:", "").replace("Assistant:", "")
-        
-        # Split by common delimiters and take the first coherent part
-        for delimiter in ['\n\nHuman:', '\nHuman:', '\n\nAssistant:', '\nAssistant:']:
-            if delimiter in response:
-                response = response.split(delimiter)[0]
-                break
-        
-        # Clean up line by line
-        lines = response.split('\n')
-        cleaned_lines = []
-        
-        for line in lines:
-            line = line.strip()
-            if line and not line.startswith(('Human:', 'Assistant:', 'You:', 'User:')):
-                # Skip repetitive academic titles or weird patterns
-                if not any(pattern in line.lower() for pattern in ['professor:', 'dr. dr.', 'university of california' * 3]):
-                    cleaned_lines.append(line)
-                    
-        # Join lines and clean up
-        result = ' '.join(cleaned_lines).strip()
-        
-        # Remove excessive repetition
-        words = result.split()
-        if len(words) > 10:
-            # Check for word repetition and truncate if found
-            for i in range(len(words) - 5):
-                if words[i:i+3] == words[i+3:i+6]:  # Found 3-word repetition
-                    result = ' '.join(words[:i+3])
-                    break
+    def recall(self, session, user_input: str) -> Optional[List[Exchange]]:
+        """
+        Choose the past exchanges to include in the prompt for user input.
         
-        # Limit response length
-        if len(result) > 300:
-            # Find the last complete sentence within limit
-            sentences = result[:300].split('.')
-            if len(sentences) > 1:
-                result = '.'.join(sentences[:-1]) + '.'
-            else:
-                result = result[:300] + "..."
+        The latest RETRIEVAL_RECENT exchanges are always kept so follow-up
+        questions stay on topic; the rest are the most relevant ones in the
+        session's retrieval memory. Returns None without a retrieval memory,
+        which means the latest exchanges.
+        """
+        if session.memory is None or self.encoder is None:
+            return None
         
-        # Final cleanup
-        result = result.strip()
-        if not result or len(result) < 3:
-            return "Hello! How can I help you today?"
+        # A resumed session starts with only its recent window in memory
+        if not session.memory and session.history:
+            self.remember(session, list(session.history))
         
-        return result
+        recent = list(islice(reversed(session.history), config.RETRIEVAL_RECENT))
+        query = self.encoder.encode([self.context_builder.encode(user_input)])[0]
+        return recent + session.memory.search(query, config.CONTEXT_EXCHANGES - len(recent), exclude=recent)
+    
+    def clean_response(self, response: str) -> str:
+        """Clean up the generated response."""
+        return clean_text(response)
     
     def should_search_web(self, user_input: str) -> bool:
         """Determine if the user input warrants a web search."""
@@ -261,17 +789,31 @@ class MiniGPTAssistant:
         ]
         return any(indicator in user_input.lower() for indicator in search_indicators)
     
+    def make_exchange(self, user_input: str, assistant_response: str) -> Exchange:
+        """Create a history record for an exchange, with its prompt token IDs."""
+        return Exchange(user_input, assistant_response,
+                        self.context_builder.encode_exchange(user_input, assistant_response))
+    
     def add_to_history(self, user_input: str, assistant_response: str):
         """Add exchange to conversation history."""
-        self.conversation_history.append({
-            'user': user_input,
-            'assistant': assistant_response,
-            'timestamp': datetime.now().isoformat()
-        })
+        exchange = self.make_exchange(user_input, assistant_response)
+        self.sessions.add_exchange(self.session, exchange)
+        self.remember(self.session, [exchange])
         
         # Log the conversation
-        self.logger.info(f"User: {user_input}")
-        self.logger.info(f"Assistant: {assistant_response}")
+        self.log_exchange(self.session_id, exchange)
+    
+    def log_exchange(self, session_id: str, exchange: Exchange):
+        """Queue a structured log record of an exchange; the text is only kept if ENABLE_LOGGING is on."""
+        fields = {
+            'session_id': session_id,
+            'exchange_time': exchange.time,
+            'exchange_tokens': len(exchange.token_ids),
+        }
+        if config.ENABLE_LOGGING:
+            fields['user'] = exchange.user
+            fields['assistant'] = exchange.assistant
+        self.logger.info("Exchange", extra={'fields': fields})
     
     def display_welcome(self):
         """Display welcome message."""
@@ -286,6 +828,9 @@ class MiniGPTAssistant:
         print(f"{Fore.WHITE}Type 'quit', 'exit', or 'bye' to end the conversation.{Style.RESET_ALL}")
         print(f"{Fore.WHITE}Type 'clear' to clear conversation history.{Style.RESET_ALL}")
         print(f"{Fore.WHITE}Type 'help' for more commands.{Style.RESET_ALL}")
+        if self.conversation_history:
+            print(f"{Fore.YELLOW}Continuing your last conversation ({len(self.conversation_history)} recent "
+                  f"exchanges). Type 'new' to start a fresh one.{Style.RESET_ALL}")
         print()
     
     def display_help(self):
@@ -294,35 +839,148 @@ class MiniGPTAssistant:
         print(f"{Fore.WHITE}  help     - Show this help message{Style.RESET_ALL}")
         print(f"{Fore.WHITE}  clear    - Clear conversation history{Style.RESET_ALL}")
         print(f"{Fore.WHITE}  history  - Show conversation history{Style.RESET_ALL}")
+        print(f"{Fore.WHITE}  sessions - List saved conversations ('resume <id>' to continue one, 'new' to start one){Style.RESET_ALL}")
         print(f"{Fore.WHITE}  status   - Show assistant status{Style.RESET_ALL}")
+        print(f"{Fore.WHITE}  stats    - Show latency statistics ('stats json' or 'stats prometheus' to dump){Style.RESET_ALL}")
         print(f"{Fore.WHITE}  quit/exit/bye - End the conversation{Style.RESET_ALL}")
         print()
     
     def display_history(self):
-        """Display conversation history."""
+        """Display the recent conversation history held in memory."""
         if not self.conversation_history:
             print(f"{Fore.YELLOW}No conversation history yet.{Style.RESET_ALL}")
             return
         
         print(f"{Fore.CYAN}Conversation History:{Style.RESET_ALL}")
+        if self.store is not None:
+            earlier = self.store.count(self.session_id) - len(self.conversation_history)
+            if earlier > 0:
+                print(f"{Fore.WHITE}({earlier} earlier exchanges are saved but not shown){Style.RESET_ALL}")
         for i, exchange in enumerate(self.conversation_history, 1):
-            print(f"{Fore.WHITE}{i}. Human: {exchange['user']}{Style.RESET_ALL}")
-            print(f"{Fore.GREEN}   Assistant: {exchange['assistant']}{Style.RESET_ALL}")
+            print(f"{Fore.WHITE}{i}. Human: {exchange.user}{Style.RESET_ALL}")
+            print(f"{Fore.GREEN}   Assistant: {exchange.assistant}{Style.RESET_ALL}")
             print()
     
     def display_status(self):
         """Display assistant status."""
         print(f"{Fore.CYAN}Assistant Status:{Style.RESET_ALL}")
         print(f"{Fore.WHITE}  Model: {config.MODEL_NAME}{Style.RESET_ALL}")
-        print(f"{Fore.WHITE}  Device: {'GPU' if torch.cuda.is_available() else 'CPU'}{Style.RESET_ALL}")
+        if self.draft_model is not None:
+            print(f"{Fore.WHITE}  Draft model: {config.DRAFT_MODEL_NAME}{Style.RESET_ALL}")
+        if self.is_ready():
+            device_name = 'GPU' if self.device.startswith('cuda') else 'CPU'
+        else:
+            device_name = 'failed to load' if self.model_ready.done() else 'loading...'
+        print(f"{Fore.WHITE}  Device: {device_name}{Style.RESET_ALL}")
+        if self.is_ready() and self.device == "cpu":
+            import torch
+            tuned = " (tuned)" if self.tuning else " (run autotune.py to tune)"
+            if self.precision_drift is not None:
+                tuned += f", drift KL {self.precision_drift['kl_divergence']:.2g}"
+            print(f"{Fore.WHITE}  CPU: {torch.get_num_threads()} threads, {self.model.dtype}{tuned}{Style.RESET_ALL}")
+        if self.compile_report is not None:
+            report = self.compile_report
+            state = "on" if self.compiled is not None else "off"
+            print(f"{Fore.WHITE}  Compiled generation: {state}, {report['compile_seconds']:.1f}s to compile, "
+                  f"{report['speedup']:.2f}x eager speed{Style.RESET_ALL}")
         print(f"{Fore.WHITE}  Internet: {'Enabled' if config.ALLOW_INTERNET else 'Disabled'}{Style.RESET_ALL}")
-        print(f"{Fore.WHITE}  Conversation exchanges: {len(self.conversation_history)}{Style.RESET_ALL}")
+        print(f"{Fore.WHITE}  Conversation exchanges: {len(self.conversation_history)} "
+              f"(keeps the last {config.MAX_CONVERSATION_HISTORY}){Style.RESET_ALL}")
+        print(f"{Fore.WHITE}  Session memory: {self.session.memory_bytes() / 1024 ** 2:.1f}MB{Style.RESET_ALL}")
+        if self.web_search and self.web_search.cache is not None:
+            cache_stats = self.web_search.cache.stats()
+            print(f"{Fore.WHITE}  Search cache: {cache_stats['memory_hits'] + cache_stats['disk_hits']} hits, "
+                  f"{cache_stats['misses']} misses{Style.RESET_ALL}")
+        if self.prefix_cache is not None:
+            print(f"{Fore.WHITE}  Prefix cache: {self.prefix_cache.cached_tokens} tokens, "
+                  f"{self.prefix_cache.reused_tokens} reused{Style.RESET_ALL}")
+        if self.response_cache is not None:
+            cache_stats = self.response_cache.stats()
+            sampling = config.DO_SAMPLE and config.GENERATION_SEED is None
+            bypass = " (bypassed: sampling without GENERATION_SEED)" if sampling else ""
+            print(f"{Fore.WHITE}  Response cache: {cache_stats['entries']} replies "
+                  f"({cache_stats['bytes'] / 1024:.0f}KB), {cache_stats['hits']} hits, "
+                  f"{cache_stats['misses']} misses{bypass}{Style.RESET_ALL}")
+        if self.startup_timings:
+            timings = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in self.startup_timings.items())
+            print(f"{Fore.WHITE}  Startup: {timings}{Style.RESET_ALL}")
         print(f"{Fore.WHITE}  Log file: {config.LOG_FILE}{Style.RESET_ALL}")
+        if self.log_writer.dropped:
+            print(f"{Fore.YELLOW}  Log records dropped under load: {self.log_writer.dropped}{Style.RESET_ALL}")
+        print()
+    
+    def display_stats(self, output_format: str = ""):
+        """Display latency and throughput statistics, or dump them as JSON or Prometheus text."""
+        if output_format == 'json':
+            print(self.metrics.to_json())
+            return
+        if output_format in ('prometheus', 'prom'):
+            print(self.metrics.to_prometheus(), end="")
+            return
+        
+        snapshot = self.metrics.snapshot()
+        requests = sum(entry['value'] for entry in snapshot['counters'] if entry['name'] == 'requests_total')
+        errors = sum(entry['value'] for entry in snapshot['counters'] if entry['name'] == 'request_errors_total')
+        if not requests:
+            print(f"{Fore.YELLOW}No requests measured yet.{Style.RESET_ALL}")
+            return
+        
+        print(f"{Fore.CYAN}Latency Statistics (last {self.metrics.window} requests):{Style.RESET_ALL}")
+        print(f"{Fore.WHITE}  Requests: {requests:g}, errors: {errors:g}{Style.RESET_ALL}")
+        print(f"{Fore.WHITE}  {'':<26} {'p50':>9} {'p95':>9} {'p99':>9}{Style.RESET_ALL}")
+        for entry in snapshot['histograms']:
+            if 'p50' not in entry:
+                continue
+            name = entry['name']
+            label = ", ".join(entry['labels'].values())
+            if name.endswith('_seconds'):
+                title = f"{name[:-len('_seconds')].replace('_', ' ')}{f' ({label})' if label else ''} ms"
+                values = [entry[p] * 1000 for p in ('p50', 'p95', 'p99')]
+            else:
+                title = name.replace('_', ' ')
+                values = [entry[p] for p in ('p50', 'p95', 'p99')]
+            print(f"{Fore.WHITE}  {title:<26} {values[0]:9.1f} {values[1]:9.1f} {values[2]:9.1f}{Style.RESET_ALL}")
+        print()
+    
+    def display_sessions(self):
+        """List the most recently used saved conversations."""
+        if self.store is None:
+            print(f"{Fore.YELLOW}Conversations are not saved (ENABLE_LOGGING is off or "
+                  f"CONVERSATION_STORE_PATH is not set).{Style.RESET_ALL}")
+            return
+        
+        print(f"{Fore.CYAN}Saved Conversations:{Style.RESET_ALL}")
+        for session_id, last_time, count in self.store.recent_sessions():
+            marker = " (current)" if session_id == self.session_id else ""
+            when = datetime.fromtimestamp(last_time).strftime('%Y-%m-%d %H:%M')
+            print(f"{Fore.WHITE}  {session_id}  {when}  {count} exchanges{marker}{Style.RESET_ALL}")
         print()
     
+    def switch_session(self, session_id: Optional[str] = None):
+        """Continue a saved conversation, or start a new one if session_id is None."""
+        session_id = session_id or uuid.uuid4().hex[:12]
+        if self.prefix_cache is not None:
+            self.session.caches.remove(self.prefix_cache)
+            self.prefix_cache.clear()
+            self.sessions.refresh(self.session)
+        
+        # Only the recent window of the conversation is loaded
+        self.session_id = session_id
+        self.session = self.sessions.get(session_id)
+        if self.prefix_cache is not None:
+            self.session.caches.append(self.prefix_cache)
+            if self.is_ready():
+                self.warm_prefix_cache()
+        
+        print(f"{Fore.GREEN}Now in conversation {session_id} "
+              f"({len(self.conversation_history)} recent exchanges loaded).{Style.RESET_ALL}")
+        self.logger.info(f"Switched to session {session_id}")
+    
     def clear_history(self):
         """Clear conversation history."""
-        self.conversation_history.clear()
+        self.sessions.clear(self.session)
+        if self.prefix_cache is not None and self.is_ready():
+            self.warm_prefix_cache()
         print(f"{Fore.GREEN}Conversation history cleared.{Style.RESET_ALL}")
         self.logger.info("Conversation history cleared by user")
     
@@ -354,16 +1012,32 @@ class MiniGPTAssistant:
                 elif user_input.lower() == 'status':
                     self.display_status()
                     continue
+                elif user_input.lower() == 'sessions':
+                    self.display_sessions()
+                    continue
+                elif user_input.lower() == 'new':
+                    self.switch_session()
+                    continue
+                elif user_input.lower().split()[0] == 'resume' and len(user_input.split()) == 2:
+                    self.switch_session(user_input.split()[1])
+                    continue
+                elif user_input.lower().split()[0] == 'stats':
+                    self.display_stats(user_input.lower().split()[1] if len(user_input.split()) > 1 else "")
+                    continue
                 
                 # Generate and display response
-                print(f"{Fore.GREEN}Assistant: {Style.RESET_ALL}", end="")
-                response = self.generate_response(user_input)
-                print(response)
+                print(f"{Fore.GREEN}Assistant: {Style.RESET_ALL}", end="", flush=True)
+                chunks = []
+                for chunk in self.generate_response_stream(user_input):
+                    print(chunk, end="", flush=True)
+                    chunks.append(chunk)
+                response = "".join(chunks)
+                print()
                 print()
                 
                 # Add to history
                 self.add_to_history(user_input, response)
-                
+        
         except KeyboardInterrupt:
             print(f"\n{Fore.YELLOW}Conversation interrupted by user.{Style.RESET_ALL}")
         except Exception as e:
@@ -374,7 +1048,7 @@ class MiniGPTAssistant:
 def main():
     """Main entry point."""
     try:
-        assistant = MiniGPTAssistant()
+        assistant = MiniGPTAssistant(background_load=True)
         assistant.run()
     except Exception as e:
         print(f"{Fore.RED}Failed to start assistant: {e}{Style.RESET_ALL}")
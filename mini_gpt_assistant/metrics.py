@@ -0,0 +1,293 @@
+"""
+Latency and throughput metrics for the Mini GPT Assistant.
+
+Each request records how long its stages took (context building, web search,
+generation, cleaning) and how many tokens it read and wrote. The values go
+into rolling histograms that can be shown with the `stats` command or dumped
+as JSON or Prometheus text. Hooks can observe every request, for example to
+profile it.
+"""
+
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from typing import List, Dict, Optional, Tuple
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+    """Rolling window of observations with cumulative count and sum."""
+
+    def __init__(self, window: int):
+        self.values = deque(maxlen=window)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.values.append(value)
+        self.count += 1
+        self.sum += value
+
+    def summary(self) -> Dict[str, float]:
+        """Percentiles over the window plus cumulative totals."""
+        ordered = sorted(self.values)
+        if not ordered:
+            return {'count': self.count, 'sum': self.sum}
+
+        def rank(p: float) -> float:
+            return ordered[min(max(math.ceil(p * len(ordered)) - 1, 0), len(ordered) - 1)]
+
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'mean': sum(ordered) / len(ordered),
+            'p50': rank(0.50),
+            'p95': rank(0.95),
+            'p99': rank(0.99),
+            'max': ordered[-1],
+        }
+
+
+class RequestMetrics:
+    """Timings and token counts of a single request."""
+
+    def __init__(self, metrics: Optional["Metrics"] = None, kind: str = "chat", session_id: Optional[str] = None):
+        self.metrics = metrics
+        self.kind = kind
+        self.session_id = session_id
+        self.stages: Dict[str, float] = {}
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+        self.time_to_first_chunk: Optional[float] = None
+        self.start_time = time.perf_counter()
+        self.total = 0.0
+        self.failed = False
+
+    @contextmanager
+    def stage(self, name: str):
+        """Time a stage; repeated stages of the same name add up."""
+        if self.metrics is not None:
+            self.metrics.call_hooks('start_stage', self, name)
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+            if self.metrics is not None:
+                self.metrics.call_hooks('finish_stage', self, name)
+
+    def add_time(self, name: str, seconds: float):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def mark_first_chunk(self):
+        """Record the time to the first chunk shown to the user."""
+        if self.time_to_first_chunk is None:
+            self.time_to_first_chunk = time.perf_counter() - self.start_time
+
+    @property
+    def tokens_per_second(self) -> float:
+        generate_time = self.stages.get('generate', 0.0)
+        return self.generated_tokens / generate_time if generate_time > 0 else 0.0
+
+    def as_dict(self) -> Dict:
+        return {
+            'kind': self.kind,
+            'session_id': self.session_id,
+            'stages': dict(self.stages),
+            'total': self.total,
+            'prompt_tokens': self.prompt_tokens,
+            'generated_tokens': self.generated_tokens,
+            'tokens_per_second': self.tokens_per_second,
+            'time_to_first_chunk': self.time_to_first_chunk,
+            'failed': self.failed,
+        }
+
+    def __enter__(self):
+        if self.metrics is not None:
+            self.metrics.call_hooks('start', self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.total = time.perf_counter() - self.start_time
+        self.failed = exc_type is not None and issubclass(exc_type, Exception)
+        if self.metrics is not None:
+            self.metrics.finish_request(self)
+        return False
+
+
+class Metrics:
+    """Thread-safe registry of rolling histograms and counters."""
+
+    def __init__(self, window: int = 1000, prefix: str = "minigpt"):
+        self.window = window
+        self.prefix = prefix
+        self.histograms: Dict[Tuple[str, LabelKey], Histogram] = {}
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.hooks: List = []
+        self.lock = threading.Lock()
+
+    def observe(self, name: str, value: float, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(self.window)
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels: str):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def request(self, kind: str = "chat", session_id: Optional[str] = None) -> RequestMetrics:
+        """Start measuring a request; use as a context manager."""
+        return RequestMetrics(self, kind, session_id)
+
+    def add_hook(self, hook):
+        """
+        Register a request hook.
+
+        Hooks may define start(request) and finish(request), called around
+        every request, and start_stage(request, name) and
+        finish_stage(request, name), called around its stages on the thread
+        that runs them.
+        """
+        self.hooks.append(hook)
+
+    def call_hooks(self, method: str, *args):
+        for hook in self.hooks:
+            if hasattr(hook, method):
+                getattr(hook, method)(*args)
+
+    def finish_request(self, request: RequestMetrics):
+        """Fold a finished request into the histograms and notify hooks."""
+        for stage, seconds in request.stages.items():
+            self.observe('stage_seconds', seconds, stage=stage)
+        self.observe('request_seconds', request.total, kind=request.kind)
+        if request.time_to_first_chunk is not None:
+            self.observe('time_to_first_chunk_seconds', request.time_to_first_chunk)
+        if request.prompt_tokens:
+            self.observe('prompt_tokens', request.prompt_tokens)
+        if request.generated_tokens:
+            self.observe('generated_tokens', request.generated_tokens)
+            self.observe('tokens_per_second', request.tokens_per_second)
+        self.increment('requests_total', kind=request.kind)
+        if request.failed:
+            self.increment('request_errors_total', kind=request.kind)
+
+        self.call_hooks('finish', request)
+
+    def snapshot(self) -> Dict:
+        """All metrics as plain data."""
+        with self.lock:
+            histograms = {key: histogram.summary() for key, histogram in self.histograms.items()}
+            counters = dict(self.counters)
+
+        return {
+            'histograms': [
+                {'name': name, 'labels': dict(labels), **summary}
+                for (name, labels), summary in sorted(histograms.items())
+            ],
+            'counters': [
+                {'name': name, 'labels': dict(labels), 'value': value}
+                for (name, labels), value in sorted(counters.items())
+            ],
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self) -> str:
+        """Metrics in the Prometheus text exposition format (histograms as summaries)."""
+        return format_prometheus(self.snapshot(), self.prefix)
+
+
+def merge_snapshots(snapshots: Dict[str, Dict], label: str) -> Dict:
+    """Combine snapshots of several registries, telling them apart by a label."""
+    merged = {'histograms': [], 'counters': []}
+    for value, snapshot in snapshots.items():
+        for kind in merged:
+            merged[kind].extend(dict(entry, labels=dict(entry['labels'], **{label: value})) for entry in snapshot[kind])
+    for kind in merged:
+        merged[kind].sort(key=lambda entry: (entry['name'], sorted(entry['labels'].items())))
+    return merged
+
+
+def format_prometheus(snapshot: Dict, prefix: str) -> str:
+    """Format a metrics snapshot in the Prometheus text exposition format."""
+    lines = []
+    typed = set()
+    for entry in snapshot['histograms']:
+        name = f"{prefix}_{entry['name']}"
+        if name not in typed:
+            lines.append(f"# TYPE {name} summary")
+            typed.add(name)
+        for quantile, value in (('p50', '0.5'), ('p95', '0.95'), ('p99', '0.99')):
+            if quantile in entry:
+                labels = dict(entry['labels'], quantile=value)
+                lines.append(f"{name}{_format_labels(labels)} {entry[quantile]:.6g}")
+        lines.append(f"{name}_sum{_format_labels(entry['labels'])} {entry['sum']:.6g}")
+        lines.append(f"{name}_count{_format_labels(entry['labels'])} {entry['count']}")
+
+    for entry in snapshot['counters']:
+        name = f"{prefix}_{entry['name']}"
+        if name not in typed:
+            lines.append(f"# TYPE {name} counter")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(entry['labels'])} {entry['value']:g}")
+
+    return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        f'{key}="' + str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in sorted(labels.items())
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+class TorchProfilerHook:
+    """
+    Request hook that profiles model generation and writes a Chrome trace per request.
+
+    The torch profiler only records the thread it was started on, so it runs
+    around the generation stage rather than the whole request; streamed
+    responses generate on a background thread.
+    """
+
+    def __init__(self, output_dir: str, stages: Tuple[str, ...] = ('generate',)):
+        self.output_dir = output_dir
+        self.stages = stages
+        self.count = 0
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def start_stage(self, request: RequestMetrics, name: str):
+        if name not in self.stages:
+            return
+        from torch.profiler import profile, ProfilerActivity
+
+        self.local.profiler = profile(activities=[ProfilerActivity.CPU], record_shapes=True)
+        self.local.profiler.__enter__()
+
+    def finish_stage(self, request: RequestMetrics, name: str):
+        profiler = getattr(self.local, 'profiler', None)
+        if name not in self.stages or profiler is None:
+            return
+        self.local.profiler = None
+        profiler.__exit__(None, None, None)
+
+        with self.lock:
+            self.count += 1
+            count = self.count
+        path = os.path.join(self.output_dir, f"{request.kind}-{name}-{int(time.time())}-{count}.json")
+        profiler.export_chrome_trace(path)
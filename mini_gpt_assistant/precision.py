@@ -0,0 +1,156 @@
+"""
+Half-precision CPU inference.
+
+On CPUs that compute bfloat16 natively (AVX512-BF16 or AMX, as on recent
+Xeon and EPYC hosts, and Apple silicon) bfloat16 weights halve the memory
+and the memory bandwidth every generated token needs. Whether that is also
+faster depends on the model and the CPU, so it is only used when
+TORCH_DTYPE asks for "bfloat16"; elsewhere bfloat16 is emulated and CPU
+inference stays float32. Before half precision is used, its next-token
+distributions are compared with the float32 model's on a fixed prompt set;
+run this file to see the comparison for the configured model.
+"""
+
+import time
+from typing import Dict, List
+
+import torch
+
+from quantization import QUALITY_PROMPTS, model_size_mb
+
+# TORCH_DTYPE values that mean half precision on GPU
+HALF_DTYPES = ('float16', 'bfloat16')
+
+# TORCH_DTYPE values that leave the choice to the tuning profile (float16 on GPU)
+AUTO_DTYPES = ('auto', None)
+
+
+def cpu_dtype(name: str, cpu: Dict) -> torch.dtype:
+    """
+    The dtype to run on this CPU for a TORCH_DTYPE setting.
+
+    Only an explicit "bfloat16" runs in half precision, and only with native
+    bfloat16 support. float16 is a GPU format whose CPU kernels are slow, so
+    the GPU default "float16" keeps the CPU on float32.
+    """
+    if name == 'bfloat16' and cpu['bf16']:
+        return torch.bfloat16
+    return torch.float32
+
+
+def reference_log_probs(model, tokenizer, texts: List[str] = QUALITY_PROMPTS) -> List[torch.Tensor]:
+    """Next-token log-probabilities of a model on each prompt, to compare other precisions against."""
+    log_probs = []
+    with torch.no_grad():
+        for text in texts:
+            input_ids = tokenizer(text, return_tensors='pt')['input_ids'].to(model.device)
+            log_probs.append(torch.log_softmax(model(input_ids=input_ids).logits.float(), dim=-1))
+    return log_probs
+
+
+def precision_drift(reference: List[torch.Tensor], model, tokenizer,
+                    texts: List[str] = QUALITY_PROMPTS) -> Dict[str, float]:
+    """
+    Compare a model's next-token distributions with float32 reference log-probabilities.
+
+    Returns:
+        Mean KL divergence per token (nats) and how often both pick the same top token
+    """
+    divergence = 0.0
+    agreement = 0
+    tokens = 0
+    actual_log_probs = reference_log_probs(model, tokenizer, texts)
+    for expected, actual in zip(reference, actual_log_probs):
+        divergence += (expected.exp() * (expected - actual)).sum().item()
+        agreement += (expected.argmax(dim=-1) == actual.argmax(dim=-1)).sum().item()
+        tokens += expected.shape[1]
+    return {
+        'kl_divergence': divergence / max(tokens, 1),
+        'top1_agreement': agreement / max(tokens, 1),
+    }
+
+
+def reduce_precision(model, dtype: torch.dtype, tokenizer, max_kl: float) -> Dict:
+    """
+    Cast a float32 model to half precision in place and measure how far its outputs drift.
+
+    The float32 outputs are computed first, so the model is never held in
+    memory twice. A model whose drift exceeds max_kl stays in half precision;
+    casting it back would not restore the float32 weights, so the caller
+    reloads them.
+
+    Returns:
+        The measured drift with a 'passed' flag
+    """
+    reference = reference_log_probs(model, tokenizer)
+    model.to(dtype)
+    drift = precision_drift(reference, model, tokenizer)
+    drift['passed'] = drift['kl_divergence'] <= max_kl
+    return drift
+
+
+def _seconds_per_token(model, tokenizer, new_tokens: int = 32) -> float:
+    """Seconds per generated token for a short greedy generation."""
+    inputs = tokenizer(QUALITY_PROMPTS[0], return_tensors='pt')
+    with torch.no_grad():
+        start_time = time.perf_counter()
+        output = model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                                do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        elapsed = time.perf_counter() - start_time
+    return elapsed / max(output.shape[1] - inputs['input_ids'].shape[1], 1)
+
+
+def main():
+    """Compare bfloat16 and float32 inference of the configured model on this CPU."""
+    import argparse
+    import json
+    from colorama import Fore, Style
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    import config
+    from autotune import probe_cpu
+    from snapshot import find_snapshot
+
+    parser = argparse.ArgumentParser(description="Compare bfloat16 and float32 outputs and speed on CPU")
+    parser.add_argument('--model', default=config.MODEL_NAME)
+    parser.add_argument('--max-kl', type=float, default=config.PRECISION_MAX_KL,
+                        help="Largest acceptable KL divergence per token")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    source = config.MODEL_SNAPSHOT_DIR if find_snapshot(config.MODEL_SNAPSHOT_DIR, args.model) else args.model
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForCausalLM.from_pretrained(source, torch_dtype=torch.float32).eval()
+
+    # Measured in float32 first, since the model is cast in place
+    fp32_size_mb = model_size_mb(model)
+    fp32_seconds_per_token = _seconds_per_token(model, tokenizer)
+    drift = reduce_precision(model, torch.bfloat16, tokenizer, args.max_kl)
+    results = dict(
+        drift,
+        native_bf16=probe_cpu()['bf16'],
+        fp32_size_mb=fp32_size_mb,
+        bf16_size_mb=model_size_mb(model),
+        fp32_seconds_per_token=fp32_seconds_per_token,
+        bf16_seconds_per_token=_seconds_per_token(model, tokenizer),
+    )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{Fore.CYAN}bfloat16 check for {args.model}{Style.RESET_ALL}")
+        print(f"  Drift:      KL {results['kl_divergence']:.2g} per token, "
+              f"top token agrees {results['top1_agreement']:.1%}")
+        print(f"  Weights:    {results['fp32_size_mb']:.1f}MB -> {results['bf16_size_mb']:.1f}MB")
+        print(f"  Latency:    {results['fp32_seconds_per_token'] * 1000:.1f}ms -> "
+              f"{results['bf16_seconds_per_token'] * 1000:.1f}ms per token"
+              f"{'' if results['native_bf16'] else ' (no native bfloat16 on this CPU)'}")
+        color = Fore.GREEN if drift['passed'] else Fore.RED
+        verdict = "within" if drift['passed'] else "exceeds"
+        print(f"{color}Drift {verdict} the limit of {args.max_kl:g}{Style.RESET_ALL}")
+
+    raise SystemExit(0 if drift['passed'] else 1)
+
+
+if __name__ == "__main__":
+    main()
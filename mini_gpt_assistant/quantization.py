@@ -0,0 +1,154 @@
+"""
+Int8 dynamic quantization for CPU inference.
+
+The linear layers' weights are stored as int8 and activations are quantized
+on the fly, which cuts memory and per-token latency on CPU. Run this file to
+compare the perplexity of the quantized model against the float32 model on a
+fixed local prompt set before enabling CPU_QUANTIZATION in config.py.
+"""
+
+import io
+import copy
+import math
+import time
+from typing import List, Dict
+
+import torch
+
+# Fixed prompt set for the quality check; keep it stable so results are comparable
+QUALITY_PROMPTS = [
+    "Human: Hello, how are you?\nAssistant: Hello! I'm doing well, thank you for asking. How can I help you today?",
+    "Human: What can you do?\nAssistant: I'm an AI assistant that can help with various tasks like answering "
+    "questions, having conversations, and providing information.",
+    "Human: Tell me about yourself\nAssistant: I'm a local AI assistant running on your computer. I can chat "
+    "with you, answer questions, and help with various tasks while keeping your data private.",
+    "The weather today is sunny with a light breeze, and the temperature is expected to reach twenty degrees.",
+    "Python is a popular programming language known for its readable syntax and large standard library.",
+    "To make a cup of tea, boil some water, pour it over the tea leaves and let it steep for a few minutes.",
+    "The history of computing goes back to mechanical calculators, long before the first electronic computers.",
+    "Regular exercise, a balanced diet and enough sleep are important for staying healthy.",
+]
+
+
+def linearize_conv1d(model: torch.nn.Module) -> torch.nn.Module:
+    """
+    Replace GPT-2 style Conv1D layers with equivalent nn.Linear layers.
+
+    GPT-2 models implement their projections with transformers' Conv1D, which
+    dynamic quantization does not recognize.
+    """
+    from transformers.pytorch_utils import Conv1D
+
+    for module in list(model.modules()):
+        for child_name, child in list(module.named_children()):
+            if isinstance(child, Conv1D):
+                in_features, out_features = child.weight.shape
+                linear = torch.nn.Linear(in_features, out_features, device=child.weight.device,
+                                         dtype=child.weight.dtype)
+                with torch.no_grad():
+                    linear.weight.copy_(child.weight.t())
+                    linear.bias.copy_(child.bias)
+                setattr(module, child_name, linear)
+    return model
+
+
+def quantize_dynamic_int8(model: torch.nn.Module) -> torch.nn.Module:
+    """Quantize a float32 CPU model's linear layers to int8 in place."""
+    from torch.ao.quantization import quantize_dynamic
+
+    model = linearize_conv1d(model)
+    return quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8, inplace=True)
+
+
+def model_size_mb(model: torch.nn.Module) -> float:
+    """Approximate size of a model's weights in megabytes, including packed int8 weights."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell() / 1024 ** 2
+
+
+def perplexity(model, tokenizer, texts: List[str]) -> float:
+    """Token-weighted perplexity of a model over a list of texts."""
+    total_loss = 0.0
+    total_tokens = 0
+    with torch.no_grad():
+        for text in texts:
+            input_ids = tokenizer(text, return_tensors='pt')['input_ids'].to(model.device)
+            if input_ids.shape[1] < 2:
+                continue
+            loss = model(input_ids=input_ids, labels=input_ids).loss.item()
+            tokens = input_ids.shape[1] - 1
+            total_loss += loss * tokens
+            total_tokens += tokens
+    return math.exp(total_loss / max(total_tokens, 1))
+
+
+def _latency(model, tokenizer, new_tokens: int = 32) -> float:
+    """Seconds per generated token for a short greedy generation."""
+    inputs = tokenizer(QUALITY_PROMPTS[0], return_tensors='pt')
+    with torch.no_grad():
+        start_time = time.perf_counter()
+        output = model.generate(**inputs, max_new_tokens=new_tokens, min_new_tokens=new_tokens,
+                                do_sample=False, pad_token_id=tokenizer.eos_token_id)
+        elapsed = time.perf_counter() - start_time
+    return elapsed / max(output.shape[1] - inputs['input_ids'].shape[1], 1)
+
+
+def compare_quantization(model, tokenizer) -> Dict[str, float]:
+    """Compare a float32 model with its int8 quantized copy."""
+    quantized = quantize_dynamic_int8(copy.deepcopy(model))
+
+    results = {
+        'fp32_perplexity': perplexity(model, tokenizer, QUALITY_PROMPTS),
+        'int8_perplexity': perplexity(quantized, tokenizer, QUALITY_PROMPTS),
+        'fp32_size_mb': model_size_mb(model),
+        'int8_size_mb': model_size_mb(quantized),
+        'fp32_seconds_per_token': _latency(model, tokenizer),
+        'int8_seconds_per_token': _latency(quantized, tokenizer),
+    }
+    results['perplexity_change'] = results['int8_perplexity'] / results['fp32_perplexity'] - 1
+    return results
+
+
+def main():
+    """Run the int8 quality check on the configured model."""
+    import argparse
+    import json
+    from colorama import Fore, Style
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    import config
+    from snapshot import find_snapshot
+
+    parser = argparse.ArgumentParser(description="Compare int8 quantized and float32 perplexity")
+    parser.add_argument('--model', default=config.MODEL_NAME)
+    parser.add_argument('--max-increase', type=float, default=config.QUANTIZATION_MAX_PERPLEXITY_INCREASE,
+                        help="Largest acceptable relative perplexity increase")
+    parser.add_argument('--json', action='store_true', help="Print the results as JSON")
+    args = parser.parse_args()
+
+    source = config.MODEL_SNAPSHOT_DIR if find_snapshot(config.MODEL_SNAPSHOT_DIR, args.model) else args.model
+    tokenizer = AutoTokenizer.from_pretrained(source)
+    model = AutoModelForCausalLM.from_pretrained(source, torch_dtype=torch.float32).eval()
+
+    results = compare_quantization(model, tokenizer)
+    passed = results['perplexity_change'] <= args.max_increase
+
+    if args.json:
+        print(json.dumps(dict(results, passed=passed), indent=2))
+    else:
+        print(f"{Fore.CYAN}Int8 quantization check for {args.model}{Style.RESET_ALL}")
+        print(f"  Perplexity: {results['fp32_perplexity']:.2f} (fp32) -> {results['int8_perplexity']:.2f} (int8), "
+              f"{results['perplexity_change']:+.1%}")
+        print(f"  Weights:    {results['fp32_size_mb']:.1f}MB -> {results['int8_size_mb']:.1f}MB")
+        print(f"  Latency:    {results['fp32_seconds_per_token'] * 1000:.1f}ms -> "
+              f"{results['int8_seconds_per_token'] * 1000:.1f}ms per token")
+        color = Fore.GREEN if passed else Fore.RED
+        verdict = "within" if passed else "exceeds"
+        print(f"{color}Perplexity change {verdict} the {args.max_increase:.0%} limit{Style.RESET_ALL}")
+
+    raise SystemExit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Response cache for the Mini GPT Assistant.
+
+With greedy decoding (DO_SAMPLE False), or sampling from a fixed seed, the
+same prompt always produces the same reply, so a repeated question is
+answered with a lookup instead of a full decode. Replies are keyed on a hash
+of the final prompt token IDs and every setting that affects generation:
+a different history, system prompt, search result or setting is a
+different key, so cached replies never go stale, only unused.
+"""
+
+import sys
+import json
+import time
+import hashlib
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+
+class ResponseCache:
+    """In-memory LRU cache of generated replies with a TTL and a memory limit."""
+
+    def __init__(self, max_entries: int = 512, max_bytes: int = 16 * 1024 ** 2, ttl: Optional[float] = None):
+        """
+        Initialize an empty response cache.
+
+        Args:
+            max_entries: Maximum number of replies kept
+            max_bytes: Maximum memory held by the cached replies
+            ttl: Seconds a reply stays valid (None = until it is evicted)
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (expires_at, reply, size)
+        self.entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(input_ids: List[int], settings: Dict) -> str:
+        """
+        Hash a prompt and the settings it is generated with.
+
+        Args:
+            input_ids: Token IDs of the final prompt
+            settings: Everything else that changes the reply (JSON serializable)
+        """
+        digest = hashlib.sha256(array('q', input_ids).tobytes())
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached reply for a key, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and entry[0] > time.monotonic():
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry:
+                self._drop(key)
+            self.misses += 1
+            return None
+
+    def put(self, key: str, reply: str):
+        """Cache a reply, evicting the least recently used ones beyond the limits."""
+        size = sys.getsizeof(key) + sys.getsizeof(reply)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl else float('inf')
+
+        with self.lock:
+            if key in self.entries:
+                self._drop(key)
+            self.entries[key] = (expires_at, reply, size)
+            self.size += size
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                self._drop(next(iter(self.entries)))
+                self.evictions += 1
+
+    def _drop(self, key: str):
+        """Remove an entry; the lock must be held."""
+        self.size -= self.entries.pop(key)[2]
+
+    def clear(self):
+        """Drop all cached replies."""
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def memory_bytes(self) -> int:
+        """Memory held by the cached replies and their keys."""
+        return self.size
+
+    def stats(self) -> Dict[str, int]:
+        """Hit, miss and eviction counts, and the current size."""
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
+
+    def __len__(self) -> int:
+        return len(self.entries)
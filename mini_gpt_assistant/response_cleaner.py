@@ -0,0 +1,207 @@
+"""
+Response cleaning rules for the Mini GPT Assistant.
+
+The rules work incrementally so they can be applied to streamed text as it is
+decoded, and to complete responses by feeding the whole text at once.
+
+Streamed text cannot be taken back once it is shown, so streaming differs
+from cleaning a complete response (clean_text) in two ways:
+
+- A reply over the length limit stops at the last word that fits, followed
+  by "...", instead of being cut back to its last complete sentence.
+- A line that turns into junk part way through keeps the words already
+  shown; only the rest of it is dropped. A complete line is dropped whole.
+"""
+
+from typing import List, Optional
+
+# A line starting with one of these is the model writing the next turn
+TURN_MARKERS = ('Human:', 'Assistant:', 'You:', 'User:')
+
+# Markers that leak into the middle of a line and are simply removed
+INLINE_MARKERS = ('Human:', 'Assistant:')
+
+# Repetitive academic titles or weird patterns small models like to produce
+JUNK_PATTERNS = ('professor:', 'dr. dr.', 'university of california' * 3)
+
+# Length of the repeated word group that marks a repetition loop
+REPETITION_WINDOW = 3
+
+MAX_RESPONSE_CHARS = 300
+EMPTY_RESPONSE = "I'm not sure how to respond to that."
+FALLBACK_RESPONSE = "Hello! How can I help you today?"
+
+
+class ResponseCleaner:
+    """
+    Incrementally clean generated text.
+
+    Call feed() with each decoded chunk; it returns the cleaned text that is
+    safe to display so far. Call finish() once generation ends to flush the
+    remainder. Once `done` is set the rest of the generation is discarded.
+    """
+
+    def __init__(self, max_chars: Optional[int] = MAX_RESPONSE_CHARS):
+        """Initialize an empty cleaner; max_chars None means no length limit."""
+        self.max_chars = max_chars
+        self.done = False
+        self.text = ""
+        self._received = False
+        self._truncated = False
+        self._line = ""
+        self._line_text = ""
+        self._line_checked = False
+        self._skip_line = False
+        self._words: List[str] = []
+        self._length = 0
+        self._emitted = 0
+
+    @property
+    def result(self) -> str:
+        """The final cleaned response, including fallbacks for empty output."""
+        if not self._received:
+            return EMPTY_RESPONSE
+        if len(self.text) < 3:
+            return FALLBACK_RESPONSE
+        return self.text
+
+    def feed(self, chunk: str) -> str:
+        """Add decoded text and return the newly cleaned text."""
+        if self.done or not chunk:
+            return ""
+        self._received = True
+        self._line += chunk
+
+        while "\n" in self._line and not self.done:
+            line, rest = self._line.split("\n", 1)
+            self._line = line
+            self._consume(end_of_line=True)
+            self._line = rest
+            self._start_line()
+
+        if not self.done:
+            self._consume(end_of_line=False)
+        return self._emit(final=self.done)
+
+    def finish(self) -> str:
+        """Flush the remaining text once generation has ended."""
+        if not self.done:
+            self._consume(end_of_line=True)
+            self.done = True
+        piece = self._emit(final=True)
+
+        if self._truncated and self.text and not self.text.endswith(('.', '!', '?')):
+            piece += "..."
+            self.text += "..."
+
+        # Only fall back when nothing was shown, so streamed output stays consistent
+        if not self.text:
+            piece = self.result
+        return piece
+
+    def _start_line(self):
+        """Reset per-line state."""
+        self._line_text = ""
+        self._line_checked = False
+        self._skip_line = False
+
+    def _consume(self, end_of_line: bool):
+        """Turn the complete words of the current line into accepted words."""
+        text = self._line
+
+        if not self._line_checked:
+            stripped = text.lstrip()
+            if not end_of_line and any(marker.startswith(stripped) for marker in TURN_MARKERS):
+                return  # Not enough text yet to tell whether a new turn starts
+            if stripped.startswith(TURN_MARKERS):
+                self.done = True
+                return
+            self._line_checked = True
+
+        if end_of_line:
+            complete, rest = text, ""
+        else:
+            cut = max(text.rfind(" "), text.rfind("\t"))
+            if cut < 0:
+                return  # Hold back the partial word
+            complete, rest = text[:cut], text[cut:]
+
+        self._line = rest
+        if self._skip_line:
+            return
+
+        # A line seen whole is dropped whole
+        if end_of_line and not self._line_text:
+            if any(pattern in " ".join(complete.lower().split()) for pattern in JUNK_PATTERNS):
+                self._skip_line = True
+                return
+
+        for word in complete.split():
+            self._line_text += " " + word.lower()
+            if any(pattern in self._line_text for pattern in JUNK_PATTERNS):
+                self._skip_line = True
+                return
+            self._add_word(word)
+            if self.done:
+                return
+
+    def _add_word(self, word: str):
+        """Accept a word, stopping on repetition loops or the length budget."""
+        for marker in INLINE_MARKERS:
+            word = word.replace(marker, "")
+        if not word:
+            return
+
+        length = self._length + len(word) + (1 if self._words else 0)
+        if self.max_chars is not None and length > self.max_chars:
+            # A single run of text longer than the limit is cut rather than lost
+            if not self._words:
+                self._words.append(word[:self.max_chars])
+            self._truncated = True
+            self.done = True
+            return
+
+        self._words.append(word)
+        self._length = length
+
+        window = REPETITION_WINDOW
+        if len(self._words) >= 2 * window and self._words[-2 * window:-window] == self._words[-window:]:
+            del self._words[-window:]
+            self.done = True
+
+    def _emit(self, final: bool) -> str:
+        """Return accepted words that can no longer be retracted."""
+        # The last words may still turn out to start a repetition loop
+        limit = len(self._words) if final else len(self._words) - (REPETITION_WINDOW - 1)
+        if limit <= self._emitted:
+            return ""
+
+        piece = " ".join(self._words[self._emitted:limit])
+        if self.text:
+            piece = " " + piece
+        self.text += piece
+        self._emitted = limit
+        return piece
+
+
+def clean_text(response: str, max_chars: int = MAX_RESPONSE_CHARS) -> str:
+    """
+    Clean a complete generated response.
+
+    A response over the length limit is cut back to its last complete
+    sentence within the limit, or cut at the limit with "..." if it has none.
+    """
+    cleaner = ResponseCleaner(max_chars=None)
+    # The closing newline makes the last line a complete one
+    if response:
+        cleaner.feed(response + "\n")
+    cleaner.finish()
+    result = cleaner.result
+
+    if len(result) > max_chars:
+        sentences = result[:max_chars].split('.')
+        if len(sentences) > 1:
+            result = '.'.join(sentences[:-1]) + '.'
+        else:
+            result = result[:max_chars] + "..."
+    return result
@@ -0,0 +1,128 @@
+"""
+Retrieval memory for the Mini GPT Assistant.
+
+Every exchange is embedded once when it is added, using the mean of the
+loaded model's last hidden states, and stored as a row of a contiguous NumPy
+matrix. For a new prompt the whole matrix is scored against the prompt's
+embedding in one matrix product, and the most relevant past exchanges are
+put in the prompt instead of simply the latest ones.
+"""
+
+from typing import Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from sessions import Exchange
+
+
+class HiddenStateEncoder:
+    """Embeds token sequences with the loaded model's mean-pooled last hidden states."""
+
+    def __init__(self, model, max_tokens: int = 256, batch_size: int = 8):
+        """
+        Args:
+            model: Loaded causal language model
+            max_tokens: Tokens embedded per sequence; longer ones keep their end
+            batch_size: Sequences run through the model together
+        """
+        # The base model skips the language modeling head, the largest matrix product
+        self.model = model.base_model
+        self.max_tokens = max_tokens
+        self.batch_size = batch_size
+
+    def encode(self, sequences: Sequence[Sequence[int]]) -> np.ndarray:
+        """Embed token sequences; returns a float32 matrix with one row per sequence."""
+        import torch
+
+        rows = []
+        for start in range(0, len(sequences), self.batch_size):
+            batch = [list(ids)[-self.max_tokens:] or [0] for ids in sequences[start:start + self.batch_size]]
+            length = max(len(ids) for ids in batch)
+            input_ids = torch.zeros((len(batch), length), dtype=torch.long)
+            mask = torch.zeros((len(batch), length), dtype=torch.long)
+            for row, ids in enumerate(batch):
+                input_ids[row, :len(ids)] = torch.tensor(ids)
+                mask[row, :len(ids)] = 1
+
+            device = self.model.device
+            with torch.no_grad():
+                hidden = self.model(input_ids=input_ids.to(device), attention_mask=mask.to(device)).last_hidden_state
+            weights = mask.to(device).unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * weights).sum(dim=1) / weights.sum(dim=1)
+            rows.append(pooled.float().cpu().numpy())
+        return np.concatenate(rows) if rows else np.empty((0, 0), dtype=np.float32)
+
+
+class RetrievalMemory:
+    """Embeddings of a session's past exchanges, searched by cosine similarity."""
+
+    def __init__(self, capacity: int):
+        """
+        Args:
+            capacity: Exchanges kept; the oldest is overwritten when full
+        """
+        self.capacity = capacity
+        self.vectors: Optional[np.ndarray] = None
+        self.exchanges: List[Exchange] = []
+        self.next = 0
+
+    def add(self, exchanges: Sequence[Exchange], vectors: np.ndarray):
+        """Store exchanges with their embeddings, one row of vectors per exchange."""
+        for exchange, vector in zip(exchanges, vectors):
+            if self.vectors is None:
+                self.vectors = np.empty((min(16, self.capacity), len(vector)), dtype=np.float32)
+
+            if len(self.exchanges) < self.capacity:
+                # Grow by doubling so the rows stay contiguous
+                if len(self.exchanges) == len(self.vectors):
+                    grown = np.empty((min(len(self.vectors) * 2, self.capacity), self.vectors.shape[1]),
+                                     dtype=np.float32)
+                    grown[:len(self.vectors)] = self.vectors
+                    self.vectors = grown
+                self.vectors[len(self.exchanges)] = vector
+                self.exchanges.append(exchange)
+            else:
+                self.vectors[self.next] = vector
+                self.exchanges[self.next] = exchange
+                self.next = (self.next + 1) % self.capacity
+
+    def search(self, query: np.ndarray, k: int, exclude: Iterable[Exchange] = ()) -> List[Exchange]:
+        """
+        Return up to k stored exchanges most similar to the query, most similar first.
+
+        Embeddings are centered on their mean before comparing: raw hidden
+        states of a language model all point in much the same direction.
+        """
+        count = len(self.exchanges)
+        if not count or k <= 0:
+            return []
+
+        vectors = self.vectors[:count]
+        mean = vectors.mean(axis=0) if count > 1 else np.zeros(vectors.shape[1], dtype=np.float32)
+        centered = vectors - mean
+        target = query - mean
+        norms = np.linalg.norm(centered, axis=1) * np.linalg.norm(target)
+        scores = centered @ target / np.maximum(norms, 1e-8)
+
+        skip = {id(exchange) for exchange in exclude}
+        results = []
+        for index in np.argsort(-scores):
+            exchange = self.exchanges[index]
+            if id(exchange) not in skip:
+                results.append(exchange)
+                if len(results) == k:
+                    break
+        return results
+
+    def clear(self):
+        self.vectors = None
+        self.exchanges = []
+        self.next = 0
+
+    def memory_bytes(self) -> int:
+        """Upper bound of the memory held; exchanges still in the history are counted again."""
+        vectors = self.vectors.nbytes if self.vectors is not None else 0
+        return vectors + sum(exchange.memory_bytes() for exchange in self.exchanges)
+
+    def __len__(self) -> int:
+        return len(self.exchanges)
@@ -0,0 +1,319 @@
+"""
+HTTP server mode for the Mini GPT Assistant.
+
+Serves chat and completion requests on localhost from a single loaded model.
+Concurrent requests are collected into padded batches, so many sessions share
+one copy of the weights instead of running one process per user. With
+--workers, several forked processes share that copy and each serve their own
+sessions (see worker_pool.py).
+
+Endpoints:
+    POST   /v1/chat            {"message": "...", "session_id": "..."}
+    POST   /v1/completions     {"prompt": "..."}
+    DELETE /v1/sessions/<id>   Clear a session's history
+    GET    /health
+    GET    /metrics            Latency statistics in the Prometheus text format
+"""
+
+import sys
+import json
+import uuid
+import time
+import queue
+import logging
+import argparse
+import threading
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List, Dict, Optional, Tuple
+
+from colorama import Fore, Style
+
+import config
+from main import MiniGPTAssistant
+from autotune import load_tuning_profile
+from response_cleaner import clean_text
+
+
+class DynamicBatcher:
+    """Collects concurrent generation requests into padded batches."""
+
+    def __init__(self, assistant: MiniGPTAssistant, max_batch_size: int, max_wait: float):
+        """
+        Initialize the batcher and start its worker thread.
+
+        Args:
+            assistant: Assistant holding the loaded model and tokenizer
+            max_batch_size: Maximum number of prompts generated together
+            max_wait: Seconds to wait for more requests after the first one arrives
+        """
+        self.assistant = assistant
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.logger = logging.getLogger('DynamicBatcher')
+        self.requests: "queue.Queue[Optional[Tuple[List[int], bool, Future]]]" = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="DynamicBatcher", daemon=True)
+        self.thread.start()
+
+    def submit(self, input_ids: List[int], stop_when_cleaned: bool = False) -> Future:
+        """
+        Queue a prompt; the future resolves to the generated text.
+
+        With stop_when_cleaned, generation of this prompt ends where
+        clean_response would cut the reply.
+        """
+        future = Future()
+        self.requests.put((input_ids, stop_when_cleaned, future))
+        return future
+
+    def stop(self):
+        """Stop the worker thread after the queued requests."""
+        self.requests.put(None)
+        self.thread.join()
+
+    def _run(self):
+        """Worker loop: wait for a request, then fill the batch until full or the wait expires."""
+        while True:
+            first = self.requests.get()
+            if first is None:
+                return
+
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self.requests.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            self._process(batch)
+            if stopping:
+                return
+
+    def _process(self, batch: List[Tuple[List[int], bool, Future]]):
+        """Generate a batch and resolve its futures."""
+        try:
+            outputs = self.assistant.generate_batch([input_ids for input_ids, _, _ in batch],
+                                                    [stop for _, stop, _ in batch])
+        except Exception as e:
+            self.logger.error(f"Batch generation failed: {e}")
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for (_, _, future), output in zip(batch, outputs):
+            future.set_result(output)
+
+
+class ChatService:
+    """Per-session chat on top of a shared assistant and batcher."""
+
+    def __init__(self, assistant: MiniGPTAssistant, batcher: DynamicBatcher):
+        """Initialize the service; sessions live in the assistant's session manager."""
+        self.assistant = assistant
+        self.batcher = batcher
+        self.sessions = assistant.sessions
+
+    def chat(self, message: str, session_id: Optional[str] = None) -> Dict:
+        """Answer a message within a session, creating the session if needed."""
+        session_id = session_id or uuid.uuid4().hex
+        session = self.sessions.get(session_id)
+
+        # Requests of one session are answered in order so its history stays consistent
+        with session.lock, self.assistant.metrics.request(kind="server_chat", session_id=session_id) as request:
+            search_results = None
+            if config.ALLOW_INTERNET and self.assistant.web_search and self.assistant.should_search_web(message):
+                with request.stage('search'):
+                    search_results = self.assistant.web_search.search(message)
+
+            with request.stage('retrieve'):
+                relevant = self.assistant.recall(session, message)
+            with request.stage('context'):
+                input_ids = self.assistant.context_builder.build(session.history, message, search_results, relevant)
+            request.prompt_tokens = len(input_ids)
+
+            cache_key = self.assistant.response_key(input_ids, batched=True)
+            response = self.assistant.cached_response(cache_key, request)
+            if response is None:
+                # Includes the time spent waiting for the batch to fill
+                with request.stage('generate'):
+                    output = self.batcher.submit(input_ids, stop_when_cleaned=True).result()
+                with request.stage('clean'):
+                    response = clean_text(output)
+                self.assistant.cache_response(cache_key, response)
+            exchange = self.assistant.make_exchange(message, response)
+            self.sessions.add_exchange(session, exchange)
+            self.assistant.remember(session, [exchange])
+        self.assistant.log_exchange(session_id, exchange)
+
+        return {'session_id': session_id, 'response': response}
+
+    def complete(self, prompt: str) -> Dict:
+        """Continue a raw prompt without any history or cleaning."""
+        budget = self.assistant.context_builder.budget
+        with self.assistant.metrics.request(kind="server_completion") as request:
+            input_ids = self.assistant.context_builder.encode(prompt)[-budget:]
+            request.prompt_tokens = len(input_ids)
+            cache_key = self.assistant.response_key(input_ids, kind="completion", batched=True)
+            completion = self.assistant.cached_response(cache_key, request)
+            if completion is None:
+                with request.stage('generate'):
+                    completion = self.batcher.submit(input_ids).result()
+                self.assistant.cache_response(cache_key, completion)
+        return {'completion': completion}
+
+    def clear_session(self, session_id: str) -> bool:
+        """Forget a session; returns False if it did not exist."""
+        return self.sessions.remove(session_id)
+
+    def health(self) -> Dict:
+        return {'status': 'ok', 'model': config.MODEL_NAME}
+
+    def metrics_text(self) -> str:
+        return self.assistant.metrics.to_prometheus()
+
+    def close(self):
+        self.batcher.stop()
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """JSON request handler for the chat service."""
+
+    server_version = "MiniGPTServer/1.0"
+
+    @property
+    def service(self) -> ChatService:
+        return self.server.service
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, self.service.health())
+        elif self.path == '/metrics':
+            data = self.service.metrics_text().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def do_POST(self):
+        body = self._read_json()
+        if body is None:
+            return
+
+        try:
+            if self.path == '/v1/chat':
+                message = body.get('message')
+                if not isinstance(message, str) or not message.strip():
+                    self._send_json(400, {'error': "'message' must be a non-empty string"})
+                    return
+                self._send_json(200, self.service.chat(message.strip(), body.get('session_id')))
+            elif self.path == '/v1/completions':
+                prompt = body.get('prompt')
+                if not isinstance(prompt, str) or not prompt:
+                    self._send_json(400, {'error': "'prompt' must be a non-empty string"})
+                    return
+                self._send_json(200, self.service.complete(prompt))
+            else:
+                self._send_json(404, {'error': 'Not found'})
+        except Exception as e:
+            self.server.logger.error(f"Request to {self.path} failed: {e}")
+            self._send_json(500, {'error': str(e)})
+
+    def do_DELETE(self):
+        prefix = '/v1/sessions/'
+        if self.path.startswith(prefix) and len(self.path) > len(prefix):
+            cleared = self.service.clear_session(self.path[len(prefix):])
+            self._send_json(200 if cleared else 404, {'cleared': cleared})
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def _read_json(self) -> Optional[Dict]:
+        """Read the JSON request body, answering 400 if it is invalid."""
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            body = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(body, dict):
+                raise ValueError("expected a JSON object")
+            return body
+        except (ValueError, json.JSONDecodeError) as e:
+            self._send_json(400, {'error': f"Invalid JSON body: {e}"})
+            return None
+
+    def _send_json(self, status: int, payload: Dict):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        self.server.logger.info(format % args)
+
+
+def create_server(assistant: MiniGPTAssistant, host: str, port: int, max_batch_size: int, max_wait: float,
+                  workers: int = 1, threads_per_worker: Optional[int] = None) -> ThreadingHTTPServer:
+    """
+    Create the HTTP server; call serve_forever() on the result to start it.
+
+    With more than one worker, requests are answered by forked worker
+    processes sharing the assistant's weights instead of by this process.
+    """
+    server = ThreadingHTTPServer((host, port), RequestHandler)
+    server.daemon_threads = True
+    server.logger = logging.getLogger('MiniGPTServer')
+    if workers > 1:
+        from worker_pool import PooledChatService, WorkerPool
+
+        server.service = PooledChatService(WorkerPool(assistant, workers, threads_per_worker, max_batch_size, max_wait))
+    else:
+        server.service = ChatService(assistant, DynamicBatcher(assistant, max_batch_size, max_wait))
+    return server
+
+
+def main():
+    """Server entry point."""
+    parser = argparse.ArgumentParser(description="Serve the Mini GPT Assistant over HTTP")
+    parser.add_argument('--host', default=config.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=config.SERVER_PORT)
+    tuning = load_tuning_profile(config.TUNING_PROFILE_PATH, config.MODEL_NAME) or {}
+    parser.add_argument('--batch-size', type=int, default=tuning.get('batch_size', config.BATCH_MAX_SIZE))
+    parser.add_argument('--max-wait-ms', type=float, default=config.BATCH_MAX_WAIT_MS)
+    parser.add_argument('--workers', type=int, default=config.SERVER_WORKERS)
+    parser.add_argument('--threads-per-worker', type=int, default=config.WORKER_THREADS)
+    args = parser.parse_args()
+
+    try:
+        assistant = MiniGPTAssistant()
+        server = create_server(assistant, args.host, args.port, args.batch_size, args.max_wait_ms / 1000,
+                               args.workers, args.threads_per_worker)
+    except Exception as e:
+        print(f"{Fore.RED}Failed to start server: {e}{Style.RESET_ALL}")
+        sys.exit(1)
+
+    workers = f", {args.workers} worker processes" if args.workers > 1 else ""
+    print(f"{Fore.GREEN}Serving on http://{args.host}:{args.port} "
+          f"(batch size {args.batch_size}, max wait {args.max_wait_ms:g}ms{workers}){Style.RESET_ALL}")
+    print(f"{Fore.WHITE}Press Ctrl+C to stop.{Style.RESET_ALL}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"\n{Fore.YELLOW}Server stopped.{Style.RESET_ALL}")
+    finally:
+        server.server_close()
+        server.service.close()
+
+
+if __name__ == "__main__":
+    main()
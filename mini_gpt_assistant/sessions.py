@@ -0,0 +1,225 @@
+"""
+Conversation sessions for the Mini GPT Assistant.
+
+Each session keeps its exchanges as compact slotted records in a ring buffer
+holding at most MAX_CONVERSATION_HISTORY exchanges. The session manager holds
+many independent sessions and, when their combined memory exceeds a global
+limit, evicts the least recently used ones together with their caches. With
+a conversation store, exchanges are also saved durably and an evicted or
+earlier session is paged back in when it is used again.
+"""
+
+import sys
+import time
+import threading
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Callable, Deque, Iterable, List, Optional
+
+# Approximate size of an Exchange object and its slots, excluding the text and tokens
+EXCHANGE_OVERHEAD = 120
+
+
+class Exchange:
+    """One user message and the assistant's reply, with the reply's prompt token IDs."""
+
+    __slots__ = ('user', 'assistant', 'timestamp', 'token_ids')
+
+    def __init__(self, user: str, assistant: str, token_ids: Iterable[int], timestamp: Optional[float] = None):
+        self.user = user
+        self.assistant = assistant
+        self.timestamp = time.time() if timestamp is None else timestamp
+        # 4 bytes per token instead of a pointer per int in a list
+        self.token_ids = array('I', token_ids)
+
+    @property
+    def time(self) -> str:
+        """The exchange time as an ISO string."""
+        return datetime.fromtimestamp(self.timestamp).isoformat()
+
+    def memory_bytes(self) -> int:
+        """Approximate memory held by this exchange."""
+        return (EXCHANGE_OVERHEAD + sys.getsizeof(self.user) + sys.getsizeof(self.assistant)
+                + self.token_ids.itemsize * len(self.token_ids))
+
+
+class Session:
+    """A conversation: bounded history plus any caches that belong to it."""
+
+    __slots__ = ('session_id', 'history', 'lock', 'last_used', 'caches', 'history_bytes', 'memory', 'counted_bytes')
+
+    def __init__(self, session_id: str, max_history: Optional[int]):
+        """
+        Args:
+            session_id: Identifier of the session
+            max_history: Exchanges kept; older ones are dropped (None = unbounded)
+        """
+        self.session_id = session_id
+        self.history: Deque[Exchange] = deque(maxlen=max_history)
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+        # Objects with clear() and memory_bytes(), such as a PrefixCache
+        self.caches: List = []
+        self.history_bytes = 0
+        # Optional RetrievalMemory of past exchanges, also listed in caches
+        self.memory = None
+        # Memory the session manager last counted for this session
+        self.counted_bytes = 0
+
+    def add(self, exchange: Exchange):
+        """Append an exchange, dropping the oldest one when the buffer is full."""
+        if self.history.maxlen is not None and len(self.history) == self.history.maxlen:
+            self.history_bytes -= self.history[0].memory_bytes()
+        self.history.append(exchange)
+        self.history_bytes += exchange.memory_bytes()
+
+    def clear(self):
+        """Forget the history and drop the session's caches."""
+        self.history.clear()
+        self.history_bytes = 0
+        for cache in self.caches:
+            cache.clear()
+
+    def memory_bytes(self) -> int:
+        return self.history_bytes + sum(cache.memory_bytes() for cache in self.caches)
+
+
+class SessionManager:
+    """Holds sessions and evicts the least recently used ones over a memory limit."""
+
+    def __init__(self, max_history: Optional[int], memory_limit_bytes: Optional[int] = None,
+                 max_sessions: Optional[int] = None, store=None, memory_factory: Optional[Callable] = None):
+        """
+        Args:
+            max_history: Exchanges kept per session
+            memory_limit_bytes: Combined memory of all sessions before eviction starts (None = no limit)
+            max_sessions: Number of sessions before eviction starts (None = no limit)
+            store: Optional ConversationStore that exchanges are saved to and loaded from
+            memory_factory: Optional callable creating each new session's retrieval memory
+        """
+        self.max_history = max_history
+        self.memory_limit_bytes = memory_limit_bytes
+        self.max_sessions = max_sessions
+        self.store = store
+        self.memory_factory = memory_factory
+        self.sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.evictions = 0
+        # Sum of the sessions' counted_bytes, so eviction does not have to visit every session
+        self.total_bytes = 0
+
+    def get(self, session_id: str, create: bool = True) -> Optional[Session]:
+        """Return a session, marking it as recently used and creating it if needed."""
+        with self.lock:
+            session = self._touch(session_id)
+        if session is None:
+            if not create:
+                return None
+            # Only the window the ring buffer can hold is paged back in, without
+            # holding the lock so lookups of other sessions do not wait on the disk
+            recent = self.store.load_recent(session_id, self.max_history) if self.store is not None else []
+            with self.lock:
+                # Another thread may have created the session meanwhile
+                session = self._touch(session_id) or self._create(session_id, recent)
+        self.evict(keep=session_id)
+        return session
+
+    def _touch(self, session_id: str) -> Optional[Session]:
+        """Mark a held session as recently used; the lock must be held."""
+        session = self.sessions.get(session_id)
+        if session is not None:
+            self.sessions.move_to_end(session_id)
+            session.last_used = time.monotonic()
+        return session
+
+    def _create(self, session_id: str, exchanges: List[Exchange]) -> Session:
+        """Add a new session holding exchanges; the lock must be held."""
+        session = self.sessions[session_id] = Session(session_id, self.max_history)
+        if self.memory_factory is not None:
+            session.memory = self.memory_factory()
+            session.caches.append(session.memory)
+        for exchange in exchanges:
+            session.add(exchange)
+        session.counted_bytes = session.memory_bytes()
+        self.total_bytes += session.counted_bytes
+        return session
+
+    def refresh(self, session: Session):
+        """Recount a session's memory after its history or caches changed."""
+        memory = session.memory_bytes()
+        with self.lock:
+            # An evicted or removed session no longer counts
+            if self.sessions.get(session.session_id) is session:
+                self.total_bytes += memory - session.counted_bytes
+                session.counted_bytes = memory
+
+    def add_exchange(self, session: Session, exchange: Exchange):
+        """Add an exchange to a session and evict other sessions if memory runs over."""
+        session.add(exchange)
+        if self.store is not None:
+            self.store.append(session.session_id, exchange)
+        self.refresh(session)
+        self.evict(keep=session.session_id)
+
+    def clear(self, session: Session):
+        """Clear a session's history, including its saved exchanges."""
+        session.clear()
+        self.refresh(session)
+        if self.store is not None:
+            self.store.delete_session(session.session_id)
+
+    def remove(self, session_id: str) -> bool:
+        """Forget a session and its saved exchanges; returns False if it did not exist."""
+        with self.lock:
+            session = self.sessions.pop(session_id, None)
+            if session is not None:
+                self.total_bytes -= session.counted_bytes
+        stored = self.store is not None and self.store.count(session_id) > 0
+        if session is None and not stored:
+            return False
+        if session is not None:
+            session.clear()
+        if stored:
+            self.store.delete_session(session_id)
+        return True
+
+    def memory_bytes(self) -> int:
+        """Combined memory of all sessions, as last counted."""
+        return self.total_bytes
+
+    def _over_limit(self, count: int, memory: int) -> bool:
+        if self.max_sessions is not None and count > self.max_sessions:
+            return True
+        return self.memory_limit_bytes is not None and memory > self.memory_limit_bytes
+
+    def evict(self, keep: Optional[str] = None) -> List[str]:
+        """
+        Evict least recently used sessions until the limits are met.
+
+        Sessions that are answering a request right now, and the session
+        named by keep, are never evicted.
+        """
+        evicted = []
+        with self.lock:
+            count = len(self.sessions)
+            if not self._over_limit(count, self.total_bytes):
+                return evicted
+            for session in list(self.sessions.values()):
+                if not self._over_limit(count, self.total_bytes):
+                    break
+                if session.session_id == keep or session.lock.locked():
+                    continue
+                del self.sessions[session.session_id]
+                count -= 1
+                self.total_bytes -= session.counted_bytes
+                session.clear()
+                evicted.append(session.session_id)
+            self.evictions += len(evicted)
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self.sessions
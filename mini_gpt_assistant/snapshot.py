@@ -0,0 +1,183 @@
+"""
+Local model snapshots for offline, memory-mapped loading.
+
+A snapshot is a directory holding the tokenizer (tokenizer.json), the model
+config and the weights as a single safetensors file already cast to the
+target dtype, plus a manifest naming the model it was exported from.
+
+Loading a snapshot memory-maps the weights file instead of reading it into
+freshly allocated tensors, so start-up does not copy the weights and several
+processes on the same host share them through the page cache.
+"""
+
+import os
+import json
+import mmap
+import time
+from datetime import datetime
+from typing import Dict, Optional
+
+MANIFEST_FILE = "snapshot.json"
+WEIGHTS_FILE = "model.safetensors"
+
+# safetensors dtype names
+SAFETENSORS_DTYPES = {
+    'F64': 'float64',
+    'F32': 'float32',
+    'F16': 'float16',
+    'BF16': 'bfloat16',
+    'I64': 'int64',
+    'I32': 'int32',
+    'I16': 'int16',
+    'I8': 'int8',
+    'U8': 'uint8',
+    'BOOL': 'bool',
+}
+
+
+def read_manifest(snapshot_dir: str) -> Optional[Dict]:
+    """Read a snapshot's manifest, or None if the directory holds no snapshot."""
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST_FILE), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def find_snapshot(snapshot_dir: Optional[str], model_name: str) -> Optional[Dict]:
+    """Return the manifest of a usable snapshot of model_name, if there is one."""
+    if not snapshot_dir:
+        return None
+
+    manifest = read_manifest(snapshot_dir)
+    if not manifest or manifest.get('model_name') != model_name:
+        return None
+    if not os.path.exists(os.path.join(snapshot_dir, WEIGHTS_FILE)):
+        return None
+    return manifest
+
+
+def export_snapshot(model_name: str, snapshot_dir: str, dtype_name: str) -> Dict:
+    """
+    Export a model and its tokenizer into a snapshot directory.
+
+    Args:
+        model_name: Hugging Face model name or local path
+        snapshot_dir: Directory to write the snapshot to
+        dtype_name: Name of the torch dtype to store the weights in
+
+    Returns:
+        The snapshot manifest
+    """
+    import torch
+    import transformers
+    from transformers import AutoTokenizer, AutoModelForCausalLM
+
+    torch_dtype = getattr(torch, dtype_name)
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    if not tokenizer.is_fast:
+        raise ValueError(f"{model_name} has no fast tokenizer, so no tokenizer.json can be exported")
+
+    model = AutoModelForCausalLM.from_pretrained(model_name, torch_dtype=torch_dtype, low_cpu_mem_usage=True)
+
+    os.makedirs(snapshot_dir, exist_ok=True)
+    tokenizer.save_pretrained(snapshot_dir)
+    model.save_pretrained(snapshot_dir, safe_serialization=True, max_shard_size="1000GB")
+
+    manifest = {
+        'model_name': model_name,
+        'dtype': dtype_name,
+        'transformers_version': transformers.__version__,
+        'created': datetime.now().isoformat(),
+    }
+    with open(os.path.join(snapshot_dir, MANIFEST_FILE), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def mmap_safetensors(path: str) -> Dict:
+    """
+    Map a safetensors file into memory and return tensors backed by the mapping.
+
+    The mapping is copy-on-write: pages are shared with the page cache until
+    a tensor is modified in place.
+    """
+    import torch
+
+    with open(path, 'rb') as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    header_size = int.from_bytes(buffer[:8], 'little')
+    header = json.loads(buffer[8:8 + header_size])
+    data_start = 8 + header_size
+
+    tensors = {}
+    for name, info in header.items():
+        if name == '__metadata__':
+            continue
+        dtype = getattr(torch, SAFETENSORS_DTYPES[info['dtype']])
+        start, end = info['data_offsets']
+        if end == start:
+            tensors[name] = torch.empty(info['shape'], dtype=dtype)
+            continue
+        flat = torch.frombuffer(buffer, dtype=dtype, count=(end - start) // dtype.itemsize,
+                                offset=data_start + start)
+        tensors[name] = flat.view(info['shape'])
+    return tensors
+
+
+def load_snapshot_model(snapshot_dir: str):
+    """Build the model from a snapshot with its weights memory-mapped."""
+    import torch
+    from transformers import AutoConfig, AutoModelForCausalLM
+    from transformers.modeling_utils import no_init_weights
+
+    manifest = read_manifest(snapshot_dir) or {}
+    torch_dtype = getattr(torch, manifest.get('dtype', 'float32'))
+    model_config = AutoConfig.from_pretrained(snapshot_dir, local_files_only=True)
+
+    # Skip random initialization; every parameter is replaced by a mapped tensor below
+    with no_init_weights():
+        model = AutoModelForCausalLM.from_config(model_config, torch_dtype=torch_dtype)
+
+    state_dict = mmap_safetensors(os.path.join(snapshot_dir, WEIGHTS_FILE))
+    missing, unexpected = model.load_state_dict(state_dict, strict=False, assign=True)
+    model.tie_weights()
+
+    # Tied weights are stored once, so they legitimately appear as missing
+    tied = set(getattr(model, '_tied_weights_keys', None) or [])
+    missing = [key for key in missing if key not in tied]
+    if missing or unexpected:
+        raise ValueError(f"Snapshot does not match the model (missing: {missing[:5]}, unexpected: {unexpected[:5]})")
+
+    model.eval()
+    return model
+
+
+def main():
+    """Export the configured model into the local snapshot directory."""
+    import argparse
+    from colorama import Fore, Style
+
+    import config
+
+    parser = argparse.ArgumentParser(description="Prepare an offline snapshot of the configured model")
+    parser.add_argument('--model', default=config.MODEL_NAME, help="Model to export (default: config.MODEL_NAME)")
+    parser.add_argument('--output', default=config.MODEL_SNAPSHOT_DIR, help="Snapshot directory")
+    parser.add_argument('--dtype', default=config.SNAPSHOT_DTYPE,
+                        choices=['float32', 'float16', 'bfloat16'], help="dtype to store the weights in")
+    args = parser.parse_args()
+
+    print(f"{Fore.YELLOW}Exporting {args.model} to {args.output} as {args.dtype}...{Style.RESET_ALL}")
+    start_time = time.perf_counter()
+    try:
+        export_snapshot(args.model, args.output, args.dtype)
+    except Exception as e:
+        print(f"{Fore.RED}Failed to prepare snapshot: {e}{Style.RESET_ALL}")
+        raise SystemExit(1)
+    print(f"{Fore.GREEN}Snapshot ready in {time.perf_counter() - start_time:.1f}s. "
+          f"The assistant will now load it offline.{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()
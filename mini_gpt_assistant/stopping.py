@@ -0,0 +1,72 @@
+"""
+Stopping criteria used during generation.
+
+This module imports transformers, so it is only imported once generation
+is about to run.
+"""
+
+import threading
+from typing import List, Optional
+
+import torch
+from transformers import StoppingCriteria
+
+from response_cleaner import ResponseCleaner, MAX_RESPONSE_CHARS
+
+
+class StopOnEvent(StoppingCriteria):
+    """Stopping criteria that ends generation once an event is set."""
+
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+
+class StopWhenCleaned(StoppingCriteria):
+    """
+    Stopping criteria that ends each sequence once the response cleaner is done.
+
+    The generated tokens are decoded and fed to a ResponseCleaner per
+    sequence, so decoding stops at exactly the turn marker, repetition loop
+    or length limit where clean_response would cut the text anyway.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int, max_chars: int = MAX_RESPONSE_CHARS,
+                 rows: Optional[List[bool]] = None):
+        """
+        Args:
+            tokenizer: Tokenizer used to decode the generated tokens
+            prompt_length: Length of the (padded) prompt in input_ids
+            max_chars: Character budget of the cleaned response
+            rows: Which sequences of a batch the rules apply to (default: all)
+        """
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.max_chars = max_chars
+        self.rows = rows
+        self.cleaners: List[ResponseCleaner] = []
+        self.fed: List[str] = []
+
+    @property
+    def stopped(self) -> int:
+        """Number of sequences stopped by the cleaner rules."""
+        return sum(cleaner.done for cleaner in self.cleaners)
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if not self.cleaners:
+            self.cleaners = [ResponseCleaner(self.max_chars) for _ in range(input_ids.shape[0])]
+            self.fed = [""] * input_ids.shape[0]
+
+        for row, cleaner in enumerate(self.cleaners):
+            if cleaner.done or (self.rows is not None and not self.rows[row]):
+                continue
+            text = self.tokenizer.decode(input_ids[row, self.prompt_length:], skip_special_tokens=True)
+            # Wait until a multi-byte character is complete
+            if text.endswith("�"):
+                continue
+            cleaner.feed(text[len(self.fed[row]):])
+            self.fed[row] = text
+
+        return torch.tensor([cleaner.done for cleaner in self.cleaners], dtype=torch.bool, device=input_ids.device)
@@ -0,0 +1,53 @@
+from context_builder import ContextBuilder
+from sessions import Exchange
+
+
+class CharTokenizer:
+    """One token per character, so prompts decode exactly."""
+
+    model_max_length = 1024
+
+    def __call__(self, text, add_special_tokens=True):
+        return {'input_ids': [ord(char) for char in text]}
+
+    def decode(self, token_ids):
+        return ''.join(chr(token_id) for token_id in token_ids)
+
+
+def make_builder(budget=1000, max_exchanges=3):
+    return ContextBuilder(CharTokenizer(), budget, max_exchanges)
+
+
+def make_exchange(builder, user, assistant, timestamp):
+    return Exchange(user, assistant, builder.encode_exchange(user, assistant), timestamp)
+
+
+def test_prompt_ends_with_turn_marker_after_search_results():
+    builder = make_builder()
+    history = [make_exchange(builder, "hi", "hello", 1.0)]
+
+    prompt = builder.tokenizer.decode(builder.build(history, "weather?", search_results="sunny"))
+
+    assert prompt.endswith("Web search results: sunny\n\nHuman: weather?\nAssistant:")
+    assert prompt.index("Human: hi\nAssistant: hello\n") < prompt.index("Web search results:")
+
+
+def test_search_results_are_truncated_to_the_budget():
+    builder = make_builder()
+    budget = len(builder.system_ids) + len("Human: q\nAssistant:") + 10
+    builder.budget = budget
+
+    input_ids = builder.build([], "q", search_results="x" * 100)
+
+    assert len(input_ids) == budget
+    assert builder.tokenizer.decode(input_ids).endswith("Human: q\nAssistant:")
+
+
+def test_oldest_exchanges_are_dropped_and_order_is_kept():
+    builder = make_builder(max_exchanges=2)
+    history = [make_exchange(builder, f"q{i}", f"a{i}", float(i)) for i in range(3)]
+
+    prompt = builder.tokenizer.decode(builder.build(history, "next"))
+
+    assert "q0" not in prompt
+    assert prompt.index("q1") < prompt.index("q2") < prompt.index("Human: next")
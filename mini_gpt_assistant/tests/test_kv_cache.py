@@ -0,0 +1,63 @@
+import torch
+from transformers import DynamicCache
+
+from kv_cache import PrefixCache
+
+
+def make_cache(length, layers=2):
+    cache = DynamicCache()
+    for layer in range(layers):
+        states = torch.zeros(1, 2, length, 4)
+        cache.update(states, states.clone(), layer)
+    return cache
+
+
+def test_miss_when_empty():
+    prefix_cache = PrefixCache()
+    assert prefix_cache.take([1, 2, 3]) == (None, 0)
+    assert prefix_cache.misses == 1
+
+
+def test_longest_common_prefix_is_reused():
+    prefix_cache = PrefixCache()
+    prefix_cache.store([1, 2, 3, 4, 5], make_cache(5))
+
+    cache, reused = prefix_cache.take([1, 2, 3, 9, 9, 9])
+
+    assert reused == 3
+    assert cache.get_seq_length() == 3
+    assert prefix_cache.hits == 1
+    assert prefix_cache.reused_tokens == 3
+
+
+def test_one_prompt_token_is_left_to_prefill():
+    prefix_cache = PrefixCache()
+    prefix_cache.store([1, 2, 3], make_cache(3))
+
+    cache, reused = prefix_cache.take([1, 2, 3])
+
+    assert reused == 2
+    assert cache.get_seq_length() == 2
+
+
+def test_taken_cache_is_not_shared():
+    prefix_cache = PrefixCache()
+    prefix_cache.store([1, 2, 3], make_cache(3))
+
+    prefix_cache.take([1, 2, 3, 4])
+
+    assert prefix_cache.take([1, 2, 3, 4]) == (None, 0)
+    assert prefix_cache.cached_tokens == 0
+
+
+def test_store_crops_to_the_stored_tokens_and_reports_memory():
+    prefix_cache = PrefixCache()
+    prefix_cache.store([1, 2, 3], make_cache(5))
+
+    assert prefix_cache.cache.get_seq_length() == 3
+    # Two layers of key and value states, each 1 x 2 x 3 x 4 float32 values
+    assert prefix_cache.memory_bytes() == 2 * 2 * 24 * 4
+
+    prefix_cache.clear()
+    assert prefix_cache.memory_bytes() == 0
+    assert prefix_cache.cached_tokens == 0
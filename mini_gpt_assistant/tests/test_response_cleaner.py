@@ -0,0 +1,61 @@
+from response_cleaner import EMPTY_RESPONSE, FALLBACK_RESPONSE, ResponseCleaner, clean_text
+
+
+def stream(text, max_chars=300, chunk_size=3):
+    """Feed text in small chunks, the way decoded tokens arrive, and return what was shown."""
+    cleaner = ResponseCleaner(max_chars=max_chars)
+    shown = ""
+    for start in range(0, len(text), chunk_size):
+        shown += cleaner.feed(text[start:start + chunk_size])
+    shown += cleaner.finish()
+    return shown, cleaner
+
+
+def test_stops_at_the_next_turn():
+    text = "Paris is the capital of France.\nHuman: and Spain?\nAssistant: Madrid."
+    assert clean_text(text) == "Paris is the capital of France."
+    assert stream(text)[0] == "Paris is the capital of France."
+
+
+def test_inline_markers_are_removed():
+    assert clean_text("Sure Assistant: thing to do") == "Sure thing to do"
+
+
+def test_junk_lines_are_dropped():
+    text = "Professor: Dr. Dr. Smith\nThe answer is four."
+    assert clean_text(text) == "The answer is four."
+    assert stream(text)[0] == "The answer is four."
+
+
+def test_repetition_loop_is_cut():
+    text = "I like cats I like cats I like cats I like cats"
+    assert clean_text(text) == "I like cats"
+    assert stream(text)[0] == "I like cats"
+
+
+def test_empty_and_tiny_responses_fall_back():
+    assert clean_text("") == EMPTY_RESPONSE
+    assert clean_text("ok") == FALLBACK_RESPONSE
+    assert stream("")[0] == EMPTY_RESPONSE
+    # Text already shown is kept rather than replaced
+    assert stream("ok")[0] == "ok"
+
+
+def test_complete_response_is_cut_to_its_last_sentence():
+    text = "First sentence here. Second sentence here. " + " ".join(f"word{i}" for i in range(100))
+    assert clean_text(text, max_chars=60) == "First sentence here. Second sentence here."
+    assert clean_text("x" * 50, max_chars=10) == "x" * 10 + "..."
+
+
+def test_streamed_response_is_cut_at_a_word():
+    text = "one two three four five six seven eight nine ten"
+    shown, cleaner = stream(text, max_chars=20)
+    assert shown == "one two three four..."
+    assert cleaner.result == shown
+    assert cleaner.done
+
+
+def test_streaming_matches_whole_text_under_the_limit():
+    text = "Hello there.\nThe weather is nice today, with a light breeze.\n\nEnjoy it!"
+    for chunk_size in (1, 2, 5, len(text)):
+        assert stream(text, chunk_size=chunk_size)[0] == clean_text(text)
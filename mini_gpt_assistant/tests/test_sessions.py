@@ -0,0 +1,89 @@
+from sessions import Exchange, Session, SessionManager
+
+
+def exchange(text="hello", timestamp=None):
+    return Exchange(text, text, [1, 2, 3], timestamp)
+
+
+class FakeCache:
+    def __init__(self, size):
+        self.size = size
+
+    def clear(self):
+        self.size = 0
+
+    def memory_bytes(self):
+        return self.size
+
+
+def test_ring_buffer_keeps_history_bytes():
+    session = Session("a", max_history=2)
+    exchanges = [exchange(f"message {i}") for i in range(3)]
+    for item in exchanges:
+        session.add(item)
+
+    assert list(session.history) == exchanges[1:]
+    assert session.history_bytes == sum(item.memory_bytes() for item in exchanges[1:])
+
+    session.clear()
+    assert session.history_bytes == 0
+
+
+def test_least_recently_used_session_is_evicted_over_the_count_limit():
+    manager = SessionManager(max_history=5, max_sessions=2)
+    manager.get("a")
+    manager.get("b")
+    manager.get("a")
+    manager.get("c")
+
+    assert "b" not in manager
+    assert "a" in manager and "c" in manager
+    assert manager.evictions == 1
+
+
+def test_eviction_over_the_memory_limit_clears_caches():
+    size = exchange().memory_bytes()
+    manager = SessionManager(max_history=5, memory_limit_bytes=3 * size)
+    old = manager.get("old")
+    cache = FakeCache(size)
+    old.caches.append(cache)
+    manager.add_exchange(old, exchange())
+
+    new = manager.get("new")
+    manager.add_exchange(new, exchange())
+    assert "old" in manager
+
+    manager.add_exchange(new, exchange())
+    assert "old" not in manager
+    assert cache.size == 0
+    assert manager.memory_bytes() == new.memory_bytes()
+
+
+def test_busy_and_kept_sessions_are_not_evicted():
+    manager = SessionManager(max_history=5, max_sessions=1)
+    busy = manager.get("busy")
+    with busy.lock:
+        manager.get("other")
+        assert "busy" in manager and "other" in manager
+    assert manager.evict(keep="other") == ["busy"]
+
+
+def test_running_total_follows_changes():
+    manager = SessionManager(max_history=2)
+    session = manager.get("a")
+    cache = FakeCache(100)
+    session.caches.append(cache)
+    for i in range(3):
+        manager.add_exchange(session, exchange(f"message {i}"))
+    assert manager.memory_bytes() == session.memory_bytes()
+
+    cache.size = 500
+    manager.refresh(session)
+    assert manager.memory_bytes() == session.memory_bytes()
+
+    manager.clear(session)
+    assert manager.memory_bytes() == 0
+
+    manager.add_exchange(session, exchange())
+    manager.remove("a")
+    assert manager.memory_bytes() == 0
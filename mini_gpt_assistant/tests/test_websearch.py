@@ -0,0 +1,149 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import config
+from tools.websearch import SearchCache, WebSearchTool
+
+
+class SearchHandler(BaseHTTPRequestHandler):
+    """Serves the behaviour configured for a path on the test server."""
+
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        self.server.requests[path] = self.server.requests.get(path, 0) + 1
+        self.server.routes[path](self, self.server.requests[path])
+
+    def send_body(self, body: bytes, status: int = 200):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), SearchHandler)
+    httpd.daemon_threads = True
+    httpd.routes = {}
+    httpd.requests = {}
+    httpd.release = threading.Event()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.release.set()
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def make_tool(server, timeout=5.0):
+    return WebSearchTool(api_url=f"{server.url}/api", scrape_url=f"{server.url}/html",
+                         timeout=timeout, cache=SearchCache())
+
+
+def answer(text):
+    return lambda handler, count: handler.send_body(json.dumps({'AbstractText': text}).encode())
+
+
+def page(text):
+    return lambda handler, count: handler.send_body(text.encode())
+
+
+def not_found(handler, count):
+    handler.send_body(b'', status=404)
+
+
+def hang(handler, count):
+    handler.server.release.wait(30)
+
+
+def trickle(handler, count):
+    """Send headers and then the body a byte at a time until released."""
+    handler.send_response(200)
+    handler.send_header('Content-Length', '1000')
+    handler.end_headers()
+    while not handler.server.release.wait(0.05):
+        try:
+            handler.wfile.write(b'x')
+            handler.wfile.flush()
+        except OSError:
+            return
+
+
+def test_instant_answer_is_preferred_and_cached(server):
+    server.routes = {'/api': answer("Paris"), '/html': page("<html>results</html>")}
+    tool = make_tool(server)
+    try:
+        assert tool.search("capital of France") == "Search result: Paris"
+        assert tool.search("Capital of France?") == "Search result: Paris"
+        assert server.requests['/api'] == 1
+    finally:
+        tool.close()
+
+
+def test_fallback_provider_answers_when_the_api_has_nothing(server):
+    server.routes = {'/api': not_found, '/html': page("<html>results</html>")}
+    tool = make_tool(server)
+    try:
+        assert tool.search("python") == "Found web results for 'python' - search completed successfully."
+    finally:
+        tool.close()
+
+
+def test_server_errors_are_retried(server, monkeypatch):
+    monkeypatch.setattr(config, 'SEARCH_RETRIES', 1)
+
+    def flaky(handler, count):
+        if count == 1:
+            handler.send_body(b'', status=503)
+        else:
+            answer("recovered")(handler, count)
+
+    server.routes = {'/api': flaky, '/html': not_found}
+    tool = make_tool(server)
+    try:
+        assert tool.search("retry me") == "Search result: recovered"
+        assert server.requests['/api'] == 2
+    finally:
+        tool.close()
+
+
+def test_providers_run_in_parallel(server):
+    def slow(route):
+        def handle(handler, count):
+            time.sleep(0.5)
+            route(handler, count)
+        return handle
+
+    server.routes = {'/api': slow(not_found), '/html': slow(page("<html>results</html>"))}
+    tool = make_tool(server)
+    try:
+        start = time.monotonic()
+        assert tool.search("parallel").startswith("Found web results")
+        assert time.monotonic() - start < 0.9
+    finally:
+        tool.close()
+
+
+@pytest.mark.parametrize('route', [hang, trickle])
+def test_search_stops_at_the_deadline(server, route):
+    server.routes = {'/api': route, '/html': route}
+    tool = make_tool(server, timeout=0.5)
+    try:
+        start = time.monotonic()
+        assert tool.search("slow") == "I couldn't find relevant information for that search query."
+        assert time.monotonic() - start < 1.5
+
+        # The abandoned requests give their worker threads back
+        futures = [tool.executor.submit(time.sleep, 0) for _ in range(tool.executor._max_workers)]
+        for future in futures:
+            future.result(timeout=1.5)
+    finally:
+        tool.close()
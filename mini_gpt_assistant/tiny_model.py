@@ -0,0 +1,73 @@
+"""
+Tiny randomly initialized GPT-2 model for offline benchmarks and checks.
+
+The tokenizer is a small byte-level BPE trained on a fixed local corpus, so
+nothing has to be downloaded. The model produces gibberish, but it exercises
+exactly the same code paths as a real GPT-2 checkpoint.
+"""
+
+import os
+from typing import Optional, List
+
+TINY_CORPUS = [
+    "Human: Hello, how are you?\nAssistant: Hello! I'm doing well, thank you for asking. How can I help you today?",
+    "Human: What can you do?\nAssistant: I'm an AI assistant that can help with various tasks like answering "
+    "questions, having conversations, and providing information.",
+    "Human: Tell me about yourself\nAssistant: I'm a local AI assistant running on your computer.",
+    "Human: What model are you using?\nAssistant: I'm running on the distilgpt2 model by default.",
+    "You are a helpful AI assistant. Please provide clear, concise, and helpful responses to the user's questions.",
+    "The weather today is sunny with a light breeze. Python is a popular programming language.",
+]
+
+EOS_TOKEN = "<|endoftext|>"
+
+
+def build_tiny_model(output_dir: str, vocab_size: int = 1000, n_layer: int = 2, n_embd: int = 64,
+                     n_head: int = 2, n_positions: int = 1024, seed: int = 0,
+                     corpus: Optional[List[str]] = None) -> str:
+    """
+    Create a tiny GPT-2 model and tokenizer and save them to output_dir.
+
+    Returns:
+        output_dir, which can be used as a MODEL_NAME
+    """
+    import torch
+    from tokenizers import Tokenizer, models, pre_tokenizers, decoders, trainers
+    from transformers import PreTrainedTokenizerFast, GPT2Config, GPT2LMHeadModel
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.ByteLevel(add_prefix_space=False)
+    tokenizer.decoder = decoders.ByteLevel()
+    trainer = trainers.BpeTrainer(
+        vocab_size=vocab_size,
+        special_tokens=[EOS_TOKEN],
+        initial_alphabet=pre_tokenizers.ByteLevel.alphabet(),
+        show_progress=False
+    )
+    tokenizer.train_from_iterator(corpus or TINY_CORPUS, trainer)
+
+    fast_tokenizer = PreTrainedTokenizerFast(
+        tokenizer_object=tokenizer,
+        bos_token=EOS_TOKEN,
+        eos_token=EOS_TOKEN,
+        unk_token=EOS_TOKEN,
+        model_max_length=n_positions
+    )
+    eos_id = fast_tokenizer.eos_token_id
+
+    torch.manual_seed(seed)
+    model_config = GPT2Config(
+        vocab_size=len(fast_tokenizer),
+        n_positions=n_positions,
+        n_embd=n_embd,
+        n_layer=n_layer,
+        n_head=n_head,
+        bos_token_id=eos_id,
+        eos_token_id=eos_id
+    )
+    model = GPT2LMHeadModel(model_config)
+
+    os.makedirs(output_dir, exist_ok=True)
+    fast_tokenizer.save_pretrained(output_dir)
+    model.save_pretrained(output_dir)
+    return output_dir
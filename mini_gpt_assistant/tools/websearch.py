@@ -2,8 +2,16 @@
 Enhanced web search functionality for the Mini GPT Assistant.
 """
 
+import os
+import re
 import json
+import socket
+import sqlite3
+import threading
+from collections import OrderedDict
 import requests
+from requests.adapters import HTTPAdapter
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from typing import List, Dict, Optional
 import logging
 from urllib.parse import quote_plus
@@ -12,16 +20,236 @@ import time
 import config
 
 
+# Queries about changing facts are cached for a shorter time
+TIME_SENSITIVE_WORDS = {'today', 'now', 'latest', 'current', 'news', 'weather', 'stock', 'price', 'recent'}
+
+# Responses worth another attempt while the search budget lasts
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+# Bytes read at a time from a response body, between deadline checks
+READ_CHUNK_SIZE = 16 * 1024
+
+
+class SearchCall:
+    """
+    The requests of one search, sharing its deadline.
+    
+    Cancelling closes the open responses, so abandoned provider requests stop
+    reading and give their worker thread back instead of running on.
+    """
+    
+    def __init__(self, deadline: float):
+        """Initialize a search that must finish by deadline (time.monotonic())."""
+        self.deadline = deadline
+        self.cancelled = False
+        self.responses: List[requests.Response] = []
+        self.lock = threading.Lock()
+    
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return self.deadline - time.monotonic()
+    
+    def track(self, response: requests.Response) -> bool:
+        """Register an open response; returns False (and closes it) if the search is already over."""
+        with self.lock:
+            if self.cancelled:
+                self._close(response)
+                return False
+            self.responses.append(response)
+            return True
+    
+    def cancel(self):
+        """End the search, closing every response still being read."""
+        with self.lock:
+            self.cancelled = True
+            for response in self.responses:
+                self._close(response)
+            self.responses.clear()
+    
+    @staticmethod
+    def _close(response: requests.Response):
+        """Close a response, interrupting a read blocked on it in another thread."""
+        # Closing alone does not wake a thread blocked in recv(); shutting the socket down does
+        sock = getattr(getattr(response.raw, '_connection', None), 'sock', None)
+        if sock is None:
+            # A connection that closes after the response has already handed its socket to the body reader
+            reader = getattr(getattr(response.raw, '_fp', None), 'fp', None)
+            sock = getattr(getattr(reader, 'raw', None), '_sock', None)
+        if sock is not None:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        response.close()
+
+
+class SearchCache:
+    """Search result cache with per-entry TTL and LRU eviction, backed by SQLite."""
+    
+    def __init__(self, path: Optional[str] = None, max_entries: int = 256, max_disk_entries: int = 5000):
+        """
+        Initialize the search cache.
+        
+        Args:
+            path: SQLite file for results that survive restarts (None = memory only)
+            max_entries: Maximum number of entries kept in memory
+            max_disk_entries: Maximum number of entries kept on disk
+        """
+        self.logger = logging.getLogger('SearchCache')
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self.lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        self.db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+                self.db = sqlite3.connect(path, check_same_thread=False)
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS search_cache ("
+                    "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, last_used REAL NOT NULL)"
+                )
+                self.db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (time.time(),))
+                self.db.commit()
+            except sqlite3.Error as e:
+                self.logger.warning(f"Search cache database unavailable, using memory only: {e}")
+                self.db = None
+    
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Normalize a query so trivially different spellings share an entry."""
+        words = re.sub(r"[^\w\s]", " ", query.lower()).split()
+        return " ".join(words)
+    
+    def get(self, query: str) -> Optional[str]:
+        """Return the cached result for a query, or None."""
+        key = self.normalize(query)
+        now = time.time()
+        
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry and entry[0] > now:
+                self.memory.move_to_end(key)
+                self.memory_hits += 1
+                return entry[1]
+            if entry:
+                del self.memory[key]
+            
+            if self.db is not None:
+                try:
+                    row = self.db.execute(
+                        "SELECT value, expires_at FROM search_cache WHERE key = ? AND expires_at > ?", (key, now)
+                    ).fetchone()
+                    if row:
+                        self.db.execute("UPDATE search_cache SET last_used = ? WHERE key = ?", (now, key))
+                        self.db.commit()
+                        self._remember(key, row[0], row[1])
+                        self.disk_hits += 1
+                        return row[0]
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Search cache read failed: {e}")
+            
+            self.misses += 1
+            return None
+    
+    def put(self, query: str, value: str, ttl: float):
+        """Cache a result for ttl seconds."""
+        key = self.normalize(query)
+        now = time.time()
+        expires_at = now + ttl
+        
+        with self.lock:
+            self._remember(key, value, expires_at)
+            if self.db is not None:
+                try:
+                    self.db.execute(
+                        "INSERT OR REPLACE INTO search_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                        (key, value, expires_at, now)
+                    )
+                    # Drop expired entries and the least recently used ones beyond the limit
+                    self.db.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+                    self.db.execute(
+                        "DELETE FROM search_cache WHERE key IN ("
+                        "SELECT key FROM search_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                        (self.max_disk_entries,)
+                    )
+                    self.db.commit()
+                except sqlite3.Error as e:
+                    self.logger.warning(f"Search cache write failed: {e}")
+    
+    def _remember(self, key: str, value: str, expires_at: float):
+        """Store an entry in memory, evicting the least recently used ones."""
+        self.memory[key] = (expires_at, value)
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+    
+    def ttl_for(self, query: str) -> float:
+        """Time to live for a query's result."""
+        if TIME_SENSITIVE_WORDS.intersection(self.normalize(query).split()):
+            return config.SEARCH_CACHE_FRESH_TTL
+        return config.SEARCH_CACHE_TTL
+    
+    def stats(self) -> Dict[str, int]:
+        """Hit and miss counters."""
+        return {
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'entries': len(self.memory)
+        }
+    
+    def close(self):
+        """Close the database connection."""
+        with self.lock:
+            if self.db is not None:
+                self.db.close()
+                self.db = None
+
+
 class WebSearchTool:
     """Enhanced web search tool using multiple APIs."""
     
-    def __init__(self):
-        """Initialize the web search tool."""
+    def __init__(self, api_url: Optional[str] = None, scrape_url: Optional[str] = None,
+                 timeout: Optional[float] = None, cache: Optional[SearchCache] = None):
+        """
+        Initialize the web search tool.
+        
+        Args:
+            api_url: Instant answer API endpoint (defaults to config.SEARCH_API_URL)
+            scrape_url: HTML search endpoint (defaults to config.SEARCH_SCRAPE_URL)
+            timeout: Overall latency budget in seconds (defaults to config.SEARCH_TIMEOUT)
+            cache: Result cache (defaults to one built from the config settings)
+        """
         self.logger = logging.getLogger('WebSearchTool')
+        self.api_url = api_url or config.SEARCH_API_URL
+        self.scrape_url = scrape_url or config.SEARCH_SCRAPE_URL
+        self.timeout = config.SEARCH_TIMEOUT if timeout is None else timeout
+        
+        self.cache = cache
+        if self.cache is None and config.SEARCH_CACHE:
+            self.cache = SearchCache(config.SEARCH_CACHE_PATH, config.SEARCH_CACHE_SIZE, config.SEARCH_CACHE_DISK_SIZE)
+        
+        # Pooled keep-alive connections; retries are made in _get so they stay within the search budget
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=config.SEARCH_POOL_SIZE, max_retries=0)
+        
         self.session = requests.Session()
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
         })
+        
+        # Providers in order of preference; they are queried in parallel
+        self.providers = [self._search_duckduckgo_instant, self._search_web_scrape]
+        self.executor = ThreadPoolExecutor(
+            max_workers=max(config.SEARCH_POOL_SIZE, len(self.providers)),
+            thread_name_prefix='WebSearch'
+        )
     
     def search(self, query: str) -> Optional[str]:
         """
@@ -29,33 +257,116 @@ class WebSearchTool:
         
         Args:
             query: Search query string
-            
+        
         Returns:
             Formatted search results or None if search fails
         """
         try:
+            if self.cache is not None:
+                results = self.cache.get(query)
+                if results:
+                    self.logger.info(f"Search cache hit for: {query}")
+                    return results
+            
             self.logger.info(f"Searching for: {query}")
             
-            # Try DuckDuckGo Instant Answer API first
-            results = self._search_duckduckgo_instant(query)
+            results = self._search_providers(query)
             if results:
+                if self.cache is not None:
+                    self.cache.put(query, results, self.cache.ttl_for(query))
                 return results
             
-            # Try web scraping approach
-            results = self._search_web_scrape(query)
-            if results:
-                return results
-                
             return "I couldn't find relevant information for that search query."
-            
+        
         except Exception as e:
             self.logger.error(f"Search failed: {e}")
             return f"Search error: {str(e)}"
     
-    def _search_duckduckgo_instant(self, query: str) -> Optional[str]:
+    def close(self):
+        """Release the worker threads, pooled connections and cache."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+        if self.cache is not None:
+            self.cache.close()
+    
+    def _search_providers(self, query: str) -> Optional[str]:
+        """
+        Query all providers in parallel within the latency budget.
+        
+        A result is returned as soon as every more preferred provider has
+        finished without one. When the budget runs out, the best result so far
+        is returned. Either way the requests still running are closed, so
+        they end instead of holding on to worker threads.
+        """
+        call = SearchCall(time.monotonic() + self.timeout)
+        futures = [self.executor.submit(provider, query, call) for provider in self.providers]
+        results: List[Optional[str]] = [None] * len(futures)
+        pending = set(futures)
+        
+        try:
+            while pending:
+                remaining = call.remaining()
+                if remaining <= 0:
+                    self.logger.warning(f"Search budget of {self.timeout}s exhausted for: {query}")
+                    break
+                
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures.index(future)] = future.result()
+                
+                for future, result in zip(futures, results):
+                    if result:
+                        return result
+                    if not future.done():
+                        break  # A more preferred provider may still answer
+            
+            return next((result for result in results if result), None)
+        finally:
+            call.cancel()
+            for future in pending:
+                future.cancel()
+    
+    def _get(self, call: SearchCall, url: str, **kwargs) -> Optional[bytes]:
+        """
+        GET a URL within a search's deadline and return the body of a 200 response.
+        
+        Failed connections and server errors are retried up to SEARCH_RETRIES
+        times, each attempt getting only the time left, and the body is read
+        in chunks so a slow response cannot run past the deadline either.
+        Returns None for other statuses, or once the search is over.
+        """
+        for attempt in range(config.SEARCH_RETRIES + 1):
+            if attempt:
+                time.sleep(min(0.1 * 2 ** (attempt - 1), max(call.remaining(), 0)))
+            remaining = call.remaining()
+            if remaining <= 0 or call.cancelled:
+                return None
+            
+            try:
+                response = self.session.get(url, timeout=remaining, stream=True, **kwargs)
+            except requests.ConnectionError:
+                if attempt == config.SEARCH_RETRIES:
+                    raise
+                continue
+            if not call.track(response):
+                return None
+            
+            with response:
+                if response.status_code in RETRY_STATUSES and attempt < config.SEARCH_RETRIES:
+                    continue
+                if response.status_code != 200:
+                    return None
+                body = bytearray()
+                for chunk in response.iter_content(READ_CHUNK_SIZE):
+                    body += chunk
+                    if call.cancelled or call.remaining() <= 0:
+                        return None
+                return bytes(body)
+        return None
+    
+    def _search_duckduckgo_instant(self, query: str, call: SearchCall) -> Optional[str]:
         """Search using DuckDuckGo Instant Answer API."""
         try:
-            url = "https://api.duckduckgo.com/"
             params = {
                 'q': query,
                 'format': 'json',
@@ -64,9 +375,9 @@ class WebSearchTool:
                 'skip_disambig': '1'
             }
             
-            response = self.session.get(url, params=params, timeout=10)
-            if response.status_code == 200:
-                data = response.json()
+            body = self._get(call, self.api_url, params=params)
+            if body is not None:
+                data = json.loads(body)
                 
                 # Try to get instant answer
                 if data.get('AbstractText'):
@@ -75,31 +386,33 @@ class WebSearchTool:
                 # Try related topics
                 if data.get('RelatedTopics'):
                     topics = []
-                    for topic in data['RelatedTopics'][:3]:
+                    for topic in data['RelatedTopics'][:config.MAX_SEARCH_RESULTS]:
                         if isinstance(topic, dict) and topic.get('Text'):
                             topics.append(topic['Text'])
                     if topics:
                         return f"Search results: {' | '.join(topics)}"
-                        
+        
         except Exception as e:
-            self.logger.warning(f"DuckDuckGo search failed: {e}")
+            if not call.cancelled:
+                self.logger.warning(f"DuckDuckGo search failed: {e}")
         
         return None
     
-    def _search_web_scrape(self, query: str) -> Optional[str]:
+    def _search_web_scrape(self, query: str, call: SearchCall) -> Optional[str]:
         """Fallback web search using HTML scraping."""
         try:
             # Use DuckDuckGo HTML search
-            search_url = f"https://duckduckgo.com/html/?q={quote_plus(query)}"
+            search_url = f"{self.scrape_url}?q={quote_plus(query)}"
             
-            response = self.session.get(search_url, timeout=10)
-            if response.status_code == 200:
+            body = self._get(call, search_url)
+            if body is not None:
                 # Simple text extraction (you could use BeautifulSoup for better parsing)
-                content = response.text
+                content = body.decode('utf-8', errors='replace')
                 if "No results found" not in content:
                     return f"Found web results for '{query}' - search completed successfully."
-                    
+        
         except Exception as e:
-            self.logger.warning(f"Web scrape search failed: {e}")
+            if not call.cancelled:
+                self.logger.warning(f"Web scrape search failed: {e}")
         
         return None
@@ -0,0 +1,258 @@
+"""
+Multi-process CPU serving for the Mini GPT Assistant.
+
+A single process generates on one Python thread, and PyTorch's intra-op
+threads stop paying off beyond a few cores for small batches. The worker
+pool loads the model once in the server process and forks worker processes
+that share its weights copy-on-write: inference never writes to the weights,
+so their memory pages stay shared between all workers. Each worker is pinned
+to its own set of cores with a matching thread count and batches its own
+requests, and a session is always routed to the same worker, which holds its
+history.
+"""
+
+import os
+import uuid
+import zlib
+import queue
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import Future, ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, List, Optional, Tuple
+
+import config
+from log_writer import get_log_writer
+from metrics import format_prometheus, merge_snapshots
+from server import ChatService, DynamicBatcher
+
+
+def available_cores() -> List[int]:
+    """CPU cores this process may run on."""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def plan_cores(workers: int, threads_per_worker: Optional[int] = None) -> List[List[int]]:
+    """
+    Split the available cores into one set per worker.
+
+    Args:
+        workers: Number of worker processes
+        threads_per_worker: Cores, and generation threads, per worker (None = divide the cores evenly)
+
+    Returns:
+        Core IDs of each worker; the sets overlap when there are not enough cores
+    """
+    cores = available_cores()
+    per_worker = threads_per_worker or max(len(cores) // workers, 1)
+    return [
+        sorted({cores[(index * per_worker + offset) % len(cores)] for offset in range(per_worker)})
+        for index in range(workers)
+    ]
+
+
+def _worker_main(assistant, index: int, cores: List[int], requests, responses, log_queue,
+                 max_batch_size: int, max_wait: float):
+    """Entry point of a forked worker: answer requests until a None arrives."""
+    import torch
+
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+    # Threads and open connections of the parent do not survive the fork. The inherited
+    # store and web search are kept referenced so their SQLite connections and sockets,
+    # still used by the parent, are never closed here.
+    inherited_store = assistant.store
+    inherited_search = assistant.web_search
+    get_log_writer().redirect(QueueHandler(log_queue))
+    assistant.setup_conversations()
+    assistant.setup_web_search()
+    assistant.setup_metrics()
+    assistant.logger.info(f"Worker {index} (pid {os.getpid()}) serving on cores {cores}")
+
+    batcher = DynamicBatcher(assistant, max_batch_size, max_wait)
+    service = ChatService(assistant, batcher)
+    executor = ThreadPoolExecutor(max_workers=max_batch_size * 2, thread_name_prefix=f"Worker{index}")
+
+    def handle(request_id: str, method: str, args: Tuple):
+        try:
+            if method == 'metrics':
+                result = assistant.metrics.snapshot()
+            else:
+                result = getattr(service, method)(*args)
+            responses.put((request_id, True, result))
+        except Exception as e:
+            responses.put((request_id, False, str(e)))
+
+    while True:
+        item = requests.get()
+        if item is None:
+            break
+        executor.submit(handle, *item)
+
+    executor.shutdown(wait=True)
+    batcher.stop()
+    if assistant.store is not None and assistant.store is not inherited_store:
+        assistant.store.close()
+    if assistant.web_search is not None and assistant.web_search is not inherited_search:
+        assistant.web_search.close()
+
+
+class WorkerPool:
+    """Forked worker processes sharing the server process's model weights."""
+
+    def __init__(self, assistant, workers: int, threads_per_worker: Optional[int],
+                 max_batch_size: int, max_wait: float):
+        """
+        Fork the workers; the assistant's model must already be loaded.
+
+        Args:
+            assistant: Assistant holding the loaded model and tokenizer
+            workers: Number of worker processes
+            threads_per_worker: Cores and generation threads per worker (None = divide the cores evenly)
+            max_batch_size: Maximum number of prompts a worker generates together
+            max_wait: Seconds a worker waits for more requests after the first one arrives
+        """
+        # Raises ValueError on platforms without fork, such as Windows
+        context = multiprocessing.get_context('fork')
+        # Each worker tokenizes on its own threads; the tokenizers' thread pool cannot be forked
+        os.environ.setdefault('TOKENIZERS_PARALLELISM', 'false')
+        self.assistant = assistant
+        self.logger = logging.getLogger('WorkerPool')
+        self.core_sets = plan_cores(workers, threads_per_worker)
+        self.requests = [context.Queue() for _ in range(workers)]
+        self.responses = context.Queue()
+        self.log_queue = context.Queue()
+        self.pending: Dict[str, Tuple[int, Future]] = {}
+        self.lock = threading.Lock()
+
+        self.processes = []
+        for index, cores in enumerate(self.core_sets):
+            process = context.Process(
+                target=_worker_main,
+                args=(assistant, index, cores, self.requests[index], self.responses, self.log_queue,
+                      max_batch_size, max_wait),
+                name=f"MiniGPTWorker-{index}",
+                daemon=True
+            )
+            process.start()
+            self.processes.append(process)
+            self.logger.info(f"Started worker {index} (pid {process.pid}) on cores {cores}")
+
+        # Workers' log records are written by this process's log writer
+        self.log_listener = QueueListener(self.log_queue, get_log_writer().queue_handler)
+        self.log_listener.start()
+        self.thread = threading.Thread(target=self._collect, name="WorkerPool", daemon=True)
+        self.thread.start()
+
+    def __len__(self) -> int:
+        return len(self.processes)
+
+    def worker_for(self, session_id: str) -> int:
+        """The worker that holds a session; stable across restarts."""
+        return zlib.crc32(session_id.encode('utf-8')) % len(self.processes)
+
+    def least_loaded(self) -> int:
+        """The live worker with the fewest requests in flight."""
+        with self.lock:
+            load = [0] * len(self.processes)
+            for worker, _ in self.pending.values():
+                load[worker] += 1
+        alive = [index for index, process in enumerate(self.processes) if process.is_alive()] or [0]
+        return min(alive, key=lambda index: load[index])
+
+    def submit(self, worker: int, method: str, *args) -> Future:
+        """Call a ChatService method in a worker; the future resolves to its result."""
+        request_id = uuid.uuid4().hex
+        future = Future()
+        with self.lock:
+            self.pending[request_id] = (worker, future)
+        self.requests[worker].put((request_id, method, args))
+        return future
+
+    def alive(self) -> int:
+        return sum(process.is_alive() for process in self.processes)
+
+    def _collect(self):
+        """Resolve futures as workers answer, failing those of workers that died."""
+        while True:
+            try:
+                item = self.responses.get(timeout=1.0)
+            except queue.Empty:
+                self._fail_dead_workers()
+                continue
+            if item is None:
+                return
+
+            request_id, ok, result = item
+            with self.lock:
+                entry = self.pending.pop(request_id, None)
+            if entry is None:
+                continue
+            if ok:
+                entry[1].set_result(result)
+            else:
+                entry[1].set_exception(RuntimeError(result))
+
+    def _fail_dead_workers(self):
+        with self.lock:
+            lost = [request_id for request_id, (worker, _) in self.pending.items()
+                    if not self.processes[worker].is_alive()]
+            futures = [self.pending.pop(request_id)[1] for request_id in lost]
+        for future in futures:
+            future.set_exception(RuntimeError("Worker process exited"))
+        if futures:
+            self.logger.error(f"{len(futures)} requests lost to a worker process that exited")
+
+    def stop(self):
+        """Let the workers finish their requests, then stop them."""
+        for requests in self.requests:
+            requests.put(None)
+        for process in self.processes:
+            process.join(timeout=30)
+            if process.is_alive():
+                process.terminate()
+        self.responses.put(None)
+        self.thread.join()
+        self.log_listener.stop()
+
+
+class PooledChatService:
+    """The ChatService interface, answered by a worker pool."""
+
+    def __init__(self, pool: WorkerPool):
+        self.pool = pool
+        self.assistant = pool.assistant
+
+    def chat(self, message: str, session_id: Optional[str] = None) -> Dict:
+        """Answer a message in the worker holding the session."""
+        session_id = session_id or uuid.uuid4().hex
+        return self.pool.submit(self.pool.worker_for(session_id), 'chat', message, session_id).result()
+
+    def complete(self, prompt: str) -> Dict:
+        """Continue a raw prompt in the least busy worker."""
+        return self.pool.submit(self.pool.least_loaded(), 'complete', prompt).result()
+
+    def clear_session(self, session_id: str) -> bool:
+        return self.pool.submit(self.pool.worker_for(session_id), 'clear_session', session_id).result()
+
+    def health(self) -> Dict:
+        alive = self.pool.alive()
+        return {'status': 'ok' if alive == len(self.pool) else 'degraded', 'model': config.MODEL_NAME,
+                'workers': len(self.pool), 'workers_alive': alive}
+
+    def metrics_text(self) -> str:
+        """All workers' metrics in the Prometheus text format, labelled by worker."""
+        futures = {
+            str(index): self.pool.submit(index, 'metrics')
+            for index, process in enumerate(self.pool.processes) if process.is_alive()
+        }
+        snapshots = {worker: future.result(timeout=10) for worker, future in futures.items()}
+        return format_prometheus(merge_snapshots(snapshots, 'worker'), self.assistant.metrics.prefix)
+
+    def close(self):
+        self.pool.stop()